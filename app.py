@@ -1,32 +1,54 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 import logging
 import uuid
 from datetime import timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union, Tuple
 from schema_generator import (
     parse_natural_language_to_schema,
-    build_er_model,
-    convert_to_relational_schema,
-    generate_mysql_ddl,
+    compile_schema,
     modify_entity,
     add_entity,
     delete_entity,
     modify_relationship,
     add_relationship,
-    delete_relationship
+    delete_relationship,
+    apply_operations,
+    OperationError
 )
 from models import (
-    GenerateSchemaRequest, GenerateSchemaResponse, ErrorResponse,
-    UserRegister, UserLogin, Token, UserHistoryResponse,
+    GenerateSchemaRequest, GenerateSchemaResponse,
+    UserRegister, UserLogin, Token, UserHistoryResponse, UserHistorySummaryResponse, InteractionRecordResponse,
+    SchemaStorageStatsResponse, PoolMetricsResponse,
     ModifyEntityRequest, AddEntityRequest, DeleteEntityRequest,
     ModifyRelationshipRequest, AddRelationshipRequest, DeleteRelationshipRequest,
-    ModifySchemaResponse, AttributeModel, EntityModel, RelationshipModel
+    ModifySchemaResponse,
+    PartitionMaintenanceRequest, PartitionMaintenanceResponse,
+    LoadTestRequest, LoadTestResponse, MAX_LOAD_TEST_ROWS, CapacityEstimateRequest, CapacityEstimateResponse,
+    IndexAdviceRequest, IndexAdviceResponse, SessionVersionsResponse, SessionVersionResponse,
+    SessionCacheStatsResponse, RecordQueueStatsResponse, SessionOperationsRequest,
+    SchemaValidationOptions, SessionEditRequest, SchemaModel
 )
-from database import get_db, init_db, User, InteractionRecord
+from partitioning import generate_partition_maintenance
+from schema_diff import diff_tables
+from ddl_validator import validate_tables
+from synthetic_data import run_load_test
+from capacity_estimator import estimate_capacity
+from index_advisor import advise_indexes, extract_workload
+from artifact_cache import record_artifacts, record_options, derive_artifacts
+from schema_store import storage_stats
+from history_store import history_page, history_count
+from edit_log import schema_at, options_at, undo_target, redo_target, list_versions
+from session_cache import session_cache, PendingEdit, EditConflictError
+from record_queue import record_queue, new_record, persist_records
+from database import get_async_db, init_db, engine, async_engine, pool_metrics, User, InteractionRecord
+from db_pool import warm_up
 from auth import (
-    authenticate_user, create_access_token, get_current_active_user,
+    authenticate_user, create_access_token, get_current_active_user, get_user_by_username,
     get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -49,6 +71,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def json_response(model: BaseModel) -> Response:
+    """
+    响应模型在构造时已校验过一次；直接序列化为JSON返回，
+    避免FastAPI按response_model再做一次转储、校验和编码。
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 @app.post(
     "/generate-schema",
     response_model=GenerateSchemaResponse,
@@ -58,7 +87,7 @@ app.add_middleware(
 async def generate_schema(
     request: GenerateSchemaRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     主生成接口：将自然语言转换为数据库模式
@@ -66,58 +95,49 @@ async def generate_schema(
     try:
         logger.info(f"收到生成请求: {request.description[:50]}...")
 
-        # 1. 解析自然语言到schema
-        schema = parse_natural_language_to_schema(request.description)
+        # 1. 解析自然语言到schema，校验一次得到规范化的schema；模型调用是阻塞的网络请求，放入线程池执行
+        schema = SchemaModel.canonical(await run_in_threadpool(parse_natural_language_to_schema, request.description))
         logger.info("Schema生成成功")
 
-        # 2. 构建ER模型
-        er_model = build_er_model(schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        logger.info("ER模型构建成功")
-
-        # 3. 转换为关系模式
-        relational_schema = convert_to_relational_schema(schema)
-        logger.info("关系模式转换成功")
-
-        # 4. 生成MySQL DDL
-        ddl = generate_mysql_ddl(relational_schema)
-        logger.info("DDL生成成功")
-
-        # 5. 生成session_id
+        # 2. 构建ER模型、关系模式、索引规划并生成MySQL DDL
+        options = request.compile_options()
+        compiled = await run_in_threadpool(compile_schema, schema, **options)
+        er_model_dict = compiled["er_model"]
+        ddl = compiled["ddl"]
+        logger.info(f"DDL生成成功，规划索引 {len(compiled['indexes'])} 个")
+
+        # 3. 保存前校验DDL
+        validation = await run_in_threadpool(check_validation, compiled["tables"], request)
+
+        # 4. 生成session_id
         session_id = str(uuid.uuid4())
 
         response = GenerateSchemaResponse(
             schema=schema,
             er_model=er_model_dict,
             ddl=ddl,
+            indexes=compiled["indexes"],
+            type_optimization=compiled["type_optimization"],
+            partitioning=compiled["partitioning"],
+            validation=validation,
+            lint=compiled["lint"],
             session_id=session_id
         )
 
-        # 保存交互记录到数据库
-        interaction_record = InteractionRecord(
-            user_id=current_user.id,
-            description=request.description,
-            schema_result=schema,
-            er_model_result=er_model_dict,
-            ddl_result=ddl,
-            session_id=session_id
-        )
-        db.add(interaction_record)
-        db.commit()
-        db.refresh(interaction_record)
+        # 保存交互记录：默认在请求中提交，启用写入队列时合并到批量写入中
+        record = new_record(current_user.id, request.description, session_id, schema, er_model_dict, ddl, options)
+        if record_queue.enabled:
+            await record_queue.enqueue(record)
+        else:
+            await db.run_sync(persist_records, [record])
+            await db.commit()
+        await session_cache.remember(session_id, current_user.id, schema, options)
 
         logger.info(f"请求处理完成，session_id: {session_id}")
-        return response
+        return json_response(response)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"值错误: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -140,26 +160,24 @@ async def health():
     return {"status": "healthy"}
 
 @app.post("/auth/register", response_model=Token)
-async def register_user(user: UserRegister, db: Session = Depends(get_db)):
+async def register_user(user: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """
     用户注册
     """
     # 检查用户名是否已存在
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+    if await get_user_by_username(db, user.username):
         raise HTTPException(status_code=400, detail="用户名已存在")
 
     # 检查邮箱是否已存在
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    result = await db.execute(select(User.id).where(User.email == user.email))
+    if result.first():
         raise HTTPException(status_code=400, detail="邮箱已被注册")
 
     # 创建新用户
     hashed_password = get_password_hash(user.password)
     db_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
 
     # 创建访问令牌
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -168,105 +186,232 @@ async def register_user(user: UserRegister, db: Session = Depends(get_db)):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/user/history", response_model=UserHistoryResponse)
+def record_response(record: InteractionRecord) -> Dict[str, Any]:
+    """交互记录的完整内容，ER模型和DDL按需派生"""
+    er_model, ddl = record_artifacts(record)
+    return {
+        "id": record.id,
+        "description": record.description,
+        "schema_result": record.schema,
+        "er_model_result": er_model,
+        "ddl_result": ddl,
+        "session_id": record.session_id,
+        "created_at": record.created_at,
+        "revision": record.revision or 0
+    }
+
+@app.get("/user/history", response_model=Union[UserHistoryResponse, UserHistorySummaryResponse])
 async def get_user_history(
-    skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    include_total: bool = True,
+    fields: str = "full",
+    skip: int = 0,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    获取用户的历史记录
+    获取用户的历史记录，按创建时间倒序以游标分页：
+    第一页不传cursor，之后用响应中的next_cursor（direction=next）或prev_cursor（direction=prev）翻页。
+    fields=summary时只返回id、session_id、描述前缀、创建时间和表数，完整内容通过 GET /sessions/{session_id} 获取。
+    skip仅为兼容旧客户端保留，深分页请使用游标。
     """
-    # 查询总数
-    total_count = db.query(InteractionRecord).filter(
-        InteractionRecord.user_id == current_user.id
-    ).count()
-
-    # 查询记录
-    records = db.query(InteractionRecord).filter(
-        InteractionRecord.user_id == current_user.id
-    ).order_by(InteractionRecord.created_at.desc()).offset(skip).limit(limit).all()
-
-    # 转换为响应格式
-    record_responses = []
-    for record in records:
-        record_responses.append({
-            "id": record.id,
-            "description": record.description,
-            "schema_result": record.schema_result,
-            "er_model_result": record.er_model_result,
-            "ddl_result": record.ddl_result,
-            "session_id": record.session_id,
-            "created_at": record.created_at
-        })
-
-    return UserHistoryResponse(total_count=total_count, records=record_responses)
-
-def get_schema_by_session(session_id: str, user_id: int, db: Session) -> Dict[str, Any]:
-    """根据session_id获取schema"""
-    record = db.query(InteractionRecord).filter(
+    try:
+        if limit < 1 or limit > 100:
+            raise ValueError("limit 必须在 1 到 100 之间")
+        await record_queue.flush_user(current_user.id)
+        await session_cache.flush_user(current_user.id)
+        if fields not in ("full", "summary"):
+            raise ValueError("fields 只能为 full 或 summary")
+        summary = fields == "summary"
+        page = await db.run_sync(history_page, current_user.id, limit, cursor, direction, max(skip, 0), summary)
+        total_count = await db.run_sync(history_count, current_user) if include_total else None
+
+        if summary:
+            response_model = UserHistorySummaryResponse
+            record_responses = [row._asdict() for row in page["records"]]
+        else:
+            response_model = UserHistoryResponse
+            # LAZY_ARTIFACTS模式下每条记录的DDL都可能需要重新编译，放入线程池执行
+            record_responses = await run_in_threadpool(
+                lambda: [record_response(record) for record in page["records"]]
+            )
+
+        return json_response(response_model(
+            total_count=total_count,
+            records=record_responses,
+            next_cursor=page["next_cursor"],
+            prev_cursor=page["prev_cursor"]
+        ))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"获取历史记录失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.get("/stats/schema-storage", response_model=SchemaStorageStatsResponse)
+async def schema_storage_stats(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按内容寻址的schema存储的去重效果"""
+    return json_response(SchemaStorageStatsResponse(**await db.run_sync(storage_stats)))
+
+@app.get("/metrics/session-cache", response_model=SessionCacheStatsResponse)
+async def session_cache_stats():
+    """会话工作集缓存的命中率、尚未写库的修改和写入延迟"""
+    return json_response(SessionCacheStatsResponse(**session_cache.stats()))
+
+@app.get("/metrics/record-queue", response_model=RecordQueueStatsResponse)
+async def record_queue_stats():
+    """新交互记录写入队列的积压、批次大小和写入耗时"""
+    return json_response(RecordQueueStatsResponse(**record_queue.stats()))
+
+@app.get("/metrics/db-pool", response_model=PoolMetricsResponse)
+async def db_pool_metrics():
+    """数据库连接池的使用情况和取连接的等待时间"""
+    return json_response(PoolMetricsResponse(pools=[
+        pool_metrics["async"].snapshot(async_engine.sync_engine.pool),
+        pool_metrics["sync"].snapshot(engine.pool)
+    ]))
+
+async def get_record_by_session(session_id: str, user_id: int, db: AsyncSession) -> InteractionRecord:
+    """根据session_id获取交互记录；写入队列中的新记录和会话缓存中尚未写库的修改先写入"""
+    await record_queue.flush_session(session_id)
+    await session_cache.flush(session_id)
+    result = await db.execute(select(InteractionRecord).where(
         InteractionRecord.session_id == session_id,
         InteractionRecord.user_id == user_id
-    ).first()
+    ))
+    record = result.scalars().first()
     if not record:
         raise HTTPException(status_code=404, detail="Session not found")
-    return record.schema_result
+    return record
 
-def update_schema_in_db(session_id: str, user_id: int, schema: Dict[str, Any],
-                       er_model: Dict[str, Any], ddl: str, db: Session):
-    """更新数据库中的schema"""
-    record = db.query(InteractionRecord).filter(
-        InteractionRecord.session_id == session_id,
-        InteractionRecord.user_id == user_id
-    ).first()
-    if record:
-        record.schema_result = schema
-        record.er_model_result = er_model
-        record.ddl_result = ddl
-        db.commit()
+async def get_schema_by_session(session_id: str, user_id: int, db: AsyncSession) -> Dict[str, Any]:
+    """
+    根据session_id获取规范化的schema。校验会构造新的对象，修改操作不影响记录中的原始版本；
+    旧记录中缺少的可选字段在这里补全。
+    """
+    schema, _ = await get_editable_schema(session_id, user_id, db)
+    return schema
+
+async def get_editable_schema(session_id: str, user_id: int, db: AsyncSession) -> Tuple[Dict[str, Any], int]:
+    """规范化的schema及其修订号；修改接口把修订号传给save_modified_schema做乐观并发检查"""
+    schema, revision, _, _ = await get_live_schema(session_id, user_id, db)
+    return SchemaModel.canonical(schema), revision
+
+async def get_live_schema(session_id: str, user_id: int, db: AsyncSession):
+    """
+    会话当前的schema（只读）、修订号、编译该schema时使用的编译参数及其缓存项；
+    启用会话缓存时优先从缓存读取，未命中时读库并放入缓存
+    """
+    entry = session_cache.get(session_id, user_id) if session_cache.enabled else None
+    if entry is not None:
+        return entry.schema, entry.revision, entry.options, entry
+    record = await get_record_by_session(session_id, user_id, db)
+    if session_cache.enabled:
+        entry = await session_cache.load(db, record)
+    return record.schema, record.revision or 0, record_options(record), entry
+
+def edit_conflict(current_revision: Optional[int]) -> HTTPException:
+    """会话已被其他请求修改：返回409和当前修订号，客户端据此重新读取会话后再提交修改"""
+    return HTTPException(status_code=409, detail={
+        "message": "会话已被其他请求修改，请重新读取后再提交",
+        "current_revision": current_revision
+    })
+
+def check_validation(tables: list, options: SchemaValidationOptions) -> Dict[str, Any]:
+    """校验生成的DDL；严格模式下存在错误时返回422，不保存任何内容"""
+    validation = validate_tables(tables, sqlite_dry_run=options.sqlite_dry_run)
+    if options.strict_validation and not validation["valid"]:
+        raise HTTPException(status_code=422, detail={"message": "生成的DDL未通过校验", "validation": validation})
+    return validation
+
+async def save_modified_schema(request: SessionEditRequest, user_id: int, modified_schema: Dict[str, Any],
+                               base_revision: int, db: AsyncSession, operation: str,
+                               renamed_tables: Dict[str, str] = None, target_version: Optional[int] = None,
+                               session_id: Optional[str] = None) -> ModifySchemaResponse:
+    """
+    重新生成ER模型、关系模式和DDL，校验并计算相对上一版本的迁移语句，写回数据库并构造响应。
+    修改在edit_log中追加一个新版本；撤销和重做传入target_version，只移动会话所在的版本。
+    base_revision为modified_schema所基于的修订号，会话已被其他请求修改或与请求中的expected_revision不同时返回409。
+    session_id默认取自request，批量修改的请求体不含session_id，由路径参数传入。
+    """
+    session_id = session_id or request.session_id
+    if request.expected_revision is not None and request.expected_revision != base_revision:
+        raise edit_conflict(base_revision)
+    previous_schema, revision, previous_options, entry = await get_live_schema(session_id, user_id, db)
+    if revision != base_revision:
+        raise edit_conflict(revision)
+    options = request.compile_options()
+    if options["partition_start"] and not request.partition_start and (previous_options or {}).get("partition_start"):
+        # 请求未指定分区起始月份时沿用会话部署时的月份，跨月修改不会平移所有分区
+        options["partition_start"] = previous_options["partition_start"]
+    # 上一版本按它自己的编译参数编译，迁移语句才是从已部署的结构出发；缓存中有编译结果时不必重新编译。
+    # 编译、校验（可能包括SQLite试执行）和比较都是CPU密集型操作，放入线程池执行，不阻塞事件循环
+    previous_tables = session_cache.compiled_tables(entry) if entry is not None else None
+    if previous_tables is None:
+        previous_tables = (await run_in_threadpool(compile_schema, previous_schema, **(previous_options or {})))["tables"]
+    compiled = await run_in_threadpool(compile_schema, modified_schema, **options)
+    validation = await run_in_threadpool(check_validation, compiled["tables"], request)
+    migration = await run_in_threadpool(diff_tables, previous_tables, compiled["tables"], renamed_tables)
+
+    # 更新数据库（write_behind模式下记入会话缓存稍后写入），修改记录与会话的新schema在同一事务中提交
+    try:
+        version, revision = await session_cache.save(
+            db, session_id, user_id,
+            PendingEdit(operation, modified_schema, compiled["er_model"], compiled["ddl"], options, target_version),
+            base_revision, tables=compiled["tables"]
+        )
+    except EditConflictError as e:
+        raise edit_conflict(e.current_revision)
+
+    return ModifySchemaResponse(
+        schema=modified_schema,
+        er_model=compiled["er_model"],
+        ddl=compiled["ddl"],
+        migration=migration,
+        indexes=compiled["indexes"],
+        type_optimization=compiled["type_optimization"],
+        partitioning=compiled["partitioning"],
+        validation=validation,
+        lint=compiled["lint"],
+        session_id=session_id,
+        version=version,
+        revision=revision
+    )
 
 @app.put("/modify-entity", response_model=ModifySchemaResponse)
 async def modify_entity_endpoint(
     request: ModifyEntityRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """修改实体"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行修改
+        new_attributes = None
+        if request.new_attributes:
+            new_attributes = [attr.model_dump() for attr in request.new_attributes]
         modified_schema = modify_entity(schema, request.entity_name,
-                                      request.new_attributes, request.new_table_name)
-
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
-        )
+                                      new_attributes, request.new_table_name)
+        renamed_tables = None
+        if request.new_table_name and request.new_table_name != request.entity_name:
+            renamed_tables = {request.entity_name: request.new_table_name}
+
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "modify_entity", renamed_tables))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -276,54 +421,21 @@ async def modify_entity_endpoint(
 async def add_entity_endpoint(
     request: AddEntityRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """添加实体"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行添加
-        entity_dict = {
-            "table_name": request.entity.table_name,
-            "attributes": [
-                {
-                    "name": attr.name,
-                    "data_type": attr.data_type,
-                    "is_primary_key": attr.is_primary_key,
-                    "comment": attr.comment
-                }
-                for attr in request.entity.attributes
-            ]
-        }
-        modified_schema = add_entity(schema, entity_dict)
-
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
-        )
+        modified_schema = add_entity(schema, request.entity.model_dump())
+
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "add_entity"))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -333,42 +445,21 @@ async def add_entity_endpoint(
 async def delete_entity_endpoint(
     request: DeleteEntityRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除实体"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行删除
         modified_schema = delete_entity(schema, request.entity_name)
 
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
-        )
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "delete_entity"))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -378,56 +469,23 @@ async def delete_entity_endpoint(
 async def modify_relationship_endpoint(
     request: ModifyRelationshipRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """修改关系"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行修改
-        old_rel = {
-            "from_table": request.old_relationship.from_table,
-            "from_column": request.old_relationship.from_column,
-            "to_table": request.old_relationship.to_table,
-            "to_column": request.old_relationship.to_column,
-            "on_delete": request.old_relationship.on_delete
-        }
-        new_rel = {
-            "from_table": request.new_relationship.from_table,
-            "from_column": request.new_relationship.from_column,
-            "to_table": request.new_relationship.to_table,
-            "to_column": request.new_relationship.to_column,
-            "on_delete": request.new_relationship.on_delete
-        }
+        old_rel = request.old_relationship.model_dump()
+        new_rel = request.new_relationship.model_dump()
         modified_schema = modify_relationship(schema, old_rel, new_rel)
 
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
-        )
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "modify_relationship"))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -437,49 +495,22 @@ async def modify_relationship_endpoint(
 async def add_relationship_endpoint(
     request: AddRelationshipRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """添加关系"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行添加
-        rel = {
-            "from_table": request.relationship.from_table,
-            "from_column": request.relationship.from_column,
-            "to_table": request.relationship.to_table,
-            "to_column": request.relationship.to_column,
-            "on_delete": request.relationship.on_delete
-        }
+        rel = request.relationship.model_dump()
         modified_schema = add_relationship(schema, rel)
 
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
-        )
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "add_relationship"))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -489,60 +520,311 @@ async def add_relationship_endpoint(
 async def delete_relationship_endpoint(
     request: DeleteRelationshipRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除关系"""
     try:
         # 获取当前schema
-        schema = get_schema_by_session(request.session_id, current_user.id, db)
+        schema, revision = await get_editable_schema(request.session_id, current_user.id, db)
 
         # 执行删除
-        rel = {
-            "from_table": request.relationship.from_table,
-            "from_column": request.relationship.from_column,
-            "to_table": request.relationship.to_table,
-            "to_column": request.relationship.to_column,
-            "on_delete": request.relationship.on_delete
-        }
+        rel = request.relationship.model_dump()
         modified_schema = delete_relationship(schema, rel)
 
-        # 重新生成ER模型、关系模式和DDL
-        er_model = build_er_model(modified_schema)
-        er_model_dict = {
-            "entities": [
-                {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
-                for e in er_model.entities
-            ],
-            "relationships": [
-                {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
-                for r in er_model.relationships
-            ]
-        }
-        relational_schema = convert_to_relational_schema(modified_schema)
-        ddl = generate_mysql_ddl(relational_schema)
-
-        # 更新数据库
-        update_schema_in_db(request.session_id, current_user.id,
-                          modified_schema, er_model_dict, ddl, db)
-
-        return ModifySchemaResponse(
-            schema=modified_schema,
-            er_model=er_model_dict,
-            ddl=ddl,
-            session_id=request.session_id
+        # 重新生成ER模型、关系模式和DDL并写回数据库
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "delete_relationship"))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/sessions/{session_id}/operations", response_model=ModifySchemaResponse)
+async def session_operations_endpoint(
+    session_id: str,
+    request: SessionOperationsRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    批量修改：按顺序执行一组修改，只读取一次schema、编译一次并写入一次，在修改记录中只产生一个版本。
+    任一操作无法执行时整批不保存，返回400并在detail中给出该操作的序号（从0开始）。
+    """
+    try:
+        schema, revision = await get_editable_schema(session_id, current_user.id, db)
+        operations = [operation.model_dump() for operation in request.operations]
+        try:
+            modified_schema, renamed_tables = apply_operations(schema, operations)
+        except OperationError as e:
+            raise HTTPException(status_code=400, detail={
+                "message": str(e), "index": e.index, "operation": operations[e.index]["op"]
+            })
+
+        return json_response(await save_modified_schema(request, current_user.id, modified_schema, revision, db, "operations",
+                                                        renamed_tables or None, session_id=session_id))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"批量修改失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.get("/sessions/{session_id}", response_model=InteractionRecordResponse)
+async def get_session_endpoint(
+    session_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """会话的完整内容：schema、ER模型和DDL"""
+    try:
+        record = await get_record_by_session(session_id, current_user.id, db)
+        return json_response(InteractionRecordResponse(**await run_in_threadpool(record_response, record)))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取会话失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/undo", response_model=ModifySchemaResponse)
+async def undo_endpoint(
+    request: SessionEditRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """撤销：回到当前版本的父版本"""
+    try:
+        record = await get_record_by_session(request.session_id, current_user.id, db)
+        target = await db.run_sync(undo_target, record)
+        if target is None:
+            raise ValueError("没有可撤销的修改")
+        schema = await db.run_sync(schema_at, request.session_id, target)
+        return json_response(await save_modified_schema(request, current_user.id, schema, record.revision or 0, db, "undo",
+                                                        target_version=target))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"撤销失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/redo", response_model=ModifySchemaResponse)
+async def redo_endpoint(
+    request: SessionEditRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """重做：前进到当前版本最新的子版本"""
+    try:
+        record = await get_record_by_session(request.session_id, current_user.id, db)
+        target = await db.run_sync(redo_target, record)
+        if target is None:
+            raise ValueError("没有可重做的修改")
+        schema = await db.run_sync(schema_at, request.session_id, target)
+        return json_response(await save_modified_schema(request, current_user.id, schema, record.revision or 0, db, "redo",
+                                                        target_version=target))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"重做失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.get("/sessions/{session_id}/versions", response_model=SessionVersionsResponse)
+async def session_versions_endpoint(
+    session_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """会话的修改历史：各版本的父版本、操作和创建时间"""
+    try:
+        record = await get_record_by_session(session_id, current_user.id, db)
+        versions = await db.run_sync(list_versions, session_id)
+        return json_response(SessionVersionsResponse(
+            session_id=session_id, current_version=record.current_version, versions=versions
+        ))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取会话版本失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.get("/sessions/{session_id}/versions/{version}", response_model=SessionVersionResponse)
+async def session_version_endpoint(
+    session_id: str,
+    version: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """会话在指定版本的schema、ER模型和DDL，由最近的快照和之后的补丁重建"""
+    try:
+        record = await get_record_by_session(session_id, current_user.id, db)
+        schema = await db.run_sync(schema_at, session_id, version)
+        if schema is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+        # 按编译该版本时的参数派生；引入版本编译参数之前的记录按会话当前的参数派生
+        options = await db.run_sync(options_at, session_id, version)
+        if options is None:
+            options = record_options(record)
+        artifacts = await run_in_threadpool(derive_artifacts, schema, options)
+        return json_response(SessionVersionResponse(
+            session_id=session_id, version=version, schema=schema,
+            er_model=artifacts["er_model"], ddl=artifacts["ddl"]
+        ))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"获取会话版本失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/sessions/{session_id}/partition-maintenance", response_model=PartitionMaintenanceResponse)
+async def partition_maintenance_endpoint(
+    session_id: str,
+    request: PartitionMaintenanceRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """生成分区表的滚动维护语句"""
+    try:
+        record = await get_record_by_session(session_id, current_user.id, db)
+        # LAZY_ARTIFACTS模式下DDL需要重新编译，放入线程池执行
+        _, ddl = await run_in_threadpool(record_artifacts, record)
+        maintenance = generate_partition_maintenance(
+            ddl,
+            months_ahead=request.months_ahead,
+            retention_months=request.retention_months,
+            from_month=request.from_month,
+            existing_partitions=request.existing_partitions
+        )
+        return json_response(PartitionMaintenanceResponse(session_id=session_id, **maintenance))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/sessions/{session_id}/load-test", response_model=LoadTestResponse)
+async def load_test_endpoint(
+    session_id: str,
+    request: LoadTestRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按外键顺序为会话中的schema生成合成数据，导入临时SQLite库并报告吞吐量和磁盘占用"""
+    try:
+        schema = await get_schema_by_session(session_id, current_user.id, db)
+        tables = (await run_in_threadpool(compile_schema, schema, **request.compile_options()))["tables"]
+        total_rows = request.total_rows([table.name for table in tables])
+        if total_rows > MAX_LOAD_TEST_ROWS:
+            raise ValueError(f"合计 {total_rows} 行，超过单次负载测试上限 {MAX_LOAD_TEST_ROWS} 行")
+        # 生成和导入是CPU与磁盘密集型操作，放入线程池执行，不阻塞事件循环
+        report = await run_in_threadpool(
+            run_load_test,
+            tables,
+            rows_per_table=request.rows_per_table,
+            table_rows=request.table_rows,
+            fmt=request.format,
+            batch_size=request.batch_size,
+            seed=request.seed
+        )
+        return json_response(LoadTestResponse(session_id=session_id, **report))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"负载测试失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/sessions/{session_id}/capacity-estimate", response_model=CapacityEstimateResponse)
+async def capacity_estimate_endpoint(
+    session_id: str,
+    request: CapacityEstimateRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按预估行数和增长模型估算会话中schema的数据、索引和总存储容量"""
+    try:
+        schema = await get_schema_by_session(session_id, current_user.id, db)
+        tables = (await run_in_threadpool(compile_schema, schema, **request.compile_options()))["tables"]
+        growth = {name: model.model_dump() for name, model in (request.growth or {}).items()}
+        estimate = await run_in_threadpool(
+            estimate_capacity,
+            tables,
+            row_estimates=request.row_estimates,
+            growth=growth,
+            horizon_months=request.horizon_months,
+            default_rows=request.default_rows,
+            fill_ratio=request.fill_ratio
+        )
+        return json_response(CapacityEstimateResponse(session_id=session_id, **estimate))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"容量估算失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="内部服务器错误")
+
+@app.post("/sessions/{session_id}/index-advice", response_model=IndexAdviceResponse)
+async def index_advice_endpoint(
+    session_id: str,
+    request: IndexAdviceRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """根据查询负载在写代价预算内选择组合索引，并用SQLite EXPLAIN核对每个查询的访问路径"""
+    try:
+        record = await get_record_by_session(session_id, current_user.id, db)
+        tables = (await run_in_threadpool(compile_schema, SchemaModel.canonical(record.schema),
+                                          **request.compile_options()))["tables"]
+        if request.queries:
+            queries = [query.model_dump() for query in request.queries]
+        else:
+            # 调用模型提取查询是阻塞的网络请求，放入线程池执行
+            queries = await run_in_threadpool(extract_workload, record.description, tables)
+        # 索引选择和EXPLAIN核对在线程池中执行
+        advice = await run_in_threadpool(
+            advise_indexes,
+            tables,
+            queries,
+            row_estimates=request.row_estimates,
+            table_writes=request.table_writes,
+            write_budget=request.write_budget,
+            max_index_columns=request.max_index_columns
         )
+        return json_response(IndexAdviceResponse(session_id=session_id, extracted=not request.queries, **advice))
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.error(f"索引建议失败: {str(e)}")
         raise HTTPException(status_code=500, detail="内部服务器错误")
 
 @app.post("/auth/login", response_model=Token)
-async def login_user(user: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     用户登录
     """
-    db_user = authenticate_user(db, user.username, user.password)
+    db_user = await authenticate_user(db, user.username, user.password)
     if not db_user:
         raise HTTPException(
             status_code=401,
@@ -558,6 +840,34 @@ async def login_user(user: UserLogin, db: Session = Depends(get_db)):
 # 启动时初始化数据库
 init_db()
 
+@app.on_event("startup")
+async def startup():
+    """
+    预先建立连接池中的连接，首批请求不必等待建立连接；重放交互记录的WAL并启动写入队列和会话缓存的后台写入。
+    预热失败时启动失败，服务不会在没有可用连接时报告就绪
+    """
+    try:
+        connections = await warm_up(async_engine)
+    except Exception as e:
+        logger.error(f"数据库连接池预热失败，停止启动: {str(e)}")
+        raise
+    logger.info(f"数据库连接池已预热 {connections} 个连接")
+    await record_queue.start()
+    session_cache.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 先写入队列中的新记录和会话缓存中尚未写库的修改；wal模式下写入失败的记录在下次启动时重放
+    try:
+        await record_queue.close()
+    except Exception as e:
+        logger.error(f"写入队列中的交互记录失败: {str(e)}")
+    try:
+        await session_cache.close()
+    except Exception as e:
+        logger.error(f"写入会话缓存中的修改失败: {str(e)}")
+    await async_engine.dispose()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from schema_generator import compile_schema, GENERATOR_VERSION
+
+# 为真时交互记录只保存规范化的schema、编译参数和生成器版本，ER模型和DDL在读取时派生
+LAZY_ARTIFACTS = os.getenv("LAZY_ARTIFACTS", "0").lower() in ("1", "true", "yes")
+DEFAULT_CACHE_SIZE = int(os.getenv("ARTIFACT_CACHE_SIZE", "256"))
+
+logger = logging.getLogger(__name__)
+
+def content_hash(schema: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> str:
+    """schema和编译参数的规范JSON（键排序、无多余空白）的SHA-256"""
+    payload = json.dumps({"schema": schema, "options": options or {}}, sort_keys=True,
+                         separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ArtifactCache:
+    """
+    派生结果的LRU缓存，键为 (内容哈希, 生成器版本)。
+    生成器输出变化时提升GENERATOR_VERSION，旧版本的缓存项自然失效。
+    同步端点在线程池中执行，读写加锁。
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            artifacts = self._items.get(key)
+            if artifacts is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return artifacts
+
+    def put(self, key: Tuple[str, str], artifacts: Dict[str, Any]):
+        with self._lock:
+            self._items[key] = artifacts
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+artifact_cache = ArtifactCache()
+
+def remember_artifacts(schema: Dict[str, Any], options: Optional[Dict[str, Any]], er_model: Dict[str, Any], ddl: str):
+    """写入记录时把刚编译出的结果放入缓存，随后的读取不必重新编译"""
+    artifact_cache.put((content_hash(schema, options), GENERATOR_VERSION), {"er_model": er_model, "ddl": ddl})
+
+def derive_artifacts(schema: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """按schema和编译参数派生ER模型和DDL，结果按内容哈希和生成器版本缓存"""
+    key = (content_hash(schema, options), GENERATOR_VERSION)
+    artifacts = artifact_cache.get(key)
+    if artifacts is None:
+        compiled = compile_schema(schema, **(options or {}))
+        artifacts = {"er_model": compiled["er_model"], "ddl": compiled["ddl"]}
+        artifact_cache.put(key, artifacts)
+    return artifacts
+
+def stored_artifacts(schema: Dict[str, Any], er_model: Dict[str, Any], ddl: str,
+                     options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    交互记录中ER模型和DDL相关的列：LAZY_ARTIFACTS模式下ER模型为空、DDL为空字符串，只保留派生所需的信息。
+    schema本身由schema_store按内容寻址保存。
+    """
+    remember_artifacts(schema, options, er_model, ddl)
+    return {
+        "er_model_result": None if LAZY_ARTIFACTS else er_model,
+        "ddl_result": "" if LAZY_ARTIFACTS else ddl,
+        "compile_options": options,
+        "generator_version": GENERATOR_VERSION
+    }
+
+def record_options(record) -> Optional[Dict[str, Any]]:
+    """
+    交互记录的编译参数。启用了分区但未保存起始月份的旧记录按记录创建的月份补齐，
+    避免派生时取当前月份得到与部署时不同的分区。
+    """
+    options = record.compile_options
+    if (options and (options.get("auto_partition") or options.get("partition_tables"))
+            and not options.get("partition_start") and record.created_at):
+        options = dict(options, partition_start=record.created_at.strftime("%Y-%m"))
+    return options
+
+def record_artifacts(record) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    返回交互记录的ER模型和DDL。保存了DDL的记录（包括引入生成器版本之前的旧记录）直接返回保存的内容；
+    只保存schema的记录按当前生成器派生，记录的生成器版本与当前不同时派生结果可能与当时部署的不一致，记录警告。
+    """
+    if record.ddl_result:
+        return record.er_model_result, record.ddl_result
+    if record.generator_version and record.generator_version != GENERATOR_VERSION:
+        logger.warning(f"会话 {record.session_id} 由生成器版本 {record.generator_version} 生成，"
+                       f"当前版本为 {GENERATOR_VERSION}，派生的DDL可能与部署的不同")
+    artifacts = derive_artifacts(record.schema, record_options(record))
+    return artifacts["er_model"], artifacts["ddl"]
@@ -0,0 +1,159 @@
+"""
+压缩列基准测试。
+
+1. 压缩率：合成schema的schema、ER模型和DDL分别用不带字典的zlib和带预设字典的zlib压缩后的大小，以及压缩、解压耗时；
+2. 历史记录接口的读写延迟：在临时SQLite库中分别用未压缩的JSON/TEXT列和压缩列写入同样的记录，
+   比较每条记录的写入耗时、库文件大小，以及按 /user/history 的方式读取最近一页记录并取出全部大字段的耗时。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_compression --sizes 10 100 1000 --records 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from column_compression import (
+    compress_value, decompress_value, dumps_json, COMPRESSION_LEVEL, COMPRESSION_THRESHOLD, CURRENT_DICTIONARY
+)
+from database import CompressedJSON, CompressedText
+from schema_generator import compile_schema
+from benchmarks.synthetic_schema import generate_synthetic_schema
+
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_RECORDS = 50
+HISTORY_PAGE_SIZE = 10
+READ_REPEAT = 20
+
+BenchBase = declarative_base()
+
+class PlainRecord(BenchBase):
+    __tablename__ = "plain_records"
+
+    id = Column(Integer, primary_key=True)
+    schema_result = Column(JSON, nullable=False)
+    er_model_result = Column(JSON, nullable=True)
+    ddl_result = Column(Text, nullable=False)
+    session_id = Column(String(36), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CompressedRecord(BenchBase):
+    __tablename__ = "compressed_records"
+
+    id = Column(Integer, primary_key=True)
+    schema_result = Column(CompressedJSON, nullable=False)
+    er_model_result = Column(CompressedJSON, nullable=True)
+    ddl_result = Column(CompressedText, nullable=False)
+    session_id = Column(String(36), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def _timed(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def compression_ratios(artifacts: Dict[str, str]) -> Dict[str, Any]:
+    """每个字段的原始大小、zlib和zlib+字典压缩后的大小及耗时"""
+    results = {}
+    for name, value in artifacts.items():
+        data = value.encode("utf-8")
+        compressed = compress_value(data)
+        results[name] = {
+            "raw_bytes": len(data),
+            "zlib_bytes": len(zlib.compress(data, COMPRESSION_LEVEL)),
+            "dictionary_bytes": len(compressed),
+            "ratio": round(len(data) / len(compressed), 2),
+            "compress_us": round(_timed(lambda: compress_value(data), 20) * 1e6, 1),
+            "decompress_us": round(_timed(lambda: decompress_value(compressed), 20) * 1e6, 1)
+        }
+    return results
+
+def history_latency(model, schema: Dict[str, Any], er_model: Dict[str, Any], ddl: str,
+                    records: int) -> Dict[str, Any]:
+    """写入records条记录并按历史记录接口的方式读取最近一页"""
+    directory = tempfile.mkdtemp(prefix="bench_compression_")
+    path = os.path.join(directory, "history.db")
+    engine = create_engine(f"sqlite:///{path}")
+    BenchBase.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    try:
+        write_timings = []
+        with Session() as db:
+            for i in range(records):
+                start = time.perf_counter()
+                db.add(model(schema_result=schema, er_model_result=er_model, ddl_result=ddl, session_id=str(i)))
+                db.commit()
+                write_timings.append(time.perf_counter() - start)
+
+        def read_page():
+            with Session() as db:
+                rows = db.query(model).order_by(model.created_at.desc()).limit(HISTORY_PAGE_SIZE).all()
+                return [(row.schema_result, row.er_model_result, row.ddl_result) for row in rows]
+
+        read_seconds = _timed(read_page, READ_REPEAT)
+        engine.dispose()
+        return {
+            "write_ms": round(statistics.median(write_timings) * 1000, 3),
+            "history_read_ms": round(read_seconds * 1000, 3),
+            "file_bytes": os.path.getsize(path)
+        }
+    finally:
+        engine.dispose()
+        os.remove(path)
+        os.rmdir(directory)
+
+def run_benchmarks(sizes: List[int], records: int) -> Dict[str, Any]:
+    results = {}
+    for size in sizes:
+        schema = generate_synthetic_schema(size, "dense")
+        compiled = compile_schema(schema)
+        artifacts = {"schema": dumps_json(schema), "er_model": dumps_json(compiled["er_model"]), "ddl": compiled["ddl"]}
+        result = {"columns": compression_ratios(artifacts)}
+        for label, model in (("plain", PlainRecord), ("compressed", CompressedRecord)):
+            result[label] = history_latency(model, schema, compiled["er_model"], compiled["ddl"], records)
+        results[str(size)] = result
+
+        columns = result["columns"]
+        raw = sum(column["raw_bytes"] for column in columns.values())
+        stored = sum(column["dictionary_bytes"] for column in columns.values())
+        print(f"{size:>6} 张表  每行 {raw / 1024:9.1f} KB -> {stored / 1024:8.1f} KB (x{raw / stored:5.1f})"
+              f"  写入 {result['plain']['write_ms']:7.2f} -> {result['compressed']['write_ms']:7.2f} ms"
+              f"  历史页读取 {result['plain']['history_read_ms']:8.2f} -> {result['compressed']['history_read_ms']:8.2f} ms"
+              f"  库文件 {result['plain']['file_bytes'] / 1024:9.0f} -> {result['compressed']['file_bytes'] / 1024:7.0f} KB",
+              file=sys.stderr)
+    return {
+        "threshold": COMPRESSION_THRESHOLD,
+        "level": COMPRESSION_LEVEL,
+        "dictionary": CURRENT_DICTIONARY,
+        "records": records,
+        "results": results
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="压缩列基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="schema的表数量")
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS, help="每种列类型写入的记录数")
+    parser.add_argument("--output", help="结果JSON文件")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.records)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+历史记录分页基准测试。
+
+在临时SQLite库中为一个用户写入records条交互记录（另有其他用户的记录作干扰），比较不同页深度下
+OFFSET/LIMIT分页和键集（游标）分页读取一页的耗时，以及COUNT(*)和users.history_count取总数的耗时。
+记录只含很短的schema和DDL，耗时主要来自定位页面本身。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_history --records 50000 --depths 0 10 100 1000 4000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, insert, select, func
+from sqlalchemy.orm import Session
+
+from database import Base, User, InteractionRecord
+from history_store import history_page, history_count, encode_cursor
+
+DEFAULT_RECORDS = 50000
+DEFAULT_DEPTHS = [0, 10, 100, 1000, 4000]
+PAGE_SIZE = 10
+REPEAT = 20
+OTHER_USERS = 4
+INSERT_BATCH = 5000
+
+def _timed(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def populate(engine, records: int):
+    """写入1个被测用户和OTHER_USERS个其他用户的记录，交替写入使各用户的记录在表中交错"""
+    with Session(engine) as db:
+        for i in range(OTHER_USERS + 1):
+            db.add(User(id=i + 1, username=f"user{i}", email=f"user{i}@example.com", hashed_password="x",
+                        history_count=records))
+        db.commit()
+    start = datetime(2024, 1, 1)
+    rows = []
+    with engine.begin() as conn:
+        for i in range(records):
+            for user_id in range(1, OTHER_USERS + 2):
+                rows.append({
+                    "user_id": user_id,
+                    "description": f"记录 {i}",
+                    "schema_result": {"entities": [], "relationships": []},
+                    "ddl_result": "",
+                    "session_id": f"{user_id}-{i}",
+                    # 每两条记录同一时间，覆盖created_at相同时按id排序的情况
+                    "created_at": start + timedelta(seconds=i // 2)
+                })
+            if len(rows) >= INSERT_BATCH:
+                conn.execute(insert(InteractionRecord), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(InteractionRecord), rows)
+
+def run_benchmarks(records: int, depths: List[int]) -> Dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix="bench_history_")
+    path = os.path.join(directory, "history.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    try:
+        populate(engine, records)
+        results = {}
+        with Session(engine) as db:
+            user = db.get(User, 1)
+            for depth in depths:
+                skip = depth * PAGE_SIZE
+                if skip >= records:
+                    continue
+                # 第depth页的游标：第depth-1页末条记录
+                cursor = None
+                if skip:
+                    previous = db.execute(
+                        select(InteractionRecord).where(InteractionRecord.user_id == user.id)
+                        .order_by(InteractionRecord.created_at.desc(), InteractionRecord.id.desc())
+                        .offset(skip - 1).limit(1)
+                    ).scalar_one()
+                    cursor = encode_cursor(previous)
+                offset_page = history_page(db, user.id, PAGE_SIZE, skip=skip)
+                keyset_page = history_page(db, user.id, PAGE_SIZE, cursor=cursor)
+                if [r.id for r in offset_page["records"]] != [r.id for r in keyset_page["records"]]:
+                    raise AssertionError(f"第 {depth} 页的两种分页结果不一致")
+                results[str(depth)] = {
+                    "offset_ms": round(_timed(lambda: history_page(db, user.id, PAGE_SIZE, skip=skip), REPEAT) * 1000, 3),
+                    "keyset_ms": round(_timed(lambda: history_page(db, user.id, PAGE_SIZE, cursor=cursor), REPEAT) * 1000, 3)
+                }
+                db.expunge_all()
+                user = db.get(User, 1)
+                print(f"第 {depth:>6} 页  OFFSET {results[str(depth)]['offset_ms']:8.3f} ms"
+                      f"  游标 {results[str(depth)]['keyset_ms']:8.3f} ms", file=sys.stderr)
+
+            count_query = select(func.count(InteractionRecord.id)).where(InteractionRecord.user_id == user.id)
+            totals = {
+                "count_ms": round(_timed(lambda: db.execute(count_query).scalar(), REPEAT) * 1000, 3),
+                "counter_ms": round(_timed(
+                    lambda: db.execute(select(User.history_count).where(User.id == user.id)).scalar(), REPEAT
+                ) * 1000, 3),
+                "history_count": history_count(db, user)
+            }
+            print(f"总数  COUNT(*) {totals['count_ms']:8.3f} ms  计数列 {totals['counter_ms']:8.3f} ms", file=sys.stderr)
+        return {"records": records, "page_size": PAGE_SIZE, "pages": results, "total_count": totals}
+    finally:
+        engine.dispose()
+        os.remove(path)
+        os.rmdir(directory)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="历史记录分页基准测试")
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS, help="被测用户的记录数")
+    parser.add_argument("--depths", type=int, nargs="+", default=DEFAULT_DEPTHS, help="读取的页序号（从0开始）")
+    parser.add_argument("--output", help="结果JSON文件")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.records, args.depths)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+请求处理CPU基准测试。
+
+在进程内重放 /generate-schema 和 /add-relationship 的处理过程（不含网络、LLM调用和数据库I/O），
+用time.process_time分别统计编译流水线和其余部分（解析、校验、构造响应、序列化响应和JSON列）的CPU时间，
+比较两条路径：
+
+- legacy：改动前的做法。schema以未校验的字典传递，修改接口手工把请求模型复制为字典，
+  响应模型构造后再由FastAPI按response_model转储、重新校验并编码为JSON；
+- typed：schema进入系统时经SchemaModel校验一次，请求模型用model_dump转为字典，
+  响应模型构造时校验一次并直接model_dump_json序列化。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_request --tables 100 --repeat 20
+"""
+import argparse
+import copy
+import json
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from schema_generator import compile_schema, add_relationship
+from schema_diff import diff_tables
+from ddl_validator import validate_tables
+from models import SchemaModel, GenerateSchemaResponse, ModifySchemaResponse, RelationshipModel
+from benchmarks.synthetic_schema import SHAPES, generate_synthetic_schema
+
+DEFAULT_TABLES = [100]
+DEFAULT_REPEAT = 20
+SESSION_ID = "00000000-0000-0000-0000-000000000000"
+
+def _fastapi_serialize(response: Any) -> bytes:
+    """按FastAPI对response_model的处理方式：转储、按响应模型重新校验、转为JSON兼容对象再编码。"""
+    content = response.model_dump()
+    validated = type(response).model_validate(content)
+    return json.dumps(validated.model_dump(mode="json"), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+def _persist(schema: Dict[str, Any], er_model: Dict[str, Any]) -> int:
+    """JSON列写入时的序列化"""
+    return len(json.dumps(schema)) + len(json.dumps(er_model))
+
+def _response_fields(compiled: Dict[str, Any], validation: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "er_model": compiled["er_model"],
+        "ddl": compiled["ddl"],
+        "indexes": compiled["indexes"],
+        "type_optimization": compiled["type_optimization"],
+        "partitioning": compiled["partitioning"],
+        "validation": validation,
+        "lint": compiled["lint"],
+        "session_id": SESSION_ID
+    }
+
+class Timer:
+    """累计被测请求中编译流水线的CPU时间，其余部分按总时间减去编译时间计算"""
+
+    def __init__(self):
+        self.compile_seconds = 0.0
+
+    def compile(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.process_time()
+        compiled = compile_schema(schema)
+        self.compile_seconds += time.process_time() - start
+        return compiled
+
+def generate_legacy(llm_text: str, timer: Timer) -> bytes:
+    schema = json.loads(llm_text)
+    compiled = timer.compile(schema)
+    validation = validate_tables(compiled["tables"])
+    response = GenerateSchemaResponse(schema=schema, **_response_fields(compiled, validation))
+    _persist(schema, compiled["er_model"])
+    return _fastapi_serialize(response)
+
+def generate_typed(llm_text: str, timer: Timer) -> bytes:
+    schema = SchemaModel.canonical(json.loads(llm_text))
+    compiled = timer.compile(schema)
+    validation = validate_tables(compiled["tables"])
+    response = GenerateSchemaResponse(schema=schema, **_response_fields(compiled, validation))
+    _persist(schema, compiled["er_model"])
+    return response.model_dump_json().encode("utf-8")
+
+def _modify(stored: Dict[str, Any], schema: Dict[str, Any], timer: Timer) -> ModifySchemaResponse:
+    previous = timer.compile(stored)
+    compiled = timer.compile(schema)
+    validation = validate_tables(compiled["tables"])
+    migration = diff_tables(previous["tables"], compiled["tables"])
+    _persist(schema, compiled["er_model"])
+    return ModifySchemaResponse(schema=schema, migration=migration, **_response_fields(compiled, validation))
+
+def add_relationship_legacy(stored: Dict[str, Any], relationship: RelationshipModel, timer: Timer) -> bytes:
+    schema = copy.deepcopy(stored)
+    rel = {
+        "from_table": relationship.from_table,
+        "from_column": relationship.from_column,
+        "to_table": relationship.to_table,
+        "to_column": relationship.to_column,
+        "on_delete": relationship.on_delete
+    }
+    return _fastapi_serialize(_modify(stored, add_relationship(schema, rel), timer))
+
+def add_relationship_typed(stored: Dict[str, Any], relationship: RelationshipModel, timer: Timer) -> bytes:
+    schema = SchemaModel.canonical(stored)
+    modified = add_relationship(schema, relationship.model_dump())
+    return _modify(stored, modified, timer).model_dump_json().encode("utf-8")
+
+def measure(func: Callable[..., bytes], args: tuple, repeat: int) -> Dict[str, Any]:
+    """每次请求的CPU时间中位数，拆分为编译流水线和其余开销"""
+    totals, compiles = [], []
+    size = 0
+    for _ in range(repeat):
+        timer = Timer()
+        start = time.process_time()
+        size = len(func(*args, timer))
+        totals.append(time.process_time() - start)
+        compiles.append(timer.compile_seconds)
+    total = statistics.median(totals)
+    compile_part = statistics.median(compiles)
+    return {
+        "runs": repeat,
+        "cpu_ms": round(total * 1000, 2),
+        "compile_ms": round(compile_part * 1000, 2),
+        "overhead_ms": round((total - compile_part) * 1000, 2),
+        "response_bytes": size
+    }
+
+def run_benchmarks(tables: List[int], shapes: List[str], repeat: int) -> Dict[str, Any]:
+    results = {}
+    for shape in shapes:
+        for size in tables:
+            stored = generate_synthetic_schema(size, shape)
+            llm_text = json.dumps(stored, ensure_ascii=False)
+            target = stored["entities"][0]
+            relationship = RelationshipModel(from_table=target["table_name"], from_column="bench_ref_id",
+                                             to_table=target["table_name"], to_column="id", on_delete="SET NULL")
+            target["attributes"].append({"name": "bench_ref_id", "data_type": "INT",
+                                         "is_primary_key": False, "comment": ""})
+            cases = [
+                ("generate", generate_legacy, generate_typed, (llm_text,)),
+                ("add_relationship", add_relationship_legacy, add_relationship_typed, (stored, relationship)),
+            ]
+            for name, legacy, typed, args in cases:
+                for path, func in (("legacy", legacy), ("typed", typed)):
+                    key = f"{shape}/{size}/{name}/{path}"
+                    results[key] = measure(func, args, repeat)
+                    print(f"{key:<45} cpu {results[key]['cpu_ms']:9.2f} ms"
+                          f"  compile {results[key]['compile_ms']:9.2f} ms"
+                          f"  overhead {results[key]['overhead_ms']:9.2f} ms", file=sys.stderr)
+    return {"repeat": repeat, "results": results}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="请求处理CPU基准测试")
+    parser.add_argument("--tables", type=int, nargs="+", default=DEFAULT_TABLES, help="schema的表数量")
+    parser.add_argument("--shapes", nargs="+", default=["sparse", "dense"], choices=list(SHAPES), help="schema形状")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每条路径的重复次数")
+    parser.add_argument("--output", help="结果JSON文件")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.tables, args.shapes, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+schema生成流水线基准测试。
+
+对schema_generator中的每个函数和每种编辑操作，在不同规模和形状的合成schema上计时并记录内存峰值，
+结果写入JSON文件；指定--compare时与基线结果比较，超过阈值的回归会使进程以非零状态退出。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_schema --sizes 10 100 1000 --output bench.json
+    python -m benchmarks.bench_schema --output new.json --compare bench.json
+"""
+import argparse
+import copy
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from schema_generator import (
+    build_er_model,
+    convert_to_relational_schema,
+    plan_indexes,
+    sort_tables_by_dependency,
+    generate_mysql_ddl,
+    compile_schema,
+    modify_entity,
+    add_entity,
+    delete_entity,
+    modify_relationship,
+    add_relationship,
+    delete_relationship
+)
+from type_optimizer import optimize_column_types
+from partitioning import plan_partitions
+from schema_diff import diff_tables
+from benchmarks.synthetic_schema import SHAPES, generate_synthetic_schema
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_REPEAT = 5
+# 单个用例的计时预算（秒），超出后不再重复
+CASE_TIME_BUDGET = 2.0
+# 低于该绝对差值（秒）的变化视为噪声
+NOISE_FLOOR_SECONDS = 0.001
+ALL_OPTIONS = {"optimize_types": True, "auto_partition": True}
+
+Case = Tuple[str, Callable[[], tuple], Callable[..., Any]]
+
+def _indexed_tables(schema: Dict[str, Any]):
+    tables = convert_to_relational_schema(schema)
+    plan_indexes(tables)
+    return tables
+
+def build_cases(schema: Dict[str, Any]) -> List[Case]:
+    """
+    构造用例列表：(名称, 准备参数的函数, 被测函数)。准备阶段不计入耗时。
+    """
+    middle = schema["entities"][len(schema["entities"]) // 2]
+    target = middle["table_name"]
+    new_attributes = copy.deepcopy(middle["attributes"]) + [
+        {"name": "extra_note", "data_type": "VARCHAR(255)", "is_primary_key": False, "comment": ""}
+    ]
+    new_entity = {
+        "table_name": "bench_new_table",
+        "attributes": [
+            {"name": "id", "data_type": "INT", "is_primary_key": True, "comment": ""},
+            {"name": f"{target}_id", "data_type": "INT", "is_primary_key": False, "comment": ""}
+        ]
+    }
+    new_rel = {"from_table": "bench_new_table", "from_column": f"{target}_id",
+               "to_table": target, "to_column": "id", "on_delete": "CASCADE"}
+    existing_rel = schema["relationships"][len(schema["relationships"]) // 2] if schema["relationships"] else new_rel
+    changed_rel = dict(existing_rel, on_delete="SET NULL")
+
+    def fresh_schema():
+        return (copy.deepcopy(schema),)
+
+    def edit_pipeline(previous, modified):
+        # 与编辑接口一致：编译新旧两版并计算迁移语句
+        before = compile_schema(previous)
+        after = compile_schema(modified)
+        return diff_tables(before["tables"], after["tables"])
+
+    modified_schema = modify_entity(copy.deepcopy(schema), target, copy.deepcopy(new_attributes))
+
+    return [
+        ("build_er_model", lambda: (schema,), build_er_model),
+        ("convert_to_relational_schema", lambda: (schema,), convert_to_relational_schema),
+        ("optimize_column_types", lambda: (convert_to_relational_schema(schema),), optimize_column_types),
+        ("plan_indexes", lambda: (convert_to_relational_schema(schema),), plan_indexes),
+        ("plan_partitions", lambda: (_indexed_tables(schema),), lambda t: plan_partitions(t, auto_partition=True)),
+        ("sort_tables_by_dependency", lambda: (_indexed_tables(schema),), sort_tables_by_dependency),
+        ("generate_mysql_ddl", lambda: (_indexed_tables(schema),), generate_mysql_ddl),
+        ("compile_schema", lambda: (schema,), compile_schema),
+        ("compile_schema_all_options", lambda: (schema,), lambda s: compile_schema(s, **ALL_OPTIONS)),
+        ("diff_tables", lambda: (_indexed_tables(schema), _indexed_tables(modified_schema)), diff_tables),
+        ("modify_entity", fresh_schema, lambda s: modify_entity(s, target, copy.deepcopy(new_attributes))),
+        ("add_entity", fresh_schema, lambda s: add_entity(s, copy.deepcopy(new_entity))),
+        ("delete_entity", fresh_schema, lambda s: delete_entity(s, target)),
+        ("modify_relationship", fresh_schema, lambda s: modify_relationship(s, existing_rel, changed_rel)),
+        ("add_relationship", fresh_schema, lambda s: add_relationship(s, dict(new_rel))),
+        ("delete_relationship", fresh_schema, lambda s: delete_relationship(s, existing_rel)),
+        ("edit_pipeline", lambda: (schema, modified_schema), edit_pipeline),
+    ]
+
+def run_case(setup: Callable[[], tuple], func: Callable[..., Any], repeat: int) -> Dict[str, Any]:
+    """对单个用例计时并测量一次调用的内存峰值。"""
+    timings = []
+    budget_start = time.perf_counter()
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+        if time.perf_counter() - budget_start > CASE_TIME_BUDGET:
+            break
+
+    args = setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "runs": len(timings),
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "peak_kb": round((peak - baseline) / 1024, 1)
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes: List[int], shapes: List[str], repeat: int = DEFAULT_REPEAT,
+                   cases: Optional[List[str]] = None) -> Dict[str, Any]:
+    results = {}
+    for shape in shapes:
+        for size in sizes:
+            schema = generate_synthetic_schema(size, shape)
+            for name, setup, func in build_cases(schema):
+                if cases and name not in cases:
+                    continue
+                key = f"{shape}/{size}/{name}"
+                results[key] = run_case(setup, func, repeat)
+                print(f"{key:<55} median {results[key]['median_s'] * 1000:10.2f} ms"
+                      f"  peak {results[key]['peak_kb']:10.1f} KB", file=sys.stderr)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "repeat": repeat
+        },
+        "results": results
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    time_threshold: float, memory_threshold: float) -> List[str]:
+    """返回超过阈值的回归描述；阈值为相对增幅，如0.2表示变慢20%。"""
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline["results"].get(key)
+        if not base:
+            continue
+        if (result["median_s"] > base["median_s"] * (1 + time_threshold)
+                and result["median_s"] - base["median_s"] > NOISE_FLOOR_SECONDS):
+            regressions.append(f"{key}: 耗时 {base['median_s'] * 1000:.2f} ms -> {result['median_s'] * 1000:.2f} ms")
+        if base["peak_kb"] > 0 and result["peak_kb"] > base["peak_kb"] * (1 + memory_threshold):
+            regressions.append(f"{key}: 内存峰值 {base['peak_kb']:.1f} KB -> {result['peak_kb']:.1f} KB")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="schema生成流水线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="表数量")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES), help="schema形状")
+    parser.add_argument("--cases", nargs="+", help="只运行指定用例")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每个用例的最多重复次数")
+    parser.add_argument("--output", default="bench_results.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="用于比较的基线结果JSON文件")
+    parser.add_argument("--time-threshold", type=float, default=0.2, help="耗时回归阈值（相对增幅）")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="内存回归阈值（相对增幅）")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.sizes, args.shapes, args.repeat, args.cases)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(current, baseline, args.time_threshold, args.memory_threshold)
+        if regressions:
+            print("检测到性能回归:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("未检测到性能回归", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
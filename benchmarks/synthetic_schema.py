@@ -0,0 +1,95 @@
+"""
+合成schema生成器，产出与LLM输出格式一致的schema字典，用于基准测试和数据生成。
+"""
+import random
+from typing import Dict, Any, List
+
+# 预设形状：每表外键数范围、中间表比例、环形外键比例
+SHAPES = {
+    "sparse": {"fk_range": (0, 1), "junction_ratio": 0.0, "cycle_ratio": 0.0},
+    "dense": {"fk_range": (2, 4), "junction_ratio": 0.05, "cycle_ratio": 0.02},
+    "junction": {"fk_range": (0, 1), "junction_ratio": 0.5, "cycle_ratio": 0.0},
+}
+
+# 普通列模板：(列名, 类型)
+COLUMN_TEMPLATES = [
+    ("name", "VARCHAR(255)"),
+    ("title", "VARCHAR(255)"),
+    ("description", "TEXT"),
+    ("status", "INT"),
+    ("is_active", "BOOLEAN"),
+    ("email", "VARCHAR(255)"),
+    ("code", "VARCHAR(255)"),
+    ("amount", "DECIMAL(10,2)"),
+    ("quantity", "INT"),
+    ("score", "INT"),
+    ("published_at", "DATETIME"),
+    ("remark", "VARCHAR(255)"),
+]
+
+def _attribute(name: str, data_type: str, is_primary_key: bool = False) -> Dict[str, Any]:
+    return {"name": name, "data_type": data_type, "is_primary_key": is_primary_key, "comment": "[inferred]"}
+
+def _entity(table_name: str, rng: random.Random, columns_per_table: int) -> Dict[str, Any]:
+    attributes = [_attribute("id", "INT", True)]
+    for name, data_type in rng.sample(COLUMN_TEMPLATES, min(columns_per_table, len(COLUMN_TEMPLATES))):
+        attributes.append(_attribute(name, data_type))
+    attributes.append(_attribute("created_at", "DATETIME"))
+    attributes.append(_attribute("updated_at", "DATETIME"))
+    return {"table_name": table_name, "attributes": attributes}
+
+def _add_fk(entity: Dict[str, Any], relationships: List[Dict[str, Any]], target: str, column: str,
+            on_delete: str = "CASCADE"):
+    entity["attributes"].append(_attribute(column, "INT"))
+    relationships.append({
+        "from_table": entity["table_name"],
+        "from_column": column,
+        "to_table": target,
+        "to_column": "id",
+        "on_delete": on_delete
+    })
+
+def generate_synthetic_schema(num_tables: int, shape: str = "sparse", columns_per_table: int = 6,
+                              seed: int = 0) -> Dict[str, Any]:
+    """
+    生成包含num_tables张表的合成schema。
+    shape为sparse（稀疏外键）、dense（密集外键且含少量环）或junction（大量多对多中间表）。
+    相同参数和seed总是生成相同的schema。
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"未知的schema形状: {shape}，可选: {', '.join(SHAPES)}")
+    params = SHAPES[shape]
+    rng = random.Random(seed)
+    entities = []
+    relationships = []
+
+    for i in range(num_tables):
+        table_name = f"table_{i:05d}"
+        entity = _entity(table_name, rng, columns_per_table)
+        entities.append(entity)
+        if i == 0:
+            continue
+
+        if i >= 2 and rng.random() < params["junction_ratio"]:
+            # 中间表：连接两张不同的已有表
+            left, right = rng.sample(range(i), 2)
+            _add_fk(entity, relationships, f"table_{left:05d}", f"table_{left:05d}_id")
+            _add_fk(entity, relationships, f"table_{right:05d}", f"table_{right:05d}_id")
+            continue
+
+        low, high = params["fk_range"]
+        targets = rng.sample(range(i), min(i, rng.randint(low, high)))
+        for target in targets:
+            _add_fk(entity, relationships, f"table_{target:05d}", f"table_{target:05d}_id")
+
+    # 反向外键构成环
+    for i in range(1, num_tables):
+        if rng.random() < params["cycle_ratio"]:
+            target = rng.randrange(i, num_tables)
+            if target != i - 1:
+                entity = entities[i - 1]
+                column = f"table_{target:05d}_ref_id"
+                if not any(attr["name"] == column for attr in entity["attributes"]):
+                    _add_fk(entity, relationships, f"table_{target:05d}", column, "SET NULL")
+
+    return {"entities": entities, "relationships": relationships}
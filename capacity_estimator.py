@@ -0,0 +1,213 @@
+import math
+import re
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+
+from type_optimizer import base_type, estimate_column_bytes, LOB_ESTIMATED_BYTES
+
+if TYPE_CHECKING:
+    from schema_generator import Table, Column
+
+# InnoDB页大小和每页固定开销：FIL头38 + 页头56 + infimum/supremum 26 + FIL尾8
+PAGE_SIZE = 16384
+PAGE_OVERHEAD_BYTES = 128
+# 记录头（COMPACT/DYNAMIC行格式）
+RECORD_HEADER_BYTES = 5
+# 聚簇索引中的隐藏列：DB_TRX_ID 6 + DB_ROLL_PTR 7；无主键时另有6字节DB_ROW_ID
+HIDDEN_COLUMN_BYTES = 13
+HIDDEN_ROW_ID_BYTES = 6
+# 页目录每个槽2字节，平均每6条记录一个槽
+DIRECTORY_BYTES_PER_RECORD = 2 / 6
+# 非叶子节点指针记录中的子页号
+CHILD_POINTER_BYTES = 4
+# 顺序插入的主键页保留1/16空闲；随机插入的二级索引因页分裂平均约69%填充
+CLUSTERED_FILL_FACTOR = 15 / 16
+SECONDARY_FILL_FACTOR = 0.69
+# DYNAMIC行格式：行长超过约半页时，最长的变长列移到溢出页，行内只保留20字节指针
+MAX_INLINE_ROW_BYTES = 8126
+OFF_PAGE_POINTER_BYTES = 20
+# 不超过该长度的变长列总是存放在行内
+MIN_OFF_PAGE_COLUMN_BYTES = 40
+# 溢出页头部开销
+LOB_PAGE_OVERHEAD_BYTES = 38 + 8 + 12
+# 每个表空间（分区表的每个分区）初始大小
+MIN_TABLESPACE_BYTES = 7 * PAGE_SIZE
+# 变长字符串列的平均填充比例
+DEFAULT_FILL_RATIO = 0.5
+DEFAULT_HORIZON_MONTHS = 12
+DEFAULT_TABLE_ROWS = 1000
+
+def _is_variable(data_type: str) -> bool:
+    base = base_type(data_type)
+    return base in ("VARCHAR", "VARBINARY") or base in LOB_ESTIMATED_BYTES
+
+def _is_nullable(col: "Column") -> bool:
+    return "NOT NULL" not in col.constraints and "PRIMARY KEY" not in col.constraints
+
+def _record_overhead(columns: List["Column"]) -> float:
+    """记录头、NULL位图、变长列长度列表和页目录的摊销开销。"""
+    nullable = sum(1 for col in columns if _is_nullable(col))
+    variable = sum(1 for col in columns if _is_variable(col.data_type))
+    return RECORD_HEADER_BYTES + math.ceil(nullable / 8) + variable * 2 + DIRECTORY_BYTES_PER_RECORD
+
+def _key_bytes(table: "Table", names: List[str], fill_ratio: float) -> float:
+    columns = {col.name: col for col in table.columns}
+    return sum(estimate_column_bytes(columns[name].data_type, fill_ratio) for name in names if name in columns)
+
+def _btree_bytes(rows: int, leaf_record_bytes: float, node_record_bytes: float, fill_factor: float) -> Dict[str, int]:
+    """按叶子记录长度和节点指针记录长度逐层计算B+树页数。"""
+    usable = (PAGE_SIZE - PAGE_OVERHEAD_BYTES) * fill_factor
+    leaf_pages = max(1, math.ceil(rows / max(1, int(usable // leaf_record_bytes)))) if rows else 1
+    pages = leaf_pages
+    level_pages = leaf_pages
+    levels = 1
+    per_node = max(2, int(usable // node_record_bytes))
+    while level_pages > 1:
+        level_pages = math.ceil(level_pages / per_node)
+        pages += level_pages
+        levels += 1
+    return {"pages": pages, "leaf_pages": leaf_pages, "levels": levels, "bytes": pages * PAGE_SIZE}
+
+def estimate_row_layout(table: "Table", fill_ratio: float = DEFAULT_FILL_RATIO) -> Dict[str, Any]:
+    """
+    估算一行在聚簇索引中的平均长度，以及因行长超过半页而移到溢出页的列。
+    """
+    sizes = {col.name: estimate_column_bytes(col.data_type, fill_ratio) for col in table.columns}
+    hidden = HIDDEN_COLUMN_BYTES + (0 if table.primary_key_columns() else HIDDEN_ROW_ID_BYTES)
+    inline = sum(sizes.values()) + hidden + _record_overhead(table.columns)
+
+    off_page = []
+    candidates = sorted((col for col in table.columns if _is_variable(col.data_type)),
+                        key=lambda col: sizes[col.name], reverse=True)
+    for col in candidates:
+        if inline <= MAX_INLINE_ROW_BYTES or sizes[col.name] <= MIN_OFF_PAGE_COLUMN_BYTES:
+            break
+        inline -= sizes[col.name] - OFF_PAGE_POINTER_BYTES
+        off_page.append({"column": col.name, "bytes": sizes[col.name]})
+
+    # 每个溢出值至少独占一个页
+    lob_pages_per_row = sum(math.ceil(col["bytes"] / (PAGE_SIZE - LOB_PAGE_OVERHEAD_BYTES)) for col in off_page)
+    return {
+        "row_bytes": round(inline, 1),
+        "off_page_columns": [col["column"] for col in off_page],
+        "lob_bytes_per_row": lob_pages_per_row * PAGE_SIZE
+    }
+
+def _partition_count(table: "Table") -> int:
+    if not table.partition_clause:
+        return 1
+    return max(1, len(re.findall(r"^\s*PARTITION \w+ VALUES", table.partition_clause, re.MULTILINE)))
+
+def table_profile(table: "Table", fill_ratio: float = DEFAULT_FILL_RATIO) -> Dict[str, Any]:
+    """
+    与行数无关的部分：聚簇索引叶子记录和节点指针长度、每个二级索引的记录长度。
+    逐月预测时每张表只计算一次。
+    """
+    layout = estimate_row_layout(table, fill_ratio)
+    columns = {col.name: col for col in table.columns}
+    primary_key = table.primary_key_columns()
+    pk_bytes = _key_bytes(table, primary_key, fill_ratio) if primary_key else HIDDEN_ROW_ID_BYTES
+
+    indexes = []
+    for index in table.indexes:
+        # 二级索引记录包含索引列和不在索引中的主键列
+        extra_pk = [name for name in primary_key if name not in index.columns]
+        nullable = sum(1 for name in index.columns if name in columns and _is_nullable(columns[name]))
+        entry = (_key_bytes(table, index.columns, fill_ratio)
+                 + (_key_bytes(table, extra_pk, fill_ratio) if primary_key else HIDDEN_ROW_ID_BYTES)
+                 + RECORD_HEADER_BYTES + math.ceil(nullable / 8) + DIRECTORY_BYTES_PER_RECORD)
+        indexes.append({"name": index.name, "columns": index.columns, "entry_bytes": round(entry, 1)})
+
+    return {
+        "table": table.name,
+        "layout": layout,
+        "node_bytes": pk_bytes + RECORD_HEADER_BYTES + CHILD_POINTER_BYTES,
+        "indexes": indexes,
+        "minimum_bytes": MIN_TABLESPACE_BYTES * _partition_count(table)
+    }
+
+def size_from_profile(profile: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    """按table_profile的结果计算给定行数下的聚簇索引、溢出页和二级索引大小。"""
+    layout = profile["layout"]
+    clustered = _btree_bytes(rows, layout["row_bytes"], profile["node_bytes"], CLUSTERED_FILL_FACTOR)
+    lob_bytes = rows * layout["lob_bytes_per_row"]
+    indexes = []
+    for index in profile["indexes"]:
+        tree = _btree_bytes(rows, index["entry_bytes"], index["entry_bytes"] + CHILD_POINTER_BYTES,
+                            SECONDARY_FILL_FACTOR)
+        indexes.append(dict(index, levels=tree["levels"], bytes=tree["bytes"]))
+
+    data_bytes = clustered["bytes"] + lob_bytes
+    index_bytes = sum(index["bytes"] for index in indexes)
+    return {
+        "table": profile["table"],
+        "rows": rows,
+        "row_bytes": layout["row_bytes"],
+        "off_page_columns": layout["off_page_columns"],
+        "primary_key_levels": clustered["levels"],
+        "data_bytes": data_bytes,
+        "lob_bytes": lob_bytes,
+        "index_bytes": index_bytes,
+        "indexes": indexes,
+        "total_bytes": max(profile["minimum_bytes"], data_bytes + index_bytes)
+    }
+
+def estimate_table_size(table: "Table", rows: int, fill_ratio: float = DEFAULT_FILL_RATIO) -> Dict[str, Any]:
+    """
+    估算单张表在给定行数下的磁盘占用：聚簇索引（含非叶子层）、溢出页、每个二级索引，以及表空间的最小分配。
+    """
+    return size_from_profile(table_profile(table, fill_ratio), rows)
+
+def project_rows(initial_rows: int, month: int, monthly_rows: int = 0, monthly_growth_rate: float = 0.0) -> int:
+    """增长模型：初始行数按月复合增长，再加上每月固定新增的行数。"""
+    return int(round(initial_rows * (1 + monthly_growth_rate) ** month + monthly_rows * month))
+
+def estimate_capacity(tables: List["Table"], row_estimates: Optional[Dict[str, int]] = None,
+                      growth: Optional[Dict[str, Dict[str, Any]]] = None,
+                      horizon_months: int = DEFAULT_HORIZON_MONTHS, default_rows: int = DEFAULT_TABLE_ROWS,
+                      fill_ratio: float = DEFAULT_FILL_RATIO) -> Dict[str, Any]:
+    """
+    估算整个schema的存储容量。
+
+    row_estimates为各表当前（上线时）行数，未给出的表按default_rows计；
+    growth为各表的增长模型 {"monthly_rows": 每月新增行数, "monthly_growth_rate": 月复合增长率}。
+    返回horizon_months个月后每张表和全库的容量，以及逐月的全库容量曲线。
+    """
+    row_estimates = row_estimates or {}
+    growth = growth or {}
+    warnings = [f"增长模型中的表 {name} 不存在" for name in sorted(set(growth) - {t.name for t in tables})]
+
+    def rows_at(table: "Table", month: int) -> int:
+        model = growth.get(table.name, {})
+        return project_rows(row_estimates.get(table.name, default_rows), month,
+                            model.get("monthly_rows", 0), model.get("monthly_growth_rate", 0.0))
+
+    profiles = [(table, table_profile(table, fill_ratio)) for table in tables]
+    projection = []
+    for month in range(horizon_months + 1):
+        rows = [rows_at(table, month) for table, _ in profiles]
+        projection.append({
+            "month": month,
+            "rows": sum(rows),
+            "total_bytes": sum(size_from_profile(profile, count)["total_bytes"]
+                               for (_, profile), count in zip(profiles, rows))
+        })
+
+    results = sorted((size_from_profile(profile, rows_at(table, horizon_months)) for table, profile in profiles),
+                     key=lambda size: size["total_bytes"], reverse=True)
+    return {
+        "horizon_months": horizon_months,
+        "tables": results,
+        "total_rows": sum(size["rows"] for size in results),
+        "data_bytes": sum(size["data_bytes"] for size in results),
+        "index_bytes": sum(size["index_bytes"] for size in results),
+        "total_bytes": sum(size["total_bytes"] for size in results),
+        "projection": projection,
+        "assumptions": {
+            "page_size": PAGE_SIZE,
+            "row_format": "DYNAMIC",
+            "clustered_fill_factor": round(CLUSTERED_FILL_FACTOR, 4),
+            "secondary_fill_factor": SECONDARY_FILL_FACTOR,
+            "varchar_fill_ratio": fill_ratio
+        },
+        "warnings": warnings
+    }
@@ -0,0 +1,165 @@
+"""
+大字段列（schema、ER模型、DDL）的透明压缩。
+
+超过阈值的值用zlib压缩，并使用按典型schema训练的预设字典：JSON键名、常见类型、约束和建表语句的固定写法
+出现在字典中，单条记录也能获得跨记录的压缩效果。压缩后的值以 MAGIC + 字典版本号 开头，
+其他值（低于阈值或压缩无收益的值，以及迁移前的未压缩旧值）按原文保存和读取。
+字典文件一经发布不再修改；重新训练时写入新的版本号，旧版本的字典保留用于读取旧数据。
+
+用法（在仓库根目录执行）：
+    python column_compression.py train --output compression_dicts/v2.txt            # 由合成schema训练
+    python column_compression.py train --database --output compression_dicts/v2.txt # 由交互记录抽样训练
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+MAGIC = b"\x00Z"
+COMPRESSION_LEVEL = 6
+# 低于该字节数的值不压缩：压缩头和字典版本号的开销抵消收益，且短值的解压延迟不值得
+COMPRESSION_THRESHOLD = int(os.getenv("COLUMN_COMPRESSION_THRESHOLD", "512"))
+DICTIONARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compression_dicts")
+# 新写入的值使用的字典版本，0表示不使用字典
+CURRENT_DICTIONARY = 1
+# zlib的窗口为32KB，更长的字典只有末尾部分起作用
+MAX_DICTIONARY_BYTES = 32 * 1024
+# 训练时把文本切分为以这些字符结尾的片段，再统计连续片段组合在多少个样本中出现
+SEGMENT_PATTERN = re.compile(r"[^{},\n]*[{},\n]|[^{},\n]+$")
+MAX_SEGMENT_RUN = 4
+
+_dictionaries: Dict[int, bytes] = {0: b""}
+
+def load_dictionary(version: int) -> bytes:
+    if version not in _dictionaries:
+        with open(os.path.join(DICTIONARY_DIR, f"v{version}.txt"), "rb") as f:
+            _dictionaries[version] = f.read()[-MAX_DICTIONARY_BYTES:]
+    return _dictionaries[version]
+
+def compress_value(data: bytes, dictionary: Optional[int] = None) -> bytes:
+    """超过阈值且压缩有收益时返回带头部的压缩数据，否则原样返回"""
+    if len(data) < COMPRESSION_THRESHOLD:
+        return data
+    version = CURRENT_DICTIONARY if dictionary is None else dictionary
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=load_dictionary(version)) if version \
+        else zlib.compressobj(COMPRESSION_LEVEL)
+    compressed = MAGIC + bytes([version]) + compressor.compress(data) + compressor.flush()
+    return compressed if len(compressed) < len(data) else data
+
+def decompress_value(data: bytes) -> bytes:
+    if not data.startswith(MAGIC):
+        return data
+    version = data[len(MAGIC)]
+    decompressor = zlib.decompressobj(zdict=load_dictionary(version)) if version else zlib.decompressobj()
+    return decompressor.decompress(data[len(MAGIC) + 1:]) + decompressor.flush()
+
+def dumps_json(value) -> str:
+    """压缩列中JSON的规范写法，训练字典时使用相同的写法"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_BYTES) -> bytes:
+    """
+    按样本训练预设字典：把每个样本切分为片段，统计1到MAX_SEGMENT_RUN个连续片段组成的子串出现在多少个样本中，
+    按 出现样本数 × 长度 选取收益最高的子串直到填满字典。zlib优先匹配距离较近的内容，收益最高的子串放在末尾。
+    """
+    document_frequency: Counter = Counter()
+    documents = 0
+    for sample in samples:
+        documents += 1
+        segments = SEGMENT_PATTERN.findall(sample)
+        seen = set()
+        for start in range(len(segments)):
+            for run in range(1, MAX_SEGMENT_RUN + 1):
+                if start + run > len(segments):
+                    break
+                seen.add("".join(segments[start:start + run]))
+        document_frequency.update(seen)
+
+    # 只出现在单个样本中的子串对其他记录没有帮助
+    candidates = [(count * len(text.encode("utf-8")), text) for text, count in document_frequency.items()
+                  if count > 1 or documents == 1]
+    candidates.sort(reverse=True)
+    chosen: List[str] = []
+    used = 0
+    for _, text in candidates:
+        encoded = len(text.encode("utf-8"))
+        if used + encoded > size:
+            continue
+        if any(text in existing for existing in chosen):
+            continue
+        chosen.append(text)
+        used += encoded
+    return "".join(reversed(chosen)).encode("utf-8")
+
+# 合成schema的表名（table_00001等）替换为常见业务表名，避免字典被合成名称占满
+TRAINING_TABLE_NAMES = [
+    "users", "roles", "permissions", "students", "teachers", "courses", "classes", "enrollments", "grades",
+    "assignments", "submissions", "departments", "employees", "customers", "products", "categories", "orders",
+    "order_items", "payments", "addresses", "suppliers", "inventory", "shipments", "invoices", "reviews",
+    "comments", "posts", "tags", "messages", "notifications", "doctors", "patients", "appointments",
+    "prescriptions", "books", "authors", "borrow_records", "rooms", "reservations", "projects", "tasks",
+    "attachments", "audit_logs", "operation_logs", "login_records"
+]
+
+def _rename_tables(schema: Dict, offset: int) -> Dict:
+    names = {}
+    for i, entity in enumerate(schema["entities"]):
+        name = TRAINING_TABLE_NAMES[(i + offset) % len(TRAINING_TABLE_NAMES)]
+        names[entity["table_name"]] = name if i < len(TRAINING_TABLE_NAMES) else f"{name}_{i // len(TRAINING_TABLE_NAMES)}"
+    pattern = re.compile(r"table_\d{5}")
+    return json.loads(pattern.sub(lambda match: names.get(match.group(), match.group()), json.dumps(schema)))
+
+def synthetic_samples(sizes: List[int]) -> Iterable[str]:
+    """训练样本：各形状合成schema（换用常见表名）的schema、ER模型和DDL，写法与压缩列中保存的一致"""
+    from schema_generator import compile_schema
+    from benchmarks.synthetic_schema import SHAPES, generate_synthetic_schema
+
+    for shape in SHAPES:
+        for size in sizes:
+            for seed in range(3):
+                schema = _rename_tables(generate_synthetic_schema(size, shape, seed=seed), seed * 7 + size)
+                compiled = compile_schema(schema)
+                yield dumps_json(schema)
+                yield dumps_json(compiled["er_model"])
+                yield compiled["ddl"]
+
+def database_samples(limit: int) -> Iterable[str]:
+    """训练样本：最近的交互记录"""
+    from database import SessionLocal, InteractionRecord
+    from artifact_cache import record_artifacts
+
+    db = SessionLocal()
+    try:
+        records = db.query(InteractionRecord).order_by(InteractionRecord.id.desc()).limit(limit).all()
+        for record in records:
+            er_model, ddl = record_artifacts(record)
+            yield dumps_json(record.schema)
+            if er_model:
+                yield dumps_json(er_model)
+            yield ddl
+    finally:
+        db.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="训练压缩列的预设字典")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--output", required=True, help="字典文件，如 compression_dicts/v2.txt")
+    parser.add_argument("--database", action="store_true", help="从交互记录抽样而不是使用合成schema")
+    parser.add_argument("--limit", type=int, default=500, help="--database时抽样的记录数")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50], help="合成schema的表数量")
+    parser.add_argument("--size", type=int, default=MAX_DICTIONARY_BYTES, help="字典字节数")
+    args = parser.parse_args(argv)
+
+    samples = database_samples(args.limit) if args.database else synthetic_samples(args.sizes)
+    dictionary = train_dictionary(samples, args.size)
+    with open(args.output, "wb") as f:
+        f.write(dictionary)
+    print(f"字典已写入 {args.output}（{len(dictionary)} 字节）", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import Dict, Any, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes")
+
+# 连接池配置；pool_recycle应小于MySQL的wait_timeout，pre_ping在取出连接时检测已被服务端关闭的连接
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# 启动时预先建立的连接数
+POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(POOL_SIZE)))
+# 等待连接超过该毫秒数时记录警告
+SLOW_CHECKOUT_MS = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+WAIT_SAMPLE_WINDOW = 1000
+
+class PoolMetrics:
+    """
+    连接池指标：取连接的等待时间（最近WAIT_SAMPLE_WINDOW次的分位数）、使用中的连接数及峰值、
+    溢出连接的取出次数、超时、新建和失效的连接数。由连接池事件和InstrumentedPool更新。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLE_WINDOW)
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.peak_in_use = 0
+        self.total_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self._waits.append(seconds)
+            self.total_wait_seconds += seconds
+        if seconds * 1000 > SLOW_CHECKOUT_MS:
+            logger.warning(f"连接池 {self.name} 等待连接 {seconds * 1000:.1f} ms")
+
+    def record_timeout(self, timeout: float):
+        with self._lock:
+            self.timeouts += 1
+        logger.error(f"连接池 {self.name} 在 {timeout} 秒内未能取得连接")
+
+    def record_checkout(self, in_use: int, overflow: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            if overflow:
+                self.overflow_checkouts += 1
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            checkouts = self.checkouts
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))] * 1000, 3)
+
+        is_queue_pool = isinstance(pool, QueuePool)
+        return {
+            "name": self.name,
+            "pool_class": type(pool).__name__,
+            "pool_size": pool.size() if is_queue_pool else None,
+            "max_overflow": pool._max_overflow if is_queue_pool else None,
+            "in_use": pool.checkedout() if is_queue_pool else None,
+            "idle": pool.checkedin() if is_queue_pool else None,
+            "overflow": max(0, pool.overflow()) if is_queue_pool else None,
+            "peak_in_use": self.peak_in_use,
+            "checkouts": checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 3) if waits else None,
+            "wait_ms_total": round(self.total_wait_seconds * 1000, 3)
+        }
+
+class _TimedCheckout:
+    """取连接的等待时间：从请求连接到拿到可用连接（包括排队和pre-ping）"""
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            if self.metrics:
+                self.metrics.record_timeout(self._timeout)
+            raise
+        if self.metrics:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose()会用recreate()替换连接池，指标需要延续
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options(url: str, poolclass) -> Dict[str, Any]:
+    """create_engine的连接池参数；SQLite（仅用于开发）沿用SQLAlchemy的默认连接池"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING
+    }
+
+def instrument_engine(engine: Engine, name: str) -> PoolMetrics:
+    """在引擎的连接池上注册事件并返回对应的指标；dispose后新建的连接池沿用同样的事件"""
+    metrics = PoolMetrics(name)
+    if isinstance(engine.pool, _TimedCheckout):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            metrics.record_checkout(pool.checkedout(), pool.checkedout() > pool.size())
+        else:
+            metrics.record_checkout(0, False)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    return metrics
+
+async def warm_up(async_engine, connections: int = POOL_WARMUP) -> int:
+    """同时取出connections个连接并各执行一次SELECT 1，归还后它们留在池中供首批请求使用"""
+    pool = async_engine.sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        # NullPool等不保留连接的连接池无需预热
+        return 0
+    # 超出pool_size的溢出连接归还时会被关闭，预热没有意义
+    connections = min(connections, pool.size())
+    if connections <= 0:
+        return 0
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            conn = await stack.enter_async_context(async_engine.connect())
+            await conn.execute(text("SELECT 1"))
+    return connections
@@ -0,0 +1,208 @@
+import re
+import sqlite3
+import time
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+
+from type_optimizer import base_type, estimate_column_bytes, INTEGER_TYPES, LOB_ESTIMATED_BYTES
+
+if TYPE_CHECKING:
+    from schema_generator import Table, Column
+
+MYSQL_TYPES = {
+    "TINYINT", "SMALLINT", "MEDIUMINT", "INT", "INTEGER", "BIGINT", "DECIMAL", "NUMERIC", "FLOAT",
+    "DOUBLE", "REAL", "BIT", "BOOL", "BOOLEAN", "DATE", "DATETIME", "TIMESTAMP", "TIME", "YEAR",
+    "CHAR", "VARCHAR", "BINARY", "VARBINARY", "TINYBLOB", "BLOB", "MEDIUMBLOB", "LONGBLOB",
+    "TINYTEXT", "TEXT", "MEDIUMTEXT", "LONGTEXT", "ENUM", "SET", "JSON", "GEOMETRY", "POINT",
+}
+# 必须声明长度的类型
+LENGTH_REQUIRED_TYPES = {"VARCHAR", "VARBINARY"}
+# utf8mb4下VARCHAR的最大长度
+MAX_VARCHAR_LENGTH = 16383
+# MySQL单行最大字节数（不含大对象）
+MAX_ROW_BYTES = 65535
+MYSQL_IDENTIFIER_MAX_LENGTH = 64
+VALID_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+# 转换到SQLite时去掉的MySQL专有列约束
+SQLITE_DROPPED_CONSTRAINTS = {"AUTO_INCREMENT", "UNSIGNED", "ZEROFILL"}
+
+def _issue(severity: str, table: Optional[str], column: Optional[str], message: str,
+           source: str = "structure") -> Dict[str, Any]:
+    return {"severity": severity, "table": table, "column": column, "message": message, "source": source}
+
+def _integer_signature(data_type: str) -> tuple:
+    return (base_type(data_type).replace("INTEGER", "INT"), "UNSIGNED" in data_type.upper())
+
+def _check_identifier(issues: List[Dict[str, Any]], name: str, table: Optional[str], column: Optional[str], kind: str):
+    if not VALID_IDENTIFIER.match(name or ""):
+        issues.append(_issue("error", table, column, f"{kind}名 '{name}' 不是合法的标识符"))
+    elif len(name) > MYSQL_IDENTIFIER_MAX_LENGTH:
+        issues.append(_issue("error", table, column, f"{kind}名 '{name}' 超过{MYSQL_IDENTIFIER_MAX_LENGTH}个字符"))
+
+def _check_column_type(issues: List[Dict[str, Any]], table: "Table", col: "Column"):
+    base = base_type(col.data_type)
+    if base not in MYSQL_TYPES:
+        issues.append(_issue("error", table.name, col.name, f"未知的数据类型 '{col.data_type}'"))
+        return
+    length = re.search(r"\((\d+)", col.data_type)
+    if base in LENGTH_REQUIRED_TYPES and not length:
+        issues.append(_issue("error", table.name, col.name, f"{base} 必须声明长度"))
+    if base == "VARCHAR" and length and int(length.group(1)) > MAX_VARCHAR_LENGTH:
+        issues.append(_issue("error", table.name, col.name,
+                             f"VARCHAR长度 {length.group(1)} 超过utf8mb4上限 {MAX_VARCHAR_LENGTH}，应改用TEXT"))
+    if "AUTO_INCREMENT" in col.constraints and base not in INTEGER_TYPES:
+        issues.append(_issue("error", table.name, col.name, f"AUTO_INCREMENT 只能用于整数列，当前类型为 {col.data_type}"))
+
+def validate_structure(tables: List["Table"]) -> List[Dict[str, Any]]:
+    """
+    结构校验：重复表名/列名/约束名、主键、列类型、外键目标及类型兼容性、行宽上限。
+    全部基于哈希查找，一次遍历完成。
+    """
+    issues = []
+    tables_by_name = {}
+    for table in tables:
+        _check_identifier(issues, table.name, table.name, None, "表")
+        if table.name in tables_by_name:
+            issues.append(_issue("error", table.name, None, f"表 {table.name} 重复定义"))
+        tables_by_name[table.name] = table
+
+    constraint_names = set()
+    for table in tables:
+        columns = {}
+        for col in table.columns:
+            _check_identifier(issues, col.name, table.name, col.name, "列")
+            if col.name in columns:
+                issues.append(_issue("error", table.name, col.name, f"列 {col.name} 重复定义"))
+            columns[col.name] = col
+            _check_column_type(issues, table, col)
+
+        # 主键
+        inline_pk = [col.name for col in table.columns if "PRIMARY KEY" in col.constraints]
+        if len(inline_pk) > 1:
+            issues.append(_issue("error", table.name, ", ".join(inline_pk),
+                                 "多个列声明了PRIMARY KEY，组合主键需要使用表级PRIMARY KEY"))
+        if not table.primary_key_columns():
+            issues.append(_issue("warning", table.name, None, "表没有主键"))
+        for name in table.primary_key:
+            if name not in columns:
+                issues.append(_issue("error", table.name, name, f"主键列 {name} 不存在"))
+
+        # 行宽
+        row_bytes = sum(estimate_column_bytes(col.data_type) for col in table.columns
+                        if base_type(col.data_type) not in LOB_ESTIMATED_BYTES)
+        if row_bytes > MAX_ROW_BYTES:
+            issues.append(_issue("error", table.name, None,
+                                 f"行宽约 {row_bytes} 字节，超过MySQL上限 {MAX_ROW_BYTES}，需将部分VARCHAR改为TEXT"))
+
+        # 索引
+        index_names = set()
+        for index in table.indexes:
+            if index.name in index_names:
+                issues.append(_issue("error", table.name, None, f"索引名 {index.name} 重复"))
+            index_names.add(index.name)
+            for name in index.columns:
+                if name not in columns:
+                    issues.append(_issue("error", table.name, name, f"索引 {index.name} 引用的列 {name} 不存在"))
+
+        # 外键
+        for fk in table.foreign_keys:
+            if fk.name in constraint_names:
+                issues.append(_issue("error", table.name, fk.column, f"约束名 {fk.name} 重复"))
+            constraint_names.add(fk.name)
+            col = columns.get(fk.column)
+            if col is None:
+                issues.append(_issue("error", table.name, fk.column, f"外键列 {fk.column} 不存在"))
+                continue
+            if fk.on_delete and fk.on_delete.upper() == "SET NULL" and "NOT NULL" in col.constraints:
+                issues.append(_issue("error", table.name, fk.column,
+                                     f"外键 ON DELETE SET NULL 要求列 {fk.column} 可为NULL，但该列为NOT NULL"))
+            ref_table = tables_by_name.get(fk.ref_table)
+            if ref_table is None:
+                issues.append(_issue("error", table.name, fk.column, f"外键引用的表 {fk.ref_table} 不存在"))
+                continue
+            ref_col = next((c for c in ref_table.columns if c.name == fk.ref_column), None)
+            if ref_col is None:
+                issues.append(_issue("error", table.name, fk.column,
+                                     f"外键引用的列 {fk.ref_table}.{fk.ref_column} 不存在"))
+                continue
+            ref_keys = [ref_table.primary_key_columns()] + [idx.columns for idx in ref_table.indexes]
+            if not any(key and key[0] == fk.ref_column for key in ref_keys):
+                issues.append(_issue("error", table.name, fk.column,
+                                     f"被引用列 {fk.ref_table}.{fk.ref_column} 上没有索引"))
+            if base_type(col.data_type) in INTEGER_TYPES or base_type(ref_col.data_type) in INTEGER_TYPES:
+                if _integer_signature(col.data_type) != _integer_signature(ref_col.data_type):
+                    issues.append(_issue("error", table.name, fk.column,
+                                         f"外键列类型 {col.data_type} 与被引用列 {fk.ref_table}.{fk.ref_column} "
+                                         f"的类型 {ref_col.data_type} 不兼容"))
+            elif base_type(col.data_type) != base_type(ref_col.data_type):
+                issues.append(_issue("warning", table.name, fk.column,
+                                     f"外键列类型 {col.data_type} 与被引用列类型 {ref_col.data_type} 不一致"))
+    return issues
+
+def _sqlite_type(data_type: str) -> str:
+    sqlite_type = re.sub(r"\s+CHARACTER\s+SET\s+\w+", "", data_type, flags=re.IGNORECASE)
+    sqlite_type = re.sub(r"\b(UNSIGNED|ZEROFILL)\b", "", sqlite_type, flags=re.IGNORECASE).strip()
+    if base_type(sqlite_type) in ("ENUM", "SET"):
+        return "TEXT"
+    return sqlite_type
+
+def sqlite_statements(tables: List["Table"]) -> List[Dict[str, Any]]:
+    """
+    把关系模式翻译为SQLite可执行的DDL，每条语句附带所属的表名。
+    去掉AUTO_INCREMENT、UNSIGNED、字符集、注释和分区等MySQL专有语法，索引改为单独的CREATE INDEX。
+    """
+    statements = []
+    for table in tables:
+        lines = []
+        for col in table.columns:
+            constraints = [c for c in col.constraints if c.upper() not in SQLITE_DROPPED_CONSTRAINTS]
+            lines.append(" ".join([col.name, _sqlite_type(col.data_type)] + constraints).strip())
+        if table.primary_key:
+            lines.append(f"PRIMARY KEY ({', '.join(table.primary_key)})")
+        for fk in table.foreign_keys:
+            clause = f"FOREIGN KEY ({fk.column}) REFERENCES {fk.ref_table}({fk.ref_column})"
+            if fk.on_delete:
+                clause += f" ON DELETE {fk.on_delete}"
+            lines.append(clause)
+        statements.append({"table": table.name,
+                           "sql": f"CREATE TABLE {table.name} (\n  " + ",\n  ".join(lines) + "\n)"})
+        for index in table.indexes:
+            kind = "UNIQUE INDEX" if index.unique else "INDEX"
+            statements.append({"table": table.name,
+                               "sql": f"CREATE {kind} {index.name} ON {table.name} ({', '.join(index.columns)})"})
+    return statements
+
+def dry_run_sqlite(tables: List["Table"]) -> List[Dict[str, Any]]:
+    """
+    在内存SQLite数据库中逐条执行翻译后的DDL，返回执行失败的语句对应的问题。
+    """
+    issues = []
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")
+        for statement in sqlite_statements(tables):
+            try:
+                conn.execute(statement["sql"])
+            except sqlite3.Error as e:
+                message = str(e)
+                column = re.search(r"column[:\s]+(?:name:\s*)?(\w+)", message)
+                issues.append(_issue("error", statement["table"], column.group(1) if column else None,
+                                     f"SQLite试执行失败: {message}", "sqlite"))
+    finally:
+        conn.close()
+    return issues
+
+def validate_tables(tables: List["Table"], sqlite_dry_run: bool = False) -> Dict[str, Any]:
+    """
+    校验生成的关系模式：结构校验，可选在内存SQLite中试执行。
+    返回是否有效（没有error级问题）、问题列表和耗时。
+    """
+    start = time.perf_counter()
+    issues = validate_structure(tables)
+    if sqlite_dry_run:
+        issues.extend(dry_run_sqlite(tables))
+    return {
+        "valid": not any(issue["severity"] == "error" for issue in issues),
+        "issues": issues,
+        "sqlite_checked": sqlite_dry_run,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
@@ -0,0 +1,199 @@
+"""
+会话的版本化修改记录。
+
+交互记录只保存会话当前的schema；每次修改另在session_edits中追加一行，保存相对父版本的JSON Patch（RFC 6902，
+只包含add/remove/replace），每隔SNAPSHOT_INTERVAL个版本保存一次完整快照。快照按内容寻址引用schema_blobs，
+与交互记录引用的schema共享同一行。第一次修改时把修改前的schema记为版本0（快照），从未修改过的会话不产生记录。
+
+撤销把会话移到当前版本的父版本，重做移到当前版本最新的子版本；撤销后再修改会从当前版本分出新的分支，
+旧分支保留在记录中，仍可按版本号读取。任意版本由最近的快照沿父版本链依次应用补丁重建，
+代价与快照之后的补丁数成正比，不超过SNAPSHOT_INTERVAL。
+"""
+import copy
+import difflib
+import json
+import os
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from database import InteractionRecord, SessionEdit, SchemaBlob
+from schema_store import acquire_schema
+from artifact_cache import record_options
+
+# 每条版本链上相隔多少个版本保存一次完整快照
+SNAPSHOT_INTERVAL = int(os.getenv("EDIT_LOG_SNAPSHOT_INTERVAL", "20"))
+BASE_OPERATION = "generate"
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    生成把old变为new的JSON Patch。字典按键比较；列表按元素内容求最长公共子序列，只对变化的区段生成操作，
+    修改、增加或删除实体（连同散布在关系列表中的外键）只产生针对这些元素的操作。
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                patch.extend(make_patch(old[key], value, f"{path}/{_escape(key)}"))
+        return patch
+    if isinstance(old, list) and isinstance(new, list):
+        matcher = difflib.SequenceMatcher(None, [json.dumps(item, sort_keys=True) for item in old],
+                                          [json.dumps(item, sort_keys=True) for item in new], autojunk=False)
+        patch = []
+        # 依次处理各区段；处理到某一区段时列表的前j1个元素已与new相同，其后仍是old中未处理的元素
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            paired = min(i2 - i1, j2 - j1)
+            for offset in range(paired):
+                patch.extend(make_patch(old[i1 + offset], new[j1 + offset], f"{path}/{j1 + offset}"))
+            # 多出的旧元素依次删除同一位置，多出的新元素依次插入
+            for _ in range(i2 - i1 - paired):
+                patch.append({"op": "remove", "path": f"{path}/{j1 + paired}"})
+            for offset in range(paired, j2 - j1):
+                patch.append({"op": "add", "path": f"{path}/{j1 + offset}", "value": new[j1 + offset]})
+        return patch
+    return [{"op": "replace", "path": path, "value": new}]
+
+def apply_patch(document: Any, patch: List[Dict[str, Any]]) -> Any:
+    """在document上就地应用补丁并返回结果（替换根节点时返回新值）"""
+    for operation in patch:
+        tokens = [_unescape(token) for token in operation["path"].split("/")[1:]]
+        if not tokens:
+            document = copy.deepcopy(operation["value"])
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        key = tokens[-1]
+        op = operation["op"]
+        if isinstance(parent, list):
+            index = len(parent) if key == "-" else int(key)
+            if op == "add":
+                parent.insert(index, copy.deepcopy(operation["value"]))
+            elif op == "remove":
+                del parent[index]
+            elif op == "replace":
+                parent[index] = copy.deepcopy(operation["value"])
+            else:
+                raise ValueError(f"不支持的补丁操作: {op}")
+        else:
+            if op in ("add", "replace"):
+                parent[key] = copy.deepcopy(operation["value"])
+            elif op == "remove":
+                del parent[key]
+            else:
+                raise ValueError(f"不支持的补丁操作: {op}")
+    return document
+
+def _get_edit(db: Session, session_id: str, version: int) -> Optional[SessionEdit]:
+    return db.execute(select(SessionEdit).where(
+        SessionEdit.session_id == session_id, SessionEdit.version == version
+    )).scalar_one_or_none()
+
+def append_edit(db: Session, record: InteractionRecord, operation: str,
+                previous_schema: Dict[str, Any], schema: Dict[str, Any],
+                options: Optional[Dict[str, Any]] = None) -> int:
+    """
+    记录一次修改并把会话移到新版本，返回新版本号。与更新交互记录在同一事务中提交。
+    options为编译新版本时使用的编译参数。会话还没有修改记录时先把previous_schema记为版本0，
+    版本0的编译参数取自交互记录（此时交互记录仍是修改前的内容）。
+    """
+    if record.current_version is None:
+        db.add(SessionEdit(
+            session_id=record.session_id, version=0, parent_version=None, operation=BASE_OPERATION,
+            snapshot_hash=acquire_schema(db, previous_schema), snapshot_version=0, depth=0,
+            compile_options=record_options(record)
+        ))
+        record.current_version = 0
+        parent = None
+        version = 1
+    else:
+        parent = _get_edit(db, record.session_id, record.current_version)
+        version = db.execute(
+            select(func.max(SessionEdit.version)).where(SessionEdit.session_id == record.session_id)
+        ).scalar() + 1
+    depth = 0 if parent is None else parent.depth
+    edit = SessionEdit(
+        session_id=record.session_id,
+        version=version,
+        parent_version=record.current_version,
+        operation=operation,
+        patch=make_patch(previous_schema, schema),
+        compile_options=options
+    )
+    if depth + 1 >= SNAPSHOT_INTERVAL:
+        edit.snapshot_hash = acquire_schema(db, schema)
+        edit.snapshot_version = version
+        edit.depth = 0
+    else:
+        edit.snapshot_version = parent.snapshot_version if parent is not None else 0
+        edit.depth = depth + 1
+    db.add(edit)
+    record.current_version = version
+    return version
+
+def schema_at(db: Session, session_id: str, version: int) -> Optional[Dict[str, Any]]:
+    """重建会话在指定版本的schema；版本不存在时返回None"""
+    target = _get_edit(db, session_id, version)
+    if target is None:
+        return None
+    # 快照到目标版本之间的记录，其中不在目标版本的父版本链上的分支被忽略
+    edits = {edit.version: edit for edit in db.execute(select(SessionEdit).where(
+        SessionEdit.session_id == session_id,
+        SessionEdit.version >= target.snapshot_version,
+        SessionEdit.version <= version
+    )).scalars()}
+    chain = []
+    edit = target
+    while edit.snapshot_hash is None:
+        chain.append(edit)
+        edit = edits[edit.parent_version]
+    snapshot = db.get(SchemaBlob, edit.snapshot_hash)
+    schema = copy.deepcopy(snapshot.content)
+    for edit in reversed(chain):
+        schema = apply_patch(schema, edit.patch)
+    return schema
+
+def options_at(db: Session, session_id: str, version: int) -> Optional[Dict[str, Any]]:
+    """编译指定版本时使用的编译参数；版本不存在或是引入该列之前的记录时返回None"""
+    return db.execute(select(SessionEdit.compile_options).where(
+        SessionEdit.session_id == session_id, SessionEdit.version == version
+    )).scalar()
+
+def undo_target(db: Session, record: InteractionRecord) -> Optional[int]:
+    """撤销后的版本：当前版本的父版本；没有可撤销的修改时返回None"""
+    if record.current_version is None:
+        return None
+    return _get_edit(db, record.session_id, record.current_version).parent_version
+
+def redo_target(db: Session, record: InteractionRecord) -> Optional[int]:
+    """重做后的版本：当前版本最新的子版本；没有可重做的修改时返回None"""
+    if record.current_version is None:
+        return None
+    return db.execute(select(func.max(SessionEdit.version)).where(
+        SessionEdit.session_id == record.session_id,
+        SessionEdit.parent_version == record.current_version
+    )).scalar()
+
+def list_versions(db: Session, session_id: str) -> List[Dict[str, Any]]:
+    """会话的所有版本（不含补丁内容），按版本号排序"""
+    rows = db.execute(select(
+        SessionEdit.version, SessionEdit.parent_version, SessionEdit.operation,
+        SessionEdit.snapshot_hash.isnot(None).label("snapshot"), SessionEdit.created_at
+    ).where(SessionEdit.session_id == session_id).order_by(SessionEdit.version)).all()
+    return [row._asdict() for row in rows]
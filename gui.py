@@ -272,6 +272,11 @@ class SchemaGeneratorGUI(QWidget):
 
         # 显示关系模式（从DDL推断）
         relational_str = self.parse_ddl_to_relational(self.current_ddl)
+        lint = data.get("lint") or []
+        if lint:
+            relational_str += "\n性能检查:\n"
+            for finding in lint:
+                relational_str += f"  [{finding['severity']}] {finding['message']}\n"
         self.relational_text.setPlainText(relational_str)
 
         # 显示DDL
@@ -280,17 +285,29 @@ class SchemaGeneratorGUI(QWidget):
 
     def parse_ddl_to_relational(self, ddl):
         # 简单解析DDL显示表结构
-        tables = ddl.strip().split(');\n\n')
+        statements = [stmt.strip() for stmt in ddl.split(';\n') if stmt.strip()]
         relational = ""
-        for table_ddl in tables:
-            if table_ddl.strip():
-                lines = table_ddl.strip().split('\n')
-                table_name = lines[0].replace('CREATE TABLE ', '').replace(' (', '')
-                relational += f"表: {table_name}\n"
-                for line in lines[1:]:
-                    if line.strip() and not line.strip().startswith(')'):
-                        relational += f"  {line.strip()}\n"
-                relational += "\n"
+        deferred = ""
+        for stmt in statements:
+            if stmt.startswith('ALTER TABLE '):
+                # 环形依赖的外键在建表后追加
+                deferred += f"  {stmt}\n"
+                continue
+            lines = stmt.split('\n')
+            table_name = lines[0].replace('CREATE TABLE ', '').replace(' (', '')
+            relational += f"表: {table_name}\n"
+            for line in lines[1:]:
+                if line.strip().startswith(')'):
+                    # 建表语句结束，后面可能是分区子句
+                    if 'PARTITION BY' in line:
+                        partition = line.strip()[1:].strip().rstrip('(').strip()
+                        relational += f"  分区: {partition}\n"
+                    break
+                if line.strip():
+                    relational += f"  {line.strip()}\n"
+            relational += "\n"
+        if deferred:
+            relational += f"延迟添加的外键:\n{deferred}"
         return relational
 
     def execute_sql(self):
@@ -307,11 +324,9 @@ class SchemaGeneratorGUI(QWidget):
                 database="db_generator"
             )
             cursor = conn.cursor()
-            # 分割DDL并执行
-            statements = [stmt.strip() for stmt in self.current_ddl.split(';') if stmt.strip()]
-            for stmt in statements:
-                if stmt:
-                    cursor.execute(stmt)
+            # DDL已按外键依赖排序，整个脚本一次性多语句执行
+            for _ in cursor.execute(self.current_ddl, multi=True):
+                pass
             conn.commit()
             QMessageBox.information(self, "成功", "SQL执行成功")
         except mysql.connector.Error as e:
@@ -335,19 +350,14 @@ class SchemaGeneratorGUI(QWidget):
             # 为了简单，假设修改后重新调用generate_schema，但需要传递修改后的schema
             # 后端没有接受schema的端点，所以需要添加一个端点或在前端处理
             # 暂时用前端逻辑重新生成
-            from schema_generator import build_er_model, convert_to_relational_schema, generate_mysql_ddl
-            er_model = build_er_model(self.current_schema)
-            relational_schema = convert_to_relational_schema(self.current_schema)
-            ddl = generate_mysql_ddl(relational_schema)
-            self.current_ddl = ddl
+            from schema_generator import compile_schema
+            compiled = compile_schema(self.current_schema)
+            self.current_ddl = compiled["ddl"]
             # 构造data
             data = {
                 "schema": self.current_schema,
-                "er_model": {
-                    "entities": [{"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key} for e in er_model.entities],
-                    "relationships": [{"name": r.name, "entities": r.entities, "cardinality": r.cardinality} for r in er_model.relationships]
-                },
-                "ddl": ddl
+                "er_model": compiled["er_model"],
+                "ddl": compiled["ddl"]
             }
             self.display_results(data)
 
@@ -582,7 +592,7 @@ class HistoryDialog(QDialog):
         control_layout.addWidget(self.limit_combo)
 
         self.refresh_btn = QPushButton("刷新")
-        self.refresh_btn.clicked.connect(self.load_history)
+        self.refresh_btn.clicked.connect(self.reload_history)
         control_layout.addWidget(self.refresh_btn)
 
         control_layout.addStretch()
@@ -615,19 +625,33 @@ class HistoryDialog(QDialog):
 
         self.current_page = 0
         self.total_count = 0
+        self.next_cursor = None
+        self.prev_cursor = None
         self.load_history()
 
-    def load_history(self):
+    def reload_history(self):
+        """回到第一页重新加载"""
+        self.current_page = 0
+        self.load_history()
+
+    def load_history(self, cursor=None, direction="next"):
+        """按游标加载一页；返回是否加载成功"""
         try:
             limit = int(self.limit_combo.currentText())
-            skip = self.current_page * limit
+            # 列表只需要摘要，完整内容在查看时按session获取
+            params = {"limit": limit, "direction": direction, "fields": "summary"}
+            if cursor:
+                params["cursor"] = cursor
             headers = {"Authorization": f"Bearer {self.access_token}"}
-            response = requests.get(f"http://localhost:8000/user/history?skip={skip}&limit={limit}", headers=headers)
+            response = requests.get("http://localhost:8000/user/history", params=params, headers=headers)
             if response.status_code == 200:
                 data = response.json()
-                self.total_count = data["total_count"]
+                self.total_count = data["total_count"] or 0
+                self.next_cursor = data.get("next_cursor")
+                self.prev_cursor = data.get("prev_cursor")
                 self.display_history(data["records"])
                 self.update_pagination()
+                return True
             elif response.status_code == 401:
                 QMessageBox.critical(self, "错误", "认证失败")
                 self.reject()
@@ -637,6 +661,7 @@ class HistoryDialog(QDialog):
             QMessageBox.critical(self, "错误", "无法连接到后端服务器")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"发生错误: {str(e)}")
+        return False
 
     def display_history(self, records):
         self.table.setRowCount(len(records))
@@ -652,31 +677,44 @@ class HistoryDialog(QDialog):
             view_btn.clicked.connect(lambda checked, r=record: self.view_record(r))
             self.table.setCellWidget(row, 2, view_btn)
             # 详情
-            self.table.setItem(row, 3, QTableWidgetItem(f"Session: {record['session_id']}"))
+            detail = f"Session: {record['session_id']}"
+            if record.get("table_count") is not None:
+                detail += f" | {record['table_count']} 张表"
+            self.table.setItem(row, 3, QTableWidgetItem(detail))
 
     def view_record(self, record):
-        """查看记录详情"""
-        dialog = RecordDetailDialog(record, self)
-        dialog.exec()
+        """获取记录的完整内容并查看详情"""
+        try:
+            headers = {"Authorization": f"Bearer {self.access_token}"}
+            response = requests.get(f"http://localhost:8000/sessions/{record['session_id']}", headers=headers)
+            if response.status_code == 200:
+                dialog = RecordDetailDialog(response.json(), self)
+                dialog.exec()
+            else:
+                QMessageBox.critical(self, "错误", f"获取记录详情失败: {response.status_code}")
+        except requests.exceptions.ConnectionError:
+            QMessageBox.critical(self, "错误", "无法连接到后端服务器")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"发生错误: {str(e)}")
 
     def update_pagination(self):
         limit = int(self.limit_combo.currentText())
-        total_pages = (self.total_count + limit - 1) // limit
+        total_pages = max((self.total_count + limit - 1) // limit, self.current_page + 1)
         current_page_display = self.current_page + 1
         self.page_label.setText(f"第 {current_page_display} 页 / 共 {total_pages} 页")
-        self.prev_btn.setEnabled(self.current_page > 0)
-        self.next_btn.setEnabled(current_page_display < total_pages)
+        self.prev_btn.setEnabled(self.prev_cursor is not None)
+        self.next_btn.setEnabled(self.next_cursor is not None)
 
     def prev_page(self):
-        if self.current_page > 0:
-            self.current_page -= 1
-            self.load_history()
+        if self.prev_cursor and self.load_history(self.prev_cursor, "prev"):
+            # 回到最新的记录时没有上一页游标，页码归零
+            self.current_page = self.current_page - 1 if self.prev_cursor else 0
+            self.update_pagination()
 
     def next_page(self):
-        limit = int(self.limit_combo.currentText())
-        if (self.current_page + 1) * limit < self.total_count:
+        if self.next_cursor and self.load_history(self.next_cursor, "next"):
             self.current_page += 1
-            self.load_history()
+            self.update_pagination()
 
 
 class RecordDetailDialog(QDialog):
@@ -747,9 +785,12 @@ class ModifyEntitiesDialog(QDialog):
         self.schema = schema.copy()
         self.session_id = session_id
         self.access_token = access_token
+        # 当前显示的schema对应的会话修订号，修改时传给服务端；会话已被其他窗口修改时服务端返回409
+        self.revision = None
         self.setWindowTitle("修改实体和关系")
         self.setGeometry(200, 200, 800, 600)
         self.initUI()
+        self.refresh_schema()
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -930,16 +971,17 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "entity_name": entity["table_name"],
                 "new_attributes": entity["attributes"],
                 "new_table_name": entity.get("new_table_name")
             }
             response = requests.put("http://localhost:8000/modify-entity", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "实体修改成功")
+                self.show_success("实体修改成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"修改失败: {response.text}")
+                self.show_error("修改失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
@@ -949,14 +991,15 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "entity": entity
             }
             response = requests.post("http://localhost:8000/add-entity", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "实体添加成功")
+                self.show_success("实体添加成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"添加失败: {response.text}")
+                self.show_error("添加失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
@@ -966,14 +1009,15 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "entity_name": entity_name
             }
             response = requests.request("DELETE", "http://localhost:8000/delete-entity", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "实体删除成功")
+                self.show_success("实体删除成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"删除失败: {response.text}")
+                self.show_error("删除失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
@@ -983,15 +1027,16 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "old_relationship": old_relation,
                 "new_relationship": new_relation
             }
             response = requests.put("http://localhost:8000/modify-relationship", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "关系修改成功")
+                self.show_success("关系修改成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"修改失败: {response.text}")
+                self.show_error("修改失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
@@ -1001,14 +1046,15 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "relationship": relation
             }
             response = requests.post("http://localhost:8000/add-relationship", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "关系添加成功")
+                self.show_success("关系添加成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"添加失败: {response.text}")
+                self.show_error("添加失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
@@ -1018,29 +1064,47 @@ class ModifyEntitiesDialog(QDialog):
             headers = {"Authorization": f"Bearer {self.access_token}"}
             payload = {
                 "session_id": self.session_id,
+                "expected_revision": self.revision,
                 "relationship": relation
             }
             response = requests.request("DELETE", "http://localhost:8000/delete-relationship", json=payload, headers=headers)
             if response.status_code == 200:
-                QMessageBox.information(self, "成功", "关系删除成功")
+                self.show_success("关系删除成功", response.json())
                 self.refresh_schema()
             else:
-                QMessageBox.critical(self, "错误", f"删除失败: {response.text}")
+                self.show_error("删除失败", response)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"网络错误: {str(e)}")
 
+    def show_success(self, message, data):
+        """显示修改成功信息及对应的迁移语句"""
+        migration = data.get("migration") or []
+        if migration:
+            message += "\n\n迁移语句:\n" + "\n".join(migration)
+        problems = [finding for finding in data.get("lint") or [] if finding["severity"] != "info"]
+        if problems:
+            message += "\n\n性能检查:\n" + "\n".join(f"[{f['severity']}] {f['message']}" for f in problems[:10])
+        QMessageBox.information(self, "成功", message)
+
+    def show_error(self, message, response):
+        """显示修改失败信息；会话已被其他窗口修改时重新加载后由用户重新操作"""
+        if response.status_code == 409:
+            QMessageBox.warning(self, "会话已更新", "该会话已在其他窗口中被修改，已重新加载最新内容，请重新操作")
+            self.refresh_schema()
+        else:
+            QMessageBox.critical(self, "错误", f"{message}: {response.text}")
+
     def refresh_schema(self):
-        """刷新schema数据"""
+        """刷新schema数据及其修订号"""
         try:
             headers = {"Authorization": f"Bearer {self.access_token}"}
-            response = requests.get(f"http://localhost:8000/user/history?skip=0&limit=1", headers=headers)
+            response = requests.get(f"http://localhost:8000/sessions/{self.session_id}", headers=headers)
             if response.status_code == 200:
                 data = response.json()
-                if data["records"]:
-                    record = data["records"][0]
-                    self.schema = record["schema_result"]
-                    self.load_entities()
-                    self.load_relations()
+                self.schema = data["schema_result"]
+                self.revision = data["revision"]
+                self.load_entities()
+                self.load_relations()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"刷新失败: {str(e)}")
 
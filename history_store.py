@@ -0,0 +1,121 @@
+"""
+历史记录的键集分页和按用户维护的记录数。
+
+摘要模式只选取列表需要的几列（描述截取前缀），schema、ER模型和DDL等大字段不从数据库读取。
+
+分页按 (created_at, id) 倒序，游标为上一页首条或末条记录的这两个值经base64编码后的字符串，
+下一页只需沿 (user_id, created_at DESC) 索引从游标处继续读取limit条，不再像OFFSET那样扫描并丢弃之前的所有行，
+任意深度的页面耗时相同。总数由users.history_count提供，新增记录时在同一事务中加一；
+引入该列之前的用户在第一次读取时按实际记录数回填。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.orm import Session
+
+from database import User, InteractionRecord
+
+# 摘要模式返回的描述长度（字符）
+SUMMARY_DESCRIPTION_LENGTH = 100
+
+def summary_columns():
+    return (
+        InteractionRecord.id,
+        InteractionRecord.session_id,
+        func.substr(InteractionRecord.description, 1, SUMMARY_DESCRIPTION_LENGTH).label("description"),
+        InteractionRecord.created_at,
+        InteractionRecord.table_count
+    )
+
+def encode_cursor(record) -> str:
+    """record为交互记录或摘要行，只用到created_at和id"""
+    payload = json.dumps([record.created_at.isoformat(), record.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise ValueError("无效的分页游标")
+
+def history_page(db: Session, user_id: int, limit: int, cursor: Optional[str] = None,
+                 direction: str = "next", skip: int = 0, summary: bool = False) -> Dict[str, Any]:
+    """
+    返回一页记录（按创建时间倒序）及前后页的游标。
+    direction为next时返回游标之后（更早）的记录，为prev时返回游标之前（更新）的记录；没有游标时返回第一页。
+    skip只为兼容按偏移量分页的旧客户端，没有游标时才生效。
+    summary为真时返回summary_columns()的行而不是完整的交互记录。
+    """
+    if direction not in ("next", "prev"):
+        raise ValueError("direction 只能为 next 或 prev")
+    query = select(*summary_columns()) if summary else select(InteractionRecord)
+    query = query.where(InteractionRecord.user_id == user_id)
+    backwards = cursor is not None and direction == "prev"
+    if cursor is not None:
+        created_at, record_id = decode_cursor(cursor)
+        # 展开的写法让created_at上的范围条件能直接用于索引
+        if backwards:
+            query = query.where(InteractionRecord.created_at >= created_at, or_(
+                InteractionRecord.created_at > created_at,
+                and_(InteractionRecord.created_at == created_at, InteractionRecord.id > record_id)
+            ))
+        else:
+            query = query.where(InteractionRecord.created_at <= created_at, or_(
+                InteractionRecord.created_at < created_at,
+                and_(InteractionRecord.created_at == created_at, InteractionRecord.id < record_id)
+            ))
+    if backwards:
+        query = query.order_by(InteractionRecord.created_at.asc(), InteractionRecord.id.asc())
+    else:
+        query = query.order_by(InteractionRecord.created_at.desc(), InteractionRecord.id.desc())
+
+    if cursor is None and skip > 0:
+        query = query.offset(skip)
+
+    # 多取一条判断是否还有下一页
+    result = db.execute(query.limit(limit + 1))
+    records: List[Any] = list(result.all() if summary else result.scalars().all())
+    has_more = len(records) > limit
+    records = records[:limit]
+    if backwards:
+        records.reverse()
+
+    if not records:
+        return {"records": [], "next_cursor": None, "prev_cursor": None}
+    if backwards:
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = cursor is not None or skip > 0, has_more
+    return {
+        "records": records,
+        "next_cursor": encode_cursor(records[-1]) if has_older else None,
+        "prev_cursor": encode_cursor(records[0]) if has_newer else None
+    }
+
+def history_count(db: Session, user: User) -> int:
+    """用户的记录数；计数尚未建立的旧用户按实际记录数回填"""
+    if user.history_count is not None:
+        return user.history_count
+    actual = select(func.count(InteractionRecord.id)).where(
+        InteractionRecord.user_id == user.id
+    ).scalar_subquery()
+    # 条件更新与并发的新增记录互不覆盖：已由其他请求回填时不再修改
+    db.execute(
+        update(User).where(User.id == user.id, User.history_count.is_(None))
+        .values(history_count=actual).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.execute(select(User.history_count).where(User.id == user.id)).scalar_one()
+
+def adjust_history_count(db: Session, user_id: int, delta: int):
+    """新增或删除记录时在同一事务中调整计数；计数尚未建立（NULL）时保持NULL，由history_count回填"""
+    db.execute(
+        update(User).where(User.id == user_id)
+        .values(history_count=User.history_count + delta).execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,478 @@
+import math
+import re
+import sqlite3
+from typing import Dict, List, Any, Optional, Tuple
+
+from schema_generator import Table, Index, call_llm_json, FILTER_COLUMN_NAMES, NON_INDEXABLE_TYPES
+from type_optimizer import base_type
+from ddl_validator import sqlite_statements
+
+# 未给出行数估计的表按该行数计算代价
+DEFAULT_TABLE_ROWS = 100000
+# 等值条件的默认选择率；状态、类型等低基数列选择率较高
+DEFAULT_EQ_SELECTIVITY = 0.01
+LOW_CARDINALITY_SELECTIVITY = 0.2
+RANGE_SELECTIVITY = 0.1
+# 通过二级索引回表读取一行的相对代价（相对顺序扫描一行）
+LOOKUP_COST = 3.0
+DEFAULT_MAX_INDEX_COLUMNS = 4
+# 写代价预算：每个新增索引的代价为所在表的相对写入频率乘以 (1 + 0.25 * (列数 - 1))
+DEFAULT_WRITE_BUDGET = 3.0
+EXTRA_COLUMN_WRITE_COST = 0.25
+# 收益低于该比例的候选索引不值得维护
+MIN_RELATIVE_BENEFIT = 0.01
+
+SELECT_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>\w+)(?:\s+(?:AS\s+)?\w+)?"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+GROUP\s+BY\s+(?P<group>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?(?:\s+LIMIT\s+\d+(?:\s*,\s*\d+)?)?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+EQ_PREDICATE = re.compile(r"^(?:\w+\.)?(\w+)\s*(?:=|<=>|\s+IN\s*\(|\s+IS\s+NULL)", re.IGNORECASE)
+RANGE_PREDICATE = re.compile(r"^(?:\w+\.)?(\w+)\s*(?:<=|>=|<|>|\s+BETWEEN\s|\s+LIKE\s+'[^%_])", re.IGNORECASE)
+
+def _column_list(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    columns = []
+    for part in text.split(","):
+        match = re.match(r"^\s*(?:\w+\.)?(\w+)\s*(?:ASC|DESC)?\s*$", part, re.IGNORECASE)
+        if match:
+            columns.append(match.group(1))
+    return columns
+
+def parse_query_sql(sql: str) -> Dict[str, Any]:
+    """
+    把单表SELECT语句解析为访问模式：等值列、范围列、排序/分组列和查询列。
+    只识别AND连接的简单谓词；含OR或子查询的WHERE不用于选择索引。
+    """
+    match = SELECT_PATTERN.match(sql)
+    if not match:
+        raise ValueError(f"只支持单表SELECT语句: {sql}")
+    equals, ranges = [], []
+    where = match.group("where")
+    if where and not re.search(r"\bOR\b|\bSELECT\b", where, re.IGNORECASE):
+        predicates = re.split(r"\s+AND\s+(?![^()]*\))", where, flags=re.IGNORECASE)
+        for predicate in _merge_between(predicates):
+            predicate = predicate.strip().strip("()")
+            eq = EQ_PREDICATE.match(predicate)
+            if eq:
+                equals.append(eq.group(1))
+                continue
+            rng = RANGE_PREDICATE.match(predicate)
+            if rng:
+                ranges.append(rng.group(1))
+    select = match.group("select").strip()
+    return {
+        "sql": sql.strip().rstrip(";"),
+        "table": match.group("table"),
+        "equals": equals,
+        "ranges": ranges,
+        "order_by": _column_list(match.group("group")) or _column_list(match.group("order")),
+        "select": ["*"] if select == "*" else _column_list(select)
+    }
+
+def _merge_between(predicates: List[str]) -> List[str]:
+    """BETWEEN a AND b 中的AND不是谓词分隔符，把拆开的两段重新合并。"""
+    merged = []
+    for predicate in predicates:
+        if merged and re.search(r"\bBETWEEN\s+\S+$", merged[-1], re.IGNORECASE):
+            merged[-1] += " AND " + predicate
+        else:
+            merged.append(predicate)
+    return merged
+
+def render_query_sql(query: Dict[str, Any]) -> str:
+    """把结构化访问模式还原为参数化SELECT语句，用于EXPLAIN。"""
+    conditions = [f"{col} = ?" for col in query["equals"]] + [f"{col} >= ?" for col in query["ranges"]]
+    # 没有查询列时视为按排序列分组统计
+    grouped = not query["select"] and query["order_by"]
+    select = ", ".join(query["select"]) if query["select"] else ", ".join(query["order_by"] + ["COUNT(*)"])
+    sql = f"SELECT {select} FROM {query['table']}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if query["order_by"]:
+        sql += (" GROUP BY " if grouped else " ORDER BY ") + ", ".join(query["order_by"])
+    return sql
+
+def normalize_workload(queries: List[Dict[str, Any]], tables: List[Table]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    统一查询格式（SQL或结构化访问模式），丢弃引用不存在的表或列的条件，返回(查询列表, 警告)。
+    """
+    tables_by_name = {table.name: table for table in tables}
+    normalized, warnings = [], []
+    for position, query in enumerate(queries):
+        label = query.get("description") or query.get("sql") or f"查询{position + 1}"
+        try:
+            spec = parse_query_sql(query["sql"]) if query.get("sql") else {
+                "sql": None,
+                "table": query.get("table"),
+                "equals": list(query.get("equals") or []),
+                "ranges": list(query.get("ranges") or []),
+                "order_by": list(query.get("order_by") or []),
+                "select": list(query.get("select") or [])
+            }
+        except ValueError as e:
+            warnings.append(str(e))
+            continue
+        table = tables_by_name.get(spec["table"])
+        if table is None:
+            warnings.append(f"{label}: 表 {spec['table']} 不存在")
+            continue
+        columns = {col.name for col in table.columns}
+        for key in ("equals", "ranges", "order_by", "select"):
+            unknown = [name for name in spec[key] if name != "*" and name not in columns]
+            if unknown:
+                warnings.append(f"{label}: 表 {table.name} 没有列 {', '.join(unknown)}")
+            spec[key] = list(dict.fromkeys(name for name in spec[key] if name == "*" or name in columns))
+        spec["ranges"] = [name for name in spec["ranges"] if name not in spec["equals"]]
+        spec["description"] = label
+        spec["frequency"] = float(query.get("frequency") or 1.0)
+        spec["sql"] = spec["sql"] or render_query_sql(spec)
+        normalized.append(spec)
+    return normalized, warnings
+
+class CostModel:
+    """基于行数估计和列选择率的简化代价模型，代价单位为顺序读取一行。"""
+
+    def __init__(self, tables: List[Table], row_estimates: Optional[Dict[str, int]] = None):
+        self.tables = {table.name: table for table in tables}
+        self.rows = {table.name: max(1, (row_estimates or {}).get(table.name, DEFAULT_TABLE_ROWS)) for table in tables}
+        self.unique_columns = {}
+        for table in tables:
+            keys = [table.primary_key_columns()] + [idx.columns for idx in table.indexes if idx.unique]
+            self.unique_columns[table.name] = {key[0] for key in keys if len(key) == 1}
+
+    def selectivity(self, table: str, column: str) -> float:
+        if column in self.unique_columns[table]:
+            return 1 / self.rows[table]
+        if column in FILTER_COLUMN_NAMES or column.startswith(("is_", "has_")):
+            return LOW_CARDINALITY_SELECTIVITY
+        return DEFAULT_EQ_SELECTIVITY
+
+    def _sort_cost(self, rows: float) -> float:
+        return rows * math.log2(rows) if rows > 1 else 0.0
+
+    def full_scan_cost(self, query: Dict[str, Any]) -> float:
+        table = query["table"]
+        matched = self.rows[table] * self._filter_selectivity(query)
+        return self.rows[table] + (self._sort_cost(matched) if query["order_by"] else 0.0)
+
+    def _filter_selectivity(self, query: Dict[str, Any]) -> float:
+        selectivity = 1.0
+        for name in query["equals"]:
+            selectivity *= self.selectivity(query["table"], name)
+        for _ in query["ranges"]:
+            selectivity *= RANGE_SELECTIVITY
+        return selectivity
+
+    def index_cost(self, query: Dict[str, Any], columns: List[str], clustered: bool = False) -> Optional[float]:
+        """
+        通过索引columns执行查询的代价；索引无法用于过滤、排序或覆盖时返回None。
+        等值列构成最左前缀，其后可接一个范围列；排序列紧跟在等值前缀之后时省去排序。
+        """
+        table = query["table"]
+        rows = self.rows[table]
+        selectivity = 1.0
+        used = 0
+        while used < len(columns) and columns[used] in query["equals"]:
+            selectivity *= self.selectivity(table, columns[used])
+            used += 1
+        range_used = used < len(columns) and columns[used] in query["ranges"]
+        if range_used:
+            selectivity *= RANGE_SELECTIVITY
+
+        order = [name for name in query["order_by"] if name not in query["equals"][:used]]
+        if range_used:
+            ordered = order == [] or order == columns[used:used + 1]
+        else:
+            ordered = order == columns[used:used + len(order)]
+
+        primary_key = self.tables[table].primary_key_columns()
+        referenced = set(query["equals"]) | set(query["ranges"]) | set(query["order_by"]) | set(query["select"])
+        covering = clustered or ("*" not in referenced and referenced <= set(columns) | set(primary_key))
+
+        if used == 0 and not range_used and not (ordered and query["order_by"]) and not covering:
+            return None
+        matched = max(1.0, rows * selectivity)
+        per_row = 1.0 if covering else LOOKUP_COST
+        if used == 0 and not range_used and not clustered:
+            # 只能全索引扫描（覆盖或按序）
+            matched = rows
+        result_rows = max(1.0, rows * self._filter_selectivity(query))
+        sort = 0.0 if ordered or not query["order_by"] else self._sort_cost(result_rows)
+        return math.log2(rows + 1) + matched * per_row + sort
+
+    def best_access(self, query: Dict[str, Any], indexes: List[Tuple[str, List[str]]]) -> Tuple[str, float]:
+        """在主键、已有索引和indexes中选出代价最低的访问路径，返回(索引名, 代价)。"""
+        table = self.tables[query["table"]]
+        best = ("FULL SCAN", self.full_scan_cost(query))
+        primary_key = table.primary_key_columns()
+        if primary_key:
+            cost = self.index_cost(query, primary_key, clustered=True)
+            if cost is not None and cost < best[1]:
+                best = ("PRIMARY", cost)
+        for name, columns in indexes:
+            cost = self.index_cost(query, columns)
+            if cost is not None and cost < best[1]:
+                best = (name, cost)
+        return best
+
+def _indexable(table: Table, column: str) -> bool:
+    col = next((c for c in table.columns if c.name == column), None)
+    return col is not None and base_type(col.data_type) not in NON_INDEXABLE_TYPES
+
+def candidate_indexes(query: Dict[str, Any], table: Table, max_columns: int) -> List[List[str]]:
+    """
+    为单个查询构造候选组合索引：等值列 + 排序列、等值列 + 范围列，以及在此基础上补全查询列的覆盖索引。
+    """
+    equals = [name for name in query["equals"] if _indexable(table, name)]
+    # 唯一性强的列放在前面
+    equals.sort(key=lambda name: name in FILTER_COLUMN_NAMES)
+    order = [name for name in query["order_by"] if name not in equals and _indexable(table, name)]
+    ranges = [name for name in query["ranges"] if _indexable(table, name)]
+
+    bases = []
+    if equals or order:
+        bases.append(equals + order)
+    if ranges:
+        bases.append(equals + ranges[:1])
+    candidates = []
+    primary_key = set(table.primary_key_columns())
+    for base in bases:
+        base = list(dict.fromkeys(base))[:max_columns]
+        if base:
+            candidates.append(base)
+        if "*" not in query["select"]:
+            extra = [name for name in query["select"] + query["ranges"] + query["order_by"]
+                     if name not in base and name not in primary_key and _indexable(table, name)]
+            covering = list(dict.fromkeys(base + extra))
+            if len(covering) > len(base) and len(covering) <= max_columns:
+                candidates.append(covering)
+    return candidates
+
+def _write_cost(columns: List[str], table_writes: Dict[str, float], table: str) -> float:
+    return table_writes.get(table, 1.0) * (1 + EXTRA_COLUMN_WRITE_COST * (len(columns) - 1))
+
+def _workload_cost(model: CostModel, queries: List[Dict[str, Any]],
+                   indexes_by_table: Dict[str, List[Tuple[str, List[str]]]]) -> float:
+    return sum(query["frequency"] * model.best_access(query, indexes_by_table.get(query["table"], []))[1]
+               for query in queries)
+
+def _sqlite_stat(model: CostModel, table: str, columns: List[str], unique: bool) -> str:
+    """按代价模型的行数和选择率构造sqlite_stat1统计，使SQLite的执行计划基于同样的数据分布。"""
+    rows = model.rows[table]
+    stats = [str(rows)]
+    selectivity = 1.0
+    for position, name in enumerate(columns):
+        selectivity *= model.selectivity(table, name)
+        per_key = 1 if unique and position == len(columns) - 1 else max(1, int(round(rows * selectivity)))
+        stats.append(str(per_key))
+    return " ".join(stats)
+
+def explain_queries(tables: List[Table], queries: List[Dict[str, Any]], new_indexes: List[Index],
+                    model: CostModel) -> List[Dict[str, Any]]:
+    """
+    在内存SQLite中建立schema副本和建议的索引，写入与代价模型一致的统计信息，
+    对每个查询执行EXPLAIN QUERY PLAN并返回计划明细。
+    """
+    # 只需复制查询涉及的表；SQLite建表时不检查外键目标是否存在
+    queried = {query["table"] for query in queries}
+    tables = [table for table in tables if table.name in queried]
+    conn = sqlite3.connect(":memory:")
+    plans = []
+    try:
+        for statement in sqlite_statements(tables):
+            conn.execute(statement["sql"])
+        for index in new_indexes:
+            conn.execute(f"CREATE INDEX {index.name} ON {index.table} ({', '.join(index.columns)})")
+        conn.execute("ANALYZE")
+        all_indexes = [(table.name, index.name, index.columns, index.unique) for table in tables for index in table.indexes]
+        all_indexes += [(index.table, index.name, index.columns, False) for index in new_indexes]
+        for table_name, name, columns, unique in all_indexes:
+            conn.execute("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)",
+                         (table_name, name, _sqlite_stat(model, table_name, columns, unique)))
+        for table in tables:
+            conn.execute("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, NULL, ?)",
+                         (table.name, str(model.rows[table.name])))
+        conn.commit()
+        # 重新加载统计信息
+        conn.execute("ANALYZE sqlite_schema")
+
+        for query in queries:
+            try:
+                # 执行计划与参数取值无关，占位符替换为常量即可
+                sql = re.sub(r"\?|%s", "1", query["sql"])
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+                plans.append({"plan": [row[-1] for row in rows], "error": None})
+            except sqlite3.Error as e:
+                plans.append({"plan": [], "error": f"SQLite无法执行该查询: {e}"})
+    finally:
+        conn.close()
+    return plans
+
+def _plan_uses(plan: List[str], access: str) -> bool:
+    text = " ".join(plan)
+    if access == "PRIMARY":
+        return "PRIMARY KEY" in text or bool(re.search(r"USING INDEX sqlite_autoindex_", text))
+    if access == "FULL SCAN":
+        return not re.search(r"USING (?:COVERING )?INDEX|PRIMARY KEY", text)
+    return bool(re.search(rf"USING (?:COVERING )?INDEX {re.escape(access)}\b", text))
+
+def advise_indexes(tables: List[Table], queries: List[Dict[str, Any]], row_estimates: Optional[Dict[str, int]] = None,
+                   table_writes: Optional[Dict[str, float]] = None, write_budget: float = DEFAULT_WRITE_BUDGET,
+                   max_index_columns: int = DEFAULT_MAX_INDEX_COLUMNS) -> Dict[str, Any]:
+    """
+    根据查询负载选择组合索引。
+
+    对每个查询生成候选索引，按 收益/写代价 贪心选择，直到写代价预算用完或没有显著收益；
+    随后去掉移除后总代价不变的冗余选择，得到最小的索引集合。
+    已有的普通索引若是某个新索引的最左前缀，则列为可删除。
+    每个查询的最终访问路径都用内存SQLite的EXPLAIN QUERY PLAN核对。
+    """
+    table_writes = table_writes or {}
+    tables_by_name = {table.name: table for table in tables}
+    queries, warnings = normalize_workload(queries, tables)
+    model = CostModel(tables, row_estimates)
+
+    existing = {table.name: [(index.name, index.columns) for index in table.indexes] for table in tables}
+    baseline = {id(query): model.best_access(query, existing.get(query["table"], [])) for query in queries}
+
+    candidates = {}
+    for query in queries:
+        table = tables_by_name[query["table"]]
+        existing_columns = [columns for _, columns in existing[table.name]] + [table.primary_key_columns()]
+        for columns in candidate_indexes(query, table, max_index_columns):
+            # 已有索引以候选为最左前缀时无需新建
+            if any(key[:len(columns)] == columns for key in existing_columns):
+                continue
+            candidates.setdefault((table.name, tuple(columns)), columns)
+
+    chosen: Dict[Tuple[str, tuple], List[str]] = {}
+    current = {name: list(indexes) for name, indexes in existing.items()}
+    used_budget = 0.0
+    queries_by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for query in queries:
+        queries_by_table.setdefault(query["table"], []).append(query)
+
+    def score(key: Tuple[str, tuple]) -> float:
+        table_name, columns = key[0], candidates[key]
+        table_queries = queries_by_table[table_name]
+        before = _workload_cost(model, table_queries, current)
+        trial = {table_name: current[table_name] + [(Index(table_name, columns).name, columns)]}
+        benefit = before - _workload_cost(model, table_queries, trial)
+        if benefit <= before * MIN_RELATIVE_BENEFIT:
+            return 0.0
+        return benefit / _write_cost(columns, table_writes, table_name)
+
+    # 候选的收益只取决于同表已选的索引，每轮只需重算刚变化的那张表的候选
+    scores = {key: score(key) for key in candidates}
+    while True:
+        affordable = [key for key, value in scores.items() if value > 0
+                      and used_budget + _write_cost(candidates[key], table_writes, key[0]) <= write_budget + 1e-9]
+        if not affordable:
+            break
+        best = max(affordable, key=lambda key: scores[key])
+        chosen[best] = candidates[best]
+        del scores[best]
+        current[best[0]] = current[best[0]] + [(Index(best[0], candidates[best]).name, candidates[best])]
+        used_budget += _write_cost(candidates[best], table_writes, best[0])
+        for key in scores:
+            if key[0] == best[0]:
+                scores[key] = score(key)
+
+    # 去掉冗余：移除后代价不变的索引
+    for key in sorted(chosen, key=lambda k: len(k[1])):
+        table_name = key[0]
+        name = Index(table_name, chosen[key]).name
+        without = {table_name: [entry for entry in current[table_name] if entry[0] != name]}
+        table_queries = queries_by_table[table_name]
+        if _workload_cost(model, table_queries, without) <= _workload_cost(model, table_queries, current) + 1e-9:
+            current[table_name] = without[table_name]
+            used_budget -= _write_cost(chosen[key], table_writes, table_name)
+            del chosen[key]
+
+    new_indexes = []
+    for (table_name, _), columns in chosen.items():
+        served = [query["description"] for query in queries_by_table[table_name]
+                  if model.best_access(query, current[table_name])[0] == Index(table_name, columns).name]
+        new_indexes.append(Index(table_name, columns, reason="查询负载: " + "; ".join(served)[:200]))
+
+    redundant = []
+    for table in tables:
+        for index in table.indexes:
+            if index.unique:
+                continue
+            replacement = next((new for new in new_indexes if new.table == table.name
+                                and len(new.columns) > len(index.columns)
+                                and new.columns[:len(index.columns)] == index.columns), None)
+            if replacement:
+                redundant.append({"table": table.name, "name": index.name, "replaced_by": replacement.name,
+                                  "statement": f"DROP INDEX {index.name} ON {table.name};"})
+
+    plans = explain_queries(tables, queries, new_indexes, model)
+    query_results = []
+    for query, plan in zip(queries, plans):
+        access, cost = model.best_access(query, current[query["table"]])
+        query_results.append({
+            "description": query["description"],
+            "sql": query["sql"],
+            "table": query["table"],
+            "frequency": query["frequency"],
+            "baseline_access": baseline[id(query)][0],
+            "baseline_cost": round(baseline[id(query)][1], 1),
+            "access": access,
+            "cost": round(cost, 1),
+            "explain": plan["plan"],
+            "verified": plan["error"] is None and _plan_uses(plan["plan"], access)
+        })
+        if plan["error"]:
+            warnings.append(f"{query['description']}: {plan['error']}")
+
+    return {
+        "queries": query_results,
+        "indexes": [dict(index.to_dict(), write_cost=round(_write_cost(index.columns, table_writes, index.table), 2))
+                    for index in new_indexes],
+        "ddl": [f"CREATE INDEX {index.name} ON {index.table} ({', '.join(index.columns)});" for index in new_indexes],
+        "redundant_indexes": redundant,
+        "write_cost": round(used_budget, 2),
+        "write_budget": write_budget,
+        "warnings": warnings
+    }
+
+def extract_workload(description: str, tables: List[Table]) -> List[Dict[str, Any]]:
+    """
+    调用LLM从需求描述中提取代表性查询（如"按学生查成绩""按日期统计挂号量"），返回结构化访问模式列表。
+    """
+    catalog = "\n".join(f"- {table.name}({', '.join(col.name for col in table.columns)})" for table in tables)
+    full_prompt = f"""
+你是一个数据库性能专家。下面是一段业务需求描述和根据它生成的数据表。
+请找出描述中明确提到或高度可能的高频查询（例如"按学生查成绩"、"按日期统计挂号量"），
+把每个查询表示为针对单张表的访问模式。
+
+数据表：
+{catalog}
+
+输出必须是纯 JSON，不得包含任何其他文本，格式如下：
+{{
+  "queries": [
+    {{
+      "description": "查询的中文说明",
+      "table": "表名",
+      "equals": ["等值条件列"],
+      "ranges": ["范围条件列"],
+      "order_by": ["排序或分组列"],
+      "select": ["返回的列，统计查询可为空"],
+      "frequency": 相对执行频率（数字，越大越频繁）
+    }}
+  ]
+}}
+
+需求描述：
+{description}
+"""
+    result = call_llm_json(full_prompt)
+    queries = result.get("queries") if isinstance(result, dict) else None
+    if not isinstance(queries, list):
+        raise ValueError("无法从描述中提取查询负载")
+    return [query for query in queries if isinstance(query, dict)]
@@ -4,7 +4,7 @@
 用于创建数据库表结构
 """
 
-from database import init_db, engine
+from database import init_db, convert_compressed_columns, engine
 from sqlalchemy import text
 
 def init_database():
@@ -14,6 +14,9 @@ def init_database():
     # 创建表
     init_db()
 
+    # 压缩列转为LONGBLOB：需要重建表，只在这里显式执行，服务启动时不执行
+    convert_compressed_columns()
+
     print("数据库初始化完成！")
 
     # 显示创建的表
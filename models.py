@@ -1,18 +1,108 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Dict, Any, Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Dict, Any, Optional, List, Union, Literal, Annotated
+from datetime import datetime, date
 
-class GenerateSchemaRequest(BaseModel):
+class SchemaCompileOptions(BaseModel):
+    optimize_types: bool = Field(False, description="按列语义收紧列类型")
+    row_estimates: Optional[Dict[str, int]] = Field(None, description="各表预估行数，用于选择主键类型和推断大表")
+    auto_partition: bool = Field(False, description="为推断出的追加写入大表生成按月分区")
+    partition_tables: Optional[List[str]] = Field(None, description="显式指定需要分区的表")
+    partition_months: int = Field(12, ge=1, le=120, description="预建的月分区数")
+    partition_start: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}$",
+                                           description="第一个月分区(YYYY-MM)，默认为当前月份")
+
+    def compile_options(self) -> Dict[str, Any]:
+        # 启用分区时固定起始月份并随编译参数保存，之后按相同参数重建的DDL与部署的一致
+        options = self.model_dump(include=set(SchemaCompileOptions.model_fields))
+        if (options["auto_partition"] or options["partition_tables"]) and not options["partition_start"]:
+            options["partition_start"] = date.today().strftime("%Y-%m")
+        return options
+
+class SchemaValidationOptions(BaseModel):
+    sqlite_dry_run: bool = Field(False, description="在内存SQLite中试执行翻译后的DDL")
+    strict_validation: bool = Field(False, description="校验发现错误时返回422且不保存")
+
+class GenerateSchemaRequest(SchemaCompileOptions, SchemaValidationOptions):
     description: str
 
 class ERModelResponse(BaseModel):
     entities: list
     relationships: list
 
+class IndexModel(BaseModel):
+    table: str
+    name: str
+    columns: List[str]
+    unique: bool
+    reason: str
+
+class ColumnTypeChangeModel(BaseModel):
+    table: str
+    column: str
+    old_type: str
+    new_type: str
+    bytes_saved: int
+    reason: str
+
+class ColumnTypeWideningModel(BaseModel):
+    table: str
+    column: str
+    old_type: str
+    new_type: str
+    bytes_added: int
+    reason: str
+
+class TypeOptimizationModel(BaseModel):
+    changes: List[ColumnTypeChangeModel]
+    bytes_saved_per_row: Dict[str, int]
+    total_bytes_saved_per_row: int
+    widenings: List[ColumnTypeWideningModel] = Field([], description="预估行数超出取值范围而加宽的主键和外键，不计入节省")
+
+class PartitionedTableModel(BaseModel):
+    table: str
+    column: str
+    primary_key: List[str]
+    partitions: List[str]
+
+class DroppedForeignKeyModel(BaseModel):
+    table: str
+    constraint: str
+    reason: str
+
+class PartitioningModel(BaseModel):
+    tables: List[PartitionedTableModel]
+    dropped_foreign_keys: List[DroppedForeignKeyModel]
+    warnings: List[str]
+
+class ValidationIssueModel(BaseModel):
+    severity: str
+    table: Optional[str] = None
+    column: Optional[str] = None
+    message: str
+    source: str
+
+class ValidationResultModel(BaseModel):
+    valid: bool
+    issues: List[ValidationIssueModel]
+    sqlite_checked: bool
+    elapsed_ms: float
+
+class LintFindingModel(BaseModel):
+    severity: str
+    rule: str
+    table: Optional[str] = None
+    column: Optional[str] = None
+    message: str
+
 class GenerateSchemaResponse(BaseModel):
     schema: Dict[str, Any]
     er_model: Optional[ERModelResponse] = None
     ddl: str
+    indexes: List[IndexModel] = []
+    type_optimization: Optional[TypeOptimizationModel] = None
+    partitioning: Optional[PartitioningModel] = None
+    validation: Optional[ValidationResultModel] = None
+    lint: List[LintFindingModel] = Field([], description="按严重程度排序的性能反模式检查结果")
     session_id: str
 
 class ErrorResponse(BaseModel):
@@ -60,17 +150,101 @@ class InteractionRecordResponse(BaseModel):
     ddl_result: str
     session_id: str
     created_at: datetime
+    revision: int = Field(0, description="会话的修订号，修改时作为expected_revision传回")
+
+class InteractionRecordSummary(BaseModel):
+    """历史记录列表的摘要，不含schema、ER模型和DDL，详情按session_id另行获取"""
+    id: int
+    session_id: str
+    description: str = Field(..., description="描述的前SUMMARY_DESCRIPTION_LENGTH个字符")
+    created_at: datetime
+    table_count: Optional[int] = Field(None, description="schema中的表数，旧记录为空")
+
+class UserHistorySummaryResponse(BaseModel):
+    total_count: Optional[int] = None
+    records: List[InteractionRecordSummary]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 class UserHistoryResponse(BaseModel):
-    total_count: int
+    total_count: Optional[int] = Field(None, description="用户的记录总数，include_total=false时为空")
     records: List[InteractionRecordResponse]
+    next_cursor: Optional[str] = Field(None, description="下一页（更早的记录）的游标，没有更多记录时为空")
+    prev_cursor: Optional[str] = Field(None, description="上一页（更新的记录）的游标，已是第一页时为空")
+
+class SchemaStorageStatsResponse(BaseModel):
+    records: int = Field(..., description="引用schema_blobs的交互记录数")
+    inline_records: int = Field(..., description="仍内联保存schema的旧记录数")
+    snapshots: int = Field(..., description="引用schema_blobs的编辑日志快照数")
+    schemas: int
+    unreferenced_schemas: int = Field(..., description="等待垃圾回收的schema数")
+    logical_bytes: int = Field(..., description="每条记录和每个快照各保存一份时的总大小")
+    snapshot_logical_bytes: int = Field(..., description="logical_bytes中快照部分的大小")
+    stored_bytes: int = Field(..., description="被引用的schema去重后的总大小")
+    unreferenced_bytes: int = Field(..., description="等待垃圾回收的schema大小")
+    bytes_saved: int
+    duplication_rate: float = Field(..., description="重复记录占引用记录的比例")
+
+class PoolMetricsModel(BaseModel):
+    name: str
+    pool_class: str
+    pool_size: Optional[int] = Field(None, description="常驻连接数；SQLite使用默认连接池时为空")
+    max_overflow: Optional[int] = None
+    in_use: Optional[int] = Field(None, description="当前取出的连接数")
+    idle: Optional[int] = Field(None, description="池中空闲的连接数")
+    overflow: Optional[int] = Field(None, description="当前超出pool_size的连接数")
+    peak_in_use: int
+    checkouts: int
+    overflow_checkouts: int = Field(..., description="取出时超出pool_size的次数")
+    timeouts: int = Field(..., description="在pool_timeout内未能取得连接的次数")
+    connects: int = Field(..., description="新建的数据库连接数")
+    invalidations: int = Field(..., description="因断开或pre-ping失败而废弃的连接数")
+    wait_ms_p50: Optional[float] = None
+    wait_ms_p95: Optional[float] = None
+    wait_ms_max: Optional[float] = None
+    wait_ms_total: float
+
+class PoolMetricsResponse(BaseModel):
+    pools: List[PoolMetricsModel]
+
+class SessionCacheStatsResponse(BaseModel):
+    mode: str = Field(..., description="off、write_through或write_behind")
+    size: int
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+    pending_sessions: int = Field(..., description="有尚未写库的修改的会话数")
+    pending_edits: int
+    flushes: int
+    flushed_edits: int = Field(..., description="已写库的修改数，与flushes之差为合并写入省去的事务数")
+    flush_errors: int
+    flush_conflicts: int = Field(..., description="写库时发现会话已被其他进程修改而丢弃的修改数")
+    oldest_pending_ms: Optional[float] = Field(None, description="最早一个尚未写库的修改已等待的时间")
+    last_flush_lag_ms: Optional[float] = Field(None, description="最近一次写入时从第一个修改到提交的时间")
+    max_flush_lag_ms: float
+
+class RecordQueueStatsResponse(BaseModel):
+    mode: str = Field(..., description="off、sync或wal")
+    batch_size: int
+    pending: int = Field(..., description="队列中尚未写库的记录数")
+    enqueued: int
+    replayed: int = Field(..., description="启动时从WAL恢复的记录数")
+    flushes: int
+    flushed_records: int = Field(..., description="已写库的记录数，与flushes之比为平均批次大小")
+    flush_errors: int
+    dead_letters: int = Field(..., description="超过重试次数、移入死信文件的记录数")
+    max_batch: int
+    last_flush_ms: Optional[float] = Field(None, description="最近一个批次的写库耗时")
+    oldest_pending_ms: Optional[float] = Field(None, description="队列中最早的记录已等待的时间")
+    wal_segments: Optional[int] = Field(None, description="仍有未写库记录的WAL段数，非wal模式为空")
 
 # 实体和关系修改相关模型
 class AttributeModel(BaseModel):
     name: str
     data_type: str
-    is_primary_key: bool
-    comment: str
+    is_primary_key: bool = False
+    comment: str = ""
 
 class EntityModel(BaseModel):
     table_name: str
@@ -81,37 +255,265 @@ class RelationshipModel(BaseModel):
     from_column: str
     to_table: str
     to_column: str
-    on_delete: str
+    on_delete: Optional[str] = None
+
+class SchemaModel(BaseModel):
+    """
+    schema的类型化表示。LLM输出和数据库中读出的schema都在进入系统时经它校验一次，
+    之后以规范化的字典（补全默认值、去掉未知字段）在编译流水线中传递，不再重复校验。
+    """
+    entities: List[EntityModel]
+    relationships: List[RelationshipModel] = []
+
+    @classmethod
+    def canonical(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并返回规范化的schema字典；结构不合法时抛出ValidationError（ValueError的子类）"""
+        return cls.model_validate(data).model_dump()
+
+class SessionRevisionOptions(BaseModel):
+    expected_revision: Optional[int] = Field(None, ge=0, description="客户端所基于的会话修订号，与当前修订号不同时返回409且不保存")
 
-class ModifyEntityRequest(BaseModel):
+class SessionEditRequest(SchemaCompileOptions, SchemaValidationOptions, SessionRevisionOptions):
     session_id: str
+
+class ModifyEntityRequest(SessionEditRequest):
     entity_name: str
     new_attributes: Optional[List[AttributeModel]] = None
     new_table_name: Optional[str] = None
 
-class AddEntityRequest(BaseModel):
-    session_id: str
+class AddEntityRequest(SessionEditRequest):
     entity: EntityModel
 
-class DeleteEntityRequest(BaseModel):
-    session_id: str
+class DeleteEntityRequest(SessionEditRequest):
     entity_name: str
 
-class ModifyRelationshipRequest(BaseModel):
-    session_id: str
+class ModifyRelationshipRequest(SessionEditRequest):
     old_relationship: RelationshipModel
     new_relationship: RelationshipModel
 
-class AddRelationshipRequest(BaseModel):
-    session_id: str
+class AddRelationshipRequest(SessionEditRequest):
     relationship: RelationshipModel
 
-class DeleteRelationshipRequest(BaseModel):
-    session_id: str
+class DeleteRelationshipRequest(SessionEditRequest):
+    relationship: RelationshipModel
+
+class ModifyEntityOperation(BaseModel):
+    op: Literal["modify_entity"]
+    entity_name: str
+    new_attributes: Optional[List[AttributeModel]] = None
+    new_table_name: Optional[str] = None
+
+class AddEntityOperation(BaseModel):
+    op: Literal["add_entity"]
+    entity: EntityModel
+
+class DeleteEntityOperation(BaseModel):
+    op: Literal["delete_entity"]
+    entity_name: str
+
+class ModifyRelationshipOperation(BaseModel):
+    op: Literal["modify_relationship"]
+    old_relationship: RelationshipModel
+    new_relationship: RelationshipModel
+
+class AddRelationshipOperation(BaseModel):
+    op: Literal["add_relationship"]
     relationship: RelationshipModel
 
+class DeleteRelationshipOperation(BaseModel):
+    op: Literal["delete_relationship"]
+    relationship: RelationshipModel
+
+SchemaOperation = Annotated[Union[
+    ModifyEntityOperation, AddEntityOperation, DeleteEntityOperation,
+    ModifyRelationshipOperation, AddRelationshipOperation, DeleteRelationshipOperation
+], Field(discriminator="op")]
+
+class SessionOperationsRequest(SchemaCompileOptions, SchemaValidationOptions, SessionRevisionOptions):
+    """批量修改：各操作与对应单个修改接口的请求字段相同（不含session_id），另以op区分操作类型"""
+    operations: List[SchemaOperation] = Field(..., min_length=1, max_length=500,
+                                               description="按顺序执行的修改操作")
+
 class ModifySchemaResponse(BaseModel):
     schema: Dict[str, Any]
     er_model: Optional[ERModelResponse] = None
     ddl: str
-    session_id: str
\ No newline at end of file
+    migration: List[str] = Field([], description="从上一版本迁移到当前结构的ALTER语句")
+    indexes: List[IndexModel] = []
+    type_optimization: Optional[TypeOptimizationModel] = None
+    partitioning: Optional[PartitioningModel] = None
+    validation: Optional[ValidationResultModel] = None
+    lint: List[LintFindingModel] = Field([], description="按严重程度排序的性能反模式检查结果")
+    session_id: str
+    version: Optional[int] = Field(None, description="修改后会话所在的版本")
+    revision: int = Field(..., description="修改后会话的修订号")
+
+class SessionVersionModel(BaseModel):
+    version: int
+    parent_version: Optional[int] = None
+    operation: str
+    snapshot: bool = Field(..., description="该版本是否保存了完整快照")
+    created_at: datetime
+
+class SessionVersionsResponse(BaseModel):
+    session_id: str
+    current_version: Optional[int] = Field(None, description="会话当前所在的版本，从未修改过时为空")
+    versions: List[SessionVersionModel]
+
+class SessionVersionResponse(BaseModel):
+    session_id: str
+    version: int
+    schema: Dict[str, Any]
+    er_model: Optional[ERModelResponse] = None
+    ddl: str
+
+class PartitionMaintenanceRequest(BaseModel):
+    months_ahead: int = Field(3, ge=0, le=120, description="预建到当前月份之后的月数")
+    retention_months: Optional[int] = Field(None, ge=1, description="数据保留月数，超出的分区生成DROP语句")
+    from_month: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}$", description="线上已有分区之后的第一个月(YYYY-MM)")
+    existing_partitions: Optional[Dict[str, List[str]]] = Field(
+        None, description="线上各表当前的分区名，如 {\"logs\": [\"p_history\", \"p202401\"]}；提供时按实际分区生成语句，重复执行不会重复删除或添加分区")
+
+class PartitionMaintenanceResponse(BaseModel):
+    session_id: str
+    tables: List[str]
+    statements: List[str]
+
+# 一次负载测试所有表合计生成的最大行数
+MAX_LOAD_TEST_ROWS = 5000000
+
+class LoadTestRequest(SchemaCompileOptions):
+    rows_per_table: int = Field(1000, ge=1, le=1000000, description="每张表生成的行数")
+    table_rows: Optional[Dict[str, Annotated[int, Field(ge=0, le=1000000)]]] = Field(
+        None, description="个别表的行数，如 {\"orders\": 500000}")
+    format: str = Field("csv", pattern="^(csv|ndjson)$", description="中间数据文件格式")
+    batch_size: int = Field(5000, ge=1, le=100000, description="每次executemany插入的行数")
+    seed: int = Field(0, description="随机种子，相同种子生成相同数据")
+
+    @model_validator(mode="after")
+    def check_total_rows(self):
+        if sum((self.table_rows or {}).values()) > MAX_LOAD_TEST_ROWS:
+            raise ValueError(f"table_rows合计超过 {MAX_LOAD_TEST_ROWS} 行")
+        return self
+
+    def total_rows(self, table_names: List[str]) -> int:
+        """按表名计算合计生成的行数：table_rows中指定的表按指定值，其余表按rows_per_table"""
+        table_rows = self.table_rows or {}
+        return sum(table_rows.get(name, self.rows_per_table) for name in table_names)
+
+class LoadTestTableModel(BaseModel):
+    table: str
+    rows: int
+    file_bytes: int
+    generate_seconds: float
+    load_seconds: float
+    rows_per_second: Optional[float] = None
+    disk_bytes: Optional[int] = None
+
+class LoadTestResponse(BaseModel):
+    session_id: str
+    format: str
+    target: str
+    tables: List[LoadTestTableModel]
+    total_rows: int
+    file_bytes: int
+    generate_seconds: float
+    load_seconds: float
+    rows_per_second: Optional[float] = None
+    disk_bytes: Optional[int] = None
+    foreign_key_violations: Optional[int] = None
+    warnings: List[str] = []
+
+class TableGrowthModel(BaseModel):
+    monthly_rows: int = Field(0, ge=0, description="每月新增行数")
+    monthly_growth_rate: float = Field(0.0, ge=0, le=10, description="行数的月复合增长率，如0.05表示每月增长5%")
+
+class CapacityEstimateRequest(SchemaCompileOptions):
+    growth: Optional[Dict[str, TableGrowthModel]] = Field(None, description="各表增长模型，初始行数取row_estimates")
+    horizon_months: int = Field(12, ge=0, le=120, description="预测的月数")
+    default_rows: int = Field(1000, ge=0, description="row_estimates中未给出的表的初始行数")
+    fill_ratio: float = Field(0.5, gt=0, le=1, description="变长字符串列平均占声明长度的比例")
+
+class IndexCapacityModel(BaseModel):
+    name: str
+    columns: List[str]
+    entry_bytes: float
+    levels: int
+    bytes: int
+
+class TableCapacityModel(BaseModel):
+    table: str
+    rows: int
+    row_bytes: float
+    off_page_columns: List[str] = []
+    primary_key_levels: int
+    data_bytes: int
+    lob_bytes: int
+    index_bytes: int
+    indexes: List[IndexCapacityModel] = []
+    total_bytes: int
+
+class CapacityProjectionModel(BaseModel):
+    month: int
+    rows: int
+    total_bytes: int
+
+class CapacityEstimateResponse(BaseModel):
+    session_id: str
+    horizon_months: int
+    tables: List[TableCapacityModel]
+    total_rows: int
+    data_bytes: int
+    index_bytes: int
+    total_bytes: int
+    projection: List[CapacityProjectionModel]
+    assumptions: Dict[str, Any]
+    warnings: List[str] = []
+
+class WorkloadQueryModel(BaseModel):
+    description: Optional[str] = None
+    sql: Optional[str] = Field(None, description="单表SELECT语句；给出时忽略下面的结构化字段")
+    table: Optional[str] = None
+    equals: List[str] = Field([], description="等值条件列")
+    ranges: List[str] = Field([], description="范围条件列")
+    order_by: List[str] = Field([], description="排序或分组列")
+    select: List[str] = Field([], description="返回的列")
+    frequency: float = Field(1.0, gt=0, description="相对执行频率")
+
+class IndexAdviceRequest(SchemaCompileOptions):
+    queries: Optional[List[WorkloadQueryModel]] = Field(None, description="代表性查询；为空时从会话的需求描述中提取")
+    table_writes: Optional[Dict[str, float]] = Field(None, description="各表相对写入频率，默认1")
+    write_budget: float = Field(3.0, gt=0, description="新增索引的写代价预算")
+    max_index_columns: int = Field(4, ge=1, le=16, description="组合索引的最大列数")
+
+class AdvisedQueryModel(BaseModel):
+    description: str
+    sql: str
+    table: str
+    frequency: float
+    baseline_access: str
+    baseline_cost: float
+    access: str
+    cost: float
+    explain: List[str]
+    verified: bool
+
+class AdvisedIndexModel(IndexModel):
+    write_cost: float
+
+class RedundantIndexModel(BaseModel):
+    table: str
+    name: str
+    replaced_by: str
+    statement: str
+
+class IndexAdviceResponse(BaseModel):
+    session_id: str
+    extracted: bool = Field(False, description="查询是否从需求描述中提取")
+    queries: List[AdvisedQueryModel]
+    indexes: List[AdvisedIndexModel]
+    ddl: List[str]
+    redundant_indexes: List[RedundantIndexModel] = []
+    write_cost: float
+    write_budget: float
+    warnings: List[str] = []
@@ -0,0 +1,220 @@
+import re
+from datetime import date
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+
+from type_optimizer import base_type
+
+if TYPE_CHECKING:
+    from schema_generator import Table, Column
+
+PARTITION_TIME_TYPES = ("DATETIME", "DATE", "TIMESTAMP")
+PREFERRED_PARTITION_COLUMN = "created_at"
+# 表名包含这些词时视为追加写入的大表
+HIGH_VOLUME_NAME_HINTS = {
+    "log", "logs", "record", "records", "order", "orders", "event", "events", "history",
+    "histories", "audit", "audits", "message", "messages", "transaction", "transactions",
+    "payment", "payments", "visit", "visits", "registration", "registrations",
+}
+# 预估行数超过该值的表视为大表
+HIGH_VOLUME_ROW_THRESHOLD = 10_000_000
+# 存放起始月份之前数据的分区
+HISTORY_PARTITION = "p_history"
+DEFAULT_PARTITION_MONTHS = 12
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _add_months(day: date, months: int) -> date:
+    total = day.year * 12 + day.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+def parse_month(value: str) -> date:
+    """解析YYYY-MM或YYYYMM格式的月份。"""
+    digits = value.replace("-", "")
+    if not re.fullmatch(r"\d{6}", digits):
+        raise ValueError(f"月份格式错误: {value}，应为YYYY-MM")
+    return date(int(digits[:4]), int(digits[4:]), 1)
+
+def _partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+def _partition_bound(data_type: str, bound: date) -> str:
+    # TIMESTAMP列不支持RANGE COLUMNS，需要转换为整数
+    if base_type(data_type) == "TIMESTAMP":
+        return f"UNIX_TIMESTAMP('{bound.isoformat()} 00:00:00')"
+    return f"'{bound.isoformat()}'"
+
+def _partition_expression(column: str, data_type: str) -> str:
+    if base_type(data_type) == "TIMESTAMP":
+        return f"RANGE (UNIX_TIMESTAMP({column}))"
+    return f"RANGE COLUMNS({column})"
+
+def monthly_partition_definitions(data_type: str, start: date, months: int) -> List[str]:
+    """
+    生成按月分区定义：一个存放历史数据的分区加上从start起的months个月分区。
+    """
+    definitions = [f"PARTITION {HISTORY_PARTITION} VALUES LESS THAN ({_partition_bound(data_type, start)})"]
+    for i in range(months):
+        month = _add_months(start, i)
+        bound = _add_months(month, 1)
+        definitions.append(f"PARTITION {_partition_name(month)} VALUES LESS THAN ({_partition_bound(data_type, bound)})")
+    return definitions
+
+def _partition_column(table: "Table") -> Optional["Column"]:
+    """优先使用created_at，否则取第一个时间类型的*_at/*_time/*_date列。"""
+    candidates = [col for col in table.columns if base_type(col.data_type) in PARTITION_TIME_TYPES]
+    for col in candidates:
+        if col.name == PREFERRED_PARTITION_COLUMN:
+            return col
+    for col in candidates:
+        if col.name.endswith(("_at", "_time", "_date")):
+            return col
+    return None
+
+def _is_high_volume(table: "Table", row_estimates: Dict[str, int]) -> bool:
+    if row_estimates.get(table.name, 0) >= HIGH_VOLUME_ROW_THRESHOLD:
+        return True
+    return any(token in HIGH_VOLUME_NAME_HINTS for token in table.name.lower().split("_"))
+
+def plan_partitions(tables: List["Table"], partition_tables: Optional[List[str]] = None,
+                    auto_partition: bool = False, partition_months: int = DEFAULT_PARTITION_MONTHS,
+                    row_estimates: Optional[Dict[str, int]] = None, start: Optional[date] = None) -> Dict[str, Any]:
+    """
+    为指定或推断的大表规划按月RANGE分区（原地修改tables）。
+
+    MySQL分区规则：分区列必须包含在主键和所有唯一键中，且InnoDB分区表不支持外键。
+    因此主键改为(原主键, 分区列)，不含分区列的唯一键降级为普通索引，涉及分区表的外键被移除。
+    自动推断只选择未被其他表引用的追加写入表；显式指定的表即使被引用也会分区，并移除引用它的外键。
+    分区不含MAXVALUE，需要定期通过维护语句ADD PARTITION预建后续月份。
+    """
+    partition_tables = set(partition_tables or [])
+    row_estimates = row_estimates or {}
+    start = _month_start(start or date.today())
+    tables_by_name = {table.name: table for table in tables}
+    referenced = {fk.ref_table for table in tables for fk in table.foreign_keys if fk.ref_table != table.name}
+
+    result = {"tables": [], "dropped_foreign_keys": [], "warnings": []}
+    for name in sorted(partition_tables - set(tables_by_name)):
+        result["warnings"].append(f"指定分区的表 {name} 不存在")
+
+    selected = []
+    for table in tables:
+        flagged = table.name in partition_tables
+        if not flagged and not (auto_partition and table.name not in referenced and _is_high_volume(table, row_estimates)):
+            continue
+        column = _partition_column(table)
+        if column is None:
+            if flagged:
+                result["warnings"].append(f"表 {table.name} 没有可用于分区的时间列，未分区")
+            continue
+        selected.append((table, column))
+
+    partitioned = {table.name for table, _ in selected}
+    # 移除涉及分区表的外键
+    for table in tables:
+        kept = []
+        for fk in table.foreign_keys:
+            if table.name in partitioned or fk.ref_table in partitioned:
+                result["dropped_foreign_keys"].append({
+                    "table": table.name,
+                    "constraint": fk.name,
+                    "reason": f"InnoDB分区表不支持外键（{table.name}.{fk.column} -> {fk.ref_table}.{fk.ref_column}）"
+                })
+            else:
+                kept.append(fk)
+        table.foreign_keys = kept
+
+    for table, column in selected:
+        # 分区列不允许为NULL
+        if "NOT NULL" not in column.constraints:
+            column.constraints = [c for c in column.constraints if c != "NULL"]
+            if base_type(column.data_type) != "DATE" and not any(c.startswith("DEFAULT") for c in column.constraints):
+                column.constraints.insert(0, "DEFAULT CURRENT_TIMESTAMP")
+            column.constraints.insert(0, "NOT NULL")
+
+        # 主键必须包含分区列
+        primary_key = table.primary_key_columns()
+        if column.name not in primary_key:
+            for col in table.columns:
+                if "PRIMARY KEY" in col.constraints:
+                    col.constraints = [c for c in col.constraints if c != "PRIMARY KEY"]
+            table.primary_key = primary_key + [column.name]
+
+        # 唯一键必须包含分区列
+        for index in table.indexes:
+            if index.unique and column.name not in index.columns:
+                index.unique = False
+                index.reason += "（分区表唯一键必须包含分区列，已降级为普通索引）"
+                result["warnings"].append(f"表 {table.name} 的唯一键 {index.name} 已降级为普通索引")
+
+        definitions = monthly_partition_definitions(column.data_type, start, partition_months)
+        table.partition_clause = (
+            f"PARTITION BY {_partition_expression(column.name, column.data_type)} (\n"
+            + ",\n".join(f"  {definition}" for definition in definitions)
+            + "\n)"
+        )
+        result["tables"].append({
+            "table": table.name,
+            "column": column.name,
+            "primary_key": table.primary_key_columns(),
+            "partitions": [definition.split()[1] for definition in definitions]
+        })
+
+    return result
+
+# 从已生成的DDL中识别分区表
+PARTITIONED_TABLE_PATTERN = re.compile(
+    r"CREATE TABLE (\w+) \(\n[^;]*?\n\) PARTITION BY (?:RANGE COLUMNS\((\w+)\)|RANGE \(UNIX_TIMESTAMP\((\w+)\)\)) \(\n(.*?)\n\);",
+    re.DOTALL
+)
+
+def generate_partition_maintenance(ddl: str, months_ahead: int = 3, retention_months: Optional[int] = None,
+                                   from_month: Optional[str] = None, as_of: Optional[date] = None,
+                                   existing_partitions: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """
+    为DDL中的按月分区表生成滚动维护语句：ADD PARTITION预建到as_of之后months_ahead个月，
+    指定retention_months时DROP PARTITION删除超出保留期的分区。
+    existing_partitions为线上各表当前的分区名（如INFORMATION_SCHEMA.PARTITIONS的查询结果），提供时按实际分区计算，
+    已删除的分区不会再次DROP、已存在的分区不会再次ADD，重复执行维护是安全的；未提供的表按DDL中的初始分区计算。
+    from_month为线上已存在分区之后的第一个月（YYYY-MM），默认取现有最后一个分区的下一个月。
+    """
+    as_of = _month_start(as_of or date.today())
+    last_month = _add_months(as_of, months_ahead)
+    existing_partitions = existing_partitions or {}
+    statements = []
+    tables = []
+
+    for match in PARTITIONED_TABLE_PATTERN.finditer(ddl):
+        table_name = match.group(1)
+        is_timestamp = match.group(3) is not None
+        data_type = "TIMESTAMP" if is_timestamp else "DATETIME"
+        existing = existing_partitions.get(table_name)
+        if existing is not None:
+            has_history = HISTORY_PARTITION in existing
+            months = sorted(parse_month(name[1:]) for name in existing if re.fullmatch(r"p\d{6}", name))
+        else:
+            has_history = True
+            months = sorted(parse_month(m) for m in re.findall(r"PARTITION p(\d{6}) VALUES", match.group(4)))
+        if not months:
+            continue
+        tables.append(table_name)
+
+        next_month = parse_month(from_month) if from_month else _add_months(months[-1], 1)
+        added = []
+        month = next_month
+        while month <= last_month:
+            if month not in months:
+                bound = _partition_bound(data_type, _add_months(month, 1))
+                added.append(f"PARTITION {_partition_name(month)} VALUES LESS THAN ({bound})")
+            month = _add_months(month, 1)
+        if added:
+            statements.append(f"ALTER TABLE {table_name} ADD PARTITION (\n  " + ",\n  ".join(added) + "\n);")
+
+        if retention_months is not None:
+            cutoff = _add_months(as_of, -retention_months)
+            expired = [HISTORY_PARTITION] if has_history and months[0] <= cutoff else []
+            expired += [_partition_name(month) for month in months if month < cutoff and month < next_month]
+            if expired:
+                statements.append(f"ALTER TABLE {table_name} DROP PARTITION {', '.join(expired)};")
+
+    return {"tables": tables, "statements": statements}
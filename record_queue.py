@@ -0,0 +1,457 @@
+"""
+新交互记录的批量写入队列。
+
+生成接口每次单独插入一条交互记录并提交，突发请求时每个请求都要等待一次提交。RECORD_QUEUE_MODE决定新记录的写入方式：
+
+- off：在请求中插入并提交（默认）；
+- sync：记录进入队列，与同一时间内其他请求的记录合并为一个多行INSERT和一次提交（组提交），提交后才响应，
+  持久性与off相同；
+- wal：记录追加到本地WAL文件并fsync后即响应，后台按批写库。进程崩溃后启动时重放WAL中尚未写库的记录；
+  写库按session_id去重，重放已写入的记录不会重复插入。
+
+队列中积累RECORD_QUEUE_BATCH_SIZE条记录或最早的记录等待了RECORD_QUEUE_FLUSH_INTERVAL秒时写入一批。
+读取会话或历史记录前先写入该会话或用户仍在队列中的记录，同一用户立即读取刚生成的会话能看到它。
+队列和WAL只在本进程内有效：wal模式下应只运行一个worker，WAL目录不能由多个进程共用。
+
+wal模式下一批记录写库失败时逐条重新写入，其余记录不受个别记录影响；数据库连接类的错误视为暂时性错误，整批留在队列中
+稍后重试。数据库拒绝的记录最多尝试RECORD_QUEUE_MAX_ATTEMPTS次，之后写入WAL目录中的dead_letter.jsonl并记录错误日志，
+移出队列和WAL，不再阻塞队列或在重启时重放，需要人工处理。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal, InteractionRecord
+from artifact_cache import stored_artifacts
+from schema_store import acquire_schema
+from history_store import adjust_history_count
+
+logger = logging.getLogger(__name__)
+
+QUEUE_MODES = ("off", "sync", "wal")
+QUEUE_MODE = os.getenv("RECORD_QUEUE_MODE", "off")
+if QUEUE_MODE not in QUEUE_MODES:
+    raise ValueError(f"RECORD_QUEUE_MODE 只能为 {', '.join(QUEUE_MODES)}")
+BATCH_SIZE = int(os.getenv("RECORD_QUEUE_BATCH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("RECORD_QUEUE_FLUSH_INTERVAL", "0.05"))
+WAL_DIR = os.getenv("RECORD_QUEUE_WAL_DIR", "record_wal")
+MAX_ATTEMPTS = int(os.getenv("RECORD_QUEUE_MAX_ATTEMPTS", "5"))
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+def new_record(user_id: int, description: str, session_id: str, schema: Dict[str, Any],
+               er_model: Dict[str, Any], ddl: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """生成接口的新交互记录：交互记录的列加上schema本身，由persist_records写入"""
+    return {
+        "user_id": user_id,
+        "description": description,
+        "session_id": session_id,
+        "created_at": datetime.utcnow(),
+        "schema": schema,
+        **stored_artifacts(schema, er_model, ddl, options)
+    }
+
+def persist_records(db: Session, records: List[Dict[str, Any]]) -> int:
+    """
+    以一个多行INSERT写入新交互记录，并在同一事务中增加schema的引用计数和用户的记录数；由调用方提交。
+    session_id已存在的记录（重放WAL或重试已提交的批次）跳过，返回实际写入的条数。
+    """
+    existing = set(db.execute(select(InteractionRecord.session_id).where(
+        InteractionRecord.session_id.in_([record["session_id"] for record in records])
+    )).scalars())
+    rows = []
+    counts = Counter()
+    for record in records:
+        if record["session_id"] in existing:
+            continue
+        row = dict(record)
+        schema = row.pop("schema")
+        row["schema_hash"] = acquire_schema(db, schema)
+        row["table_count"] = len(schema["entities"])
+        rows.append(row)
+        counts[row["user_id"]] += 1
+    if rows:
+        db.execute(insert(InteractionRecord), rows)
+    for user_id, count in counts.items():
+        adjust_history_count(db, user_id, count)
+    return len(rows)
+
+class WriteAheadLog:
+    """
+    按段保存的追加日志，每行一条JSON。同时到达的追加合并为一次写入和一次fsync；
+    每写一批记录前切换到新的段，段中的记录全部写库后删除该段。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._segment = 0
+        self._live: Dict[int, int] = {}
+        self._buffer: List[Tuple[str, asyncio.Future]] = []
+        self._obsolete: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+        self._file = None
+        self._file_segment: Optional[int] = None
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}.wal")
+
+    def replay(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """读取已有的段，返回 (段号, 记录) 列表；之后的追加写入新的段"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                          if name.endswith(".wal") and name[:-4].isdigit())
+        entries = []
+        for segment in segments:
+            count = 0
+            with open(self._path(segment), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append((segment, json.loads(line)))
+                        count += 1
+                    except ValueError:
+                        # 崩溃时只写了一部分的最后一行，对应的请求没有得到响应
+                        logger.warning(f"WAL段 {segment} 中有不完整的行，已忽略")
+            if count:
+                self._live[segment] = count
+            else:
+                os.remove(self._path(segment))
+        self._segment = segments[-1] + 1 if segments else 0
+        return entries
+
+    async def append(self, payload: Dict[str, Any]) -> int:
+        """追加一条记录，fsync后返回所在的段号"""
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((json.dumps(payload, ensure_ascii=False, separators=(",", ":")), future))
+        self._wake()
+        return await future
+
+    def rotate(self):
+        """之后的追加写入新的段"""
+        previous = self._segment
+        self._segment += 1
+        if previous in self._live and self._live[previous] <= 0:
+            self._retire(previous)
+
+    def release(self, segment: int, count: int):
+        """段中的count条记录已写库"""
+        self._live[segment] -= count
+        if self._live[segment] <= 0 and segment != self._segment:
+            self._retire(segment)
+
+    def _retire(self, segment: int):
+        self._live.pop(segment, None)
+        self._obsolete.append(segment)
+        self._wake()
+
+    def _wake(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # 所有文件操作都在这个任务中依次执行
+        try:
+            while self._buffer or self._obsolete:
+                batch, self._buffer = self._buffer, []
+                if batch:
+                    segment = self._segment
+                    try:
+                        await asyncio.to_thread(self._write, segment, [line for line, _ in batch])
+                    except Exception as e:
+                        for _, future in batch:
+                            if not future.done():
+                                future.set_exception(e)
+                    else:
+                        self._live[segment] = self._live.get(segment, 0) + len(batch)
+                        for _, future in batch:
+                            if not future.done():
+                                future.set_result(segment)
+                obsolete, self._obsolete = self._obsolete, []
+                for segment in obsolete:
+                    # 切换段之前开始的写入可能在段被标记为可删除之后才完成，这时段中又有了未写库的记录
+                    if self._live.get(segment, 0) <= 0:
+                        await asyncio.to_thread(self._remove, segment)
+        finally:
+            self._task = None
+
+    def _write(self, segment: int, lines: List[str]):
+        if self._file_segment != segment:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self._path(segment), "a", encoding="utf-8")
+            self._file_segment = segment
+        self._file.write("".join(line + "\n" for line in lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _remove(self, segment: int):
+        if self._file_segment == segment:
+            self._file.close()
+            self._file = None
+            self._file_segment = None
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            await self._task
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_segment = None
+
+    def segments(self) -> int:
+        return len(self._live)
+
+def _wal_payload(record: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(record, created_at=record["created_at"].isoformat())
+
+def _from_wal_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(payload, created_at=datetime.fromisoformat(payload["created_at"]))
+
+def _is_transient(error: Exception) -> bool:
+    """连接断开、数据库不可用等与具体记录无关的错误"""
+    if isinstance(error, (OperationalError, InterfaceError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+class RecordWriteError(Exception):
+    """会话的交互记录仍未写库（写库失败，等待重试）"""
+
+class QueuedRecord:
+    def __init__(self, record: Dict[str, Any], segment: Optional[int] = None,
+                 future: Optional[asyncio.Future] = None):
+        self.record = record
+        self.segment = segment
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        # 因记录本身被数据库拒绝而失败的次数
+        self.attempts = 0
+
+class RecordQueue:
+    """新交互记录的写入队列；所有操作都在事件循环线程中执行"""
+
+    def __init__(self, mode: str = QUEUE_MODE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, wal_dir: str = WAL_DIR,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.wal = WriteAheadLog(wal_dir) if mode == "wal" else None
+        self.dead_letter_path = os.path.join(wal_dir, DEAD_LETTER_FILE)
+        self._pending: List[QueuedRecord] = []
+        # 尚未写库（包括正在写入的批次）的记录：session_id -> user_id
+        self._unflushed: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self.enqueued = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.flushed_records = 0
+        self.flush_errors = 0
+        self.dead_letters = 0
+        self.max_batch = 0
+        self.last_flush_ms = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    async def enqueue(self, record: Dict[str, Any]):
+        """
+        把new_record()生成的记录放入队列。sync模式下等到所在的批次提交后返回，写库失败时抛出异常；
+        wal模式下写入WAL并fsync后返回。
+        """
+        segment = None
+        if self.wal is not None:
+            segment = await self.wal.append(_wal_payload(record))
+        future = asyncio.get_running_loop().create_future() if self.mode == "sync" else None
+        self._append(QueuedRecord(record, segment, future))
+        self.enqueued += 1
+        if len(self._pending) >= self.batch_size:
+            task = asyncio.create_task(self._flush_logged())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if future is not None:
+            await future
+
+    def _append(self, item: QueuedRecord):
+        self._pending.append(item)
+        self._unflushed[item.record["session_id"]] = item.record["user_id"]
+
+    async def flush(self):
+        """
+        写入队列中的所有记录；正在写入的批次先完成。sync模式下写库失败时抛出异常。
+        wal模式下暂时性错误抛出异常，整批留在队列中稍后重试；其他错误时逐条写入，
+        被拒绝的记录留在队列中稍后重试（超过重试次数的移入死信文件），不抛出异常。
+        """
+        async with self._lock:
+            # failed：被拒绝、等待下次重试的记录；singles：失败批次中等待逐条写入的记录
+            failed, singles = [], []
+            try:
+                while singles or self._pending:
+                    if singles:
+                        batch = [singles.pop(0)]
+                    else:
+                        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                    if self.wal is not None:
+                        self.wal.rotate()
+                    try:
+                        await self._write_batch(batch)
+                    except Exception as e:
+                        if self.mode == "sync":
+                            raise
+                        if _is_transient(e):
+                            self._pending = batch + self._pending
+                            raise
+                        if len(batch) > 1:
+                            # 批次中可能只有个别记录被拒绝，逐条写入，其余记录不受影响
+                            singles = batch + singles
+                            continue
+                        item = batch[0]
+                        item.attempts += 1
+                        logger.error(f"会话 {item.record['session_id']} 的交互记录写库失败"
+                                     f"（第 {item.attempts} 次）: {str(e)}")
+                        failed.append(item)
+                        if item.attempts >= self.max_attempts:
+                            await self._dead_letter(item, e)
+                            failed.pop()
+            finally:
+                # 被拒绝的记录放回队首，下次写入时重试
+                self._pending = failed + singles + self._pending
+
+    async def _dead_letter(self, item: QueuedRecord, error: Exception):
+        """超过重试次数的记录写入死信文件并移出队列和WAL"""
+        line = json.dumps(dict(_wal_payload(item.record), error=str(error)), ensure_ascii=False,
+                          separators=(",", ":"))
+        await asyncio.to_thread(self._append_dead_letter, line)
+        self._unflushed.pop(item.record["session_id"], None)
+        if self.wal is not None and item.segment is not None:
+            self.wal.release(item.segment, 1)
+        self.dead_letters += 1
+        logger.error(f"会话 {item.record['session_id']} 的交互记录 {item.attempts} 次写库失败，"
+                     f"已移入 {self.dead_letter_path}")
+
+    def _append_dead_letter(self, line: str):
+        os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _write_batch(self, batch: List[QueuedRecord]):
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                written = await db.run_sync(persist_records, [item.record for item in batch])
+                await db.commit()
+        except Exception as e:
+            self.flush_errors += 1
+            if self.mode == "sync":
+                # 请求仍在等待，由它们返回错误
+                for item in batch:
+                    self._unflushed.pop(item.record["session_id"], None)
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            raise
+        for item in batch:
+            self._unflushed.pop(item.record["session_id"], None)
+            if item.future is not None and not item.future.done():
+                item.future.set_result(None)
+        if self.wal is not None:
+            for segment, count in Counter(item.segment for item in batch).items():
+                self.wal.release(segment, count)
+        self.flushes += 1
+        self.flushed_records += written
+        self.max_batch = max(self.max_batch, len(batch))
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"交互记录批量写入失败: {str(e)}")
+
+    async def flush_session(self, session_id: str):
+        """
+        会话的记录仍在队列中时先写入。只有该会话自己的记录未能写入时才抛出异常，
+        同一批次中其他用户的记录失败不影响本次读取。
+        """
+        if session_id in self._unflushed:
+            await self._flush_for(lambda: session_id in self._unflushed, f"会话 {session_id}")
+
+    async def flush_user(self, user_id: int):
+        if user_id in self._unflushed.values():
+            await self._flush_for(lambda: user_id in self._unflushed.values(), f"用户 {user_id}")
+
+    async def _flush_for(self, still_pending, owner: str):
+        try:
+            await self.flush()
+        except Exception as e:
+            if still_pending():
+                raise
+            logger.warning(f"交互记录写入失败，但 {owner} 的记录均已写入: {str(e)}")
+            return
+        if still_pending():
+            raise RecordWriteError(f"{owner} 的交互记录写库失败，稍后重试")
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._pending and time.monotonic() - self._pending[0].enqueued_at >= self.flush_interval:
+                await self._flush_logged()
+
+    async def start(self):
+        """wal模式下重放WAL中尚未写库的记录，然后启动后台写入"""
+        if self.wal is not None:
+            entries = await asyncio.to_thread(self.wal.replay)
+            for segment, payload in entries:
+                self._append(QueuedRecord(_from_wal_payload(payload), segment))
+            self.replayed = len(entries)
+            if entries:
+                logger.info(f"从WAL恢复 {len(entries)} 条尚未写库的交互记录")
+                await self._flush_logged()
+        if self.enabled and self._flusher is None:
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def close(self):
+        """停止后台写入并写入队列中的所有记录"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            await self.flush()
+        finally:
+            if self.wal is not None:
+                await self.wal.close()
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = time.monotonic() - self._pending[0].enqueued_at if self._pending else None
+        return {
+            "mode": self.mode,
+            "batch_size": self.batch_size,
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "replayed": self.replayed,
+            "flushes": self.flushes,
+            "flushed_records": self.flushed_records,
+            "flush_errors": self.flush_errors,
+            "dead_letters": self.dead_letters,
+            "max_batch": self.max_batch,
+            "last_flush_ms": self.last_flush_ms,
+            "oldest_pending_ms": round(oldest * 1000, 1) if oldest is not None else None,
+            "wal_segments": self.wal.segments() if self.wal is not None else None
+        }
+
+record_queue = RecordQueue()
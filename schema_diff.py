@@ -0,0 +1,139 @@
+from typing import Dict, List, Any, Optional
+
+from schema_generator import Table, Column, compile_schema, create_table_sql
+
+def _column_definition(col: Column) -> str:
+    # 主键单独处理，避免MODIFY/ADD COLUMN重复定义主键
+    return Column(col.name, col.data_type, [c for c in col.constraints if c != "PRIMARY KEY"]).to_sql()
+
+def _column_signature(col: Column) -> tuple:
+    return (col.data_type.upper(), tuple(c.upper() for c in col.constraints if c != "PRIMARY KEY"))
+
+def _rename_clauses(renames: Dict[str, str], used_names: set) -> List[str]:
+    """
+    把 {旧表名: 新表名} 排成一条RENAME TABLE语句中的子句。MySQL按顺序逐个重命名，
+    因此目标名仍被其他待重命名表占用时先处理占用者；互相交换名称形成环时借助临时表名断开。
+    """
+    pending = dict(renames)
+    clauses = []
+    while pending:
+        ready = sorted(old for old, new in pending.items() if new not in pending)
+        if ready:
+            for old in ready:
+                clauses.append(f"{old} TO {pending.pop(old)}")
+            continue
+        old = min(pending)
+        temp = f"{old}_rename_tmp"
+        while temp in used_names or temp in pending:
+            temp += "_"
+        used_names.add(temp)
+        clauses.append(f"{old} TO {temp}")
+        pending[temp] = pending.pop(old)
+    return clauses
+
+def diff_tables(old_tables: List[Table], new_tables: List[Table],
+                renamed_tables: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    比较两版关系模式，生成把旧库迁移到新结构的最小语句序列。
+
+    语句顺序：删除外键 -> 重命名表 -> 删除索引 -> 新建表（不含外键）-> 逐表ALTER列和主键 -> 新建索引
+    -> 调整分区 -> 删除表 -> 添加外键。这样任何外键都不会引用尚未存在或即将删除的表和列，
+    删除列时也不会先隐式删掉随后还要DROP的索引。
+    所有比较都基于名称哈希查找，耗时与schema规模成线性关系。
+    """
+    renamed_tables = renamed_tables or {}
+    old_by_name = {renamed_tables.get(table.name, table.name): table for table in old_tables}
+    new_by_name = {table.name: table for table in new_tables}
+
+    drop_fks, renames, creates, alters, drop_indexes, create_indexes = [], [], [], [], [], []
+    partitions, drop_tables, add_fks = [], [], []
+
+    rename_clauses = _rename_clauses({old_name: new_name for old_name, new_name in renamed_tables.items()
+                                      if old_name != new_name and new_name in new_by_name},
+                                     set(new_by_name) | {table.name for table in old_tables})
+    if rename_clauses:
+        renames.append(f"RENAME TABLE {', '.join(rename_clauses)};")
+
+    # 外键：按约束名比较，定义变化的先删后加
+    old_fks = {fk.name: (name, fk) for name, table in old_by_name.items() for fk in table.foreign_keys}
+    new_fks = {fk.name: fk for table in new_tables for fk in table.foreign_keys}
+    for fk_name, (table_name, old_fk) in old_fks.items():
+        new_fk = new_fks.get(fk_name)
+        if new_fk is None or new_fk.to_sql() != old_fk.to_sql():
+            # 旧约束名基于旧表名生成，删除时使用迁移前的表名
+            original = old_by_name[table_name].name
+            drop_fks.append(f"ALTER TABLE {original} DROP FOREIGN KEY {fk_name};")
+    for fk_name, new_fk in new_fks.items():
+        old_entry = old_fks.get(fk_name)
+        if old_entry is None or old_entry[1].to_sql() != new_fk.to_sql():
+            add_fks.append(f"ALTER TABLE {new_fk.table} ADD {new_fk.to_sql()};")
+
+    for name, table in new_by_name.items():
+        old = old_by_name.get(name)
+        if old is None:
+            creates.append(create_table_sql(table, []))
+            continue
+
+        # 列：新增、删除、修改
+        clauses = []
+        old_columns = {col.name: col for col in old.columns}
+        new_columns = {col.name for col in table.columns}
+        for col in old.columns:
+            if col.name not in new_columns:
+                clauses.append(f"DROP COLUMN {col.name}")
+        previous = None
+        for col in table.columns:
+            old_col = old_columns.get(col.name)
+            position = f" AFTER {previous}" if previous else " FIRST"
+            if old_col is None:
+                clauses.append(f"ADD COLUMN {_column_definition(col)}{position}")
+            elif _column_signature(old_col) != _column_signature(col):
+                clauses.append(f"MODIFY COLUMN {_column_definition(col)}")
+            previous = col.name
+
+        # 主键
+        old_pk, new_pk = old.primary_key_columns(), table.primary_key_columns()
+        if old_pk != new_pk:
+            if old_pk:
+                clauses.append("DROP PRIMARY KEY")
+            if new_pk:
+                clauses.append(f"ADD PRIMARY KEY ({', '.join(new_pk)})")
+        if clauses:
+            alters.append(f"ALTER TABLE {name}\n  " + ",\n  ".join(clauses) + ";")
+
+        # 索引：按索引名比较
+        old_indexes = {idx.name: idx for idx in old.indexes}
+        new_indexes = {idx.name: idx for idx in table.indexes}
+        for idx_name, idx in old_indexes.items():
+            new_idx = new_indexes.get(idx_name)
+            if new_idx is None or (new_idx.columns, new_idx.unique) != (idx.columns, idx.unique):
+                drop_indexes.append(f"DROP INDEX {idx_name} ON {name};")
+        for idx_name, idx in new_indexes.items():
+            old_idx = old_indexes.get(idx_name)
+            if old_idx is None or (old_idx.columns, old_idx.unique) != (idx.columns, idx.unique):
+                kind = "UNIQUE INDEX" if idx.unique else "INDEX"
+                create_indexes.append(f"CREATE {kind} {idx_name} ON {name} ({', '.join(idx.columns)});")
+
+        # 分区
+        if old.partition_clause != table.partition_clause:
+            if table.partition_clause:
+                partitions.append(f"ALTER TABLE {name} {table.partition_clause};")
+            else:
+                partitions.append(f"ALTER TABLE {name} REMOVE PARTITIONING;")
+
+    for name, old in old_by_name.items():
+        if name not in new_by_name:
+            drop_tables.append(f"DROP TABLE {old.name};")
+
+    return (drop_fks + renames + drop_indexes + creates + alters + create_indexes
+            + partitions + drop_tables + add_fks)
+
+def diff_schemas(old_schema: Dict[str, Any], new_schema: Dict[str, Any],
+                 renamed_tables: Optional[Dict[str, str]] = None, **compile_options) -> List[str]:
+    """
+    比较两个schema字典（例如modify_entity前后），返回ALTER迁移语句列表。
+    compile_options与compile_schema的可选参数一致，两版schema使用相同的选项编译。
+    """
+    old_tables = compile_schema(old_schema, **compile_options)["tables"]
+    new_tables = compile_schema(new_schema, **compile_options)["tables"]
+    return diff_tables(old_tables, new_tables, renamed_tables)
@@ -1,10 +1,19 @@
 import json
 import re
 import os
-from typing import Dict, List, Any, Optional
+import hashlib
+import heapq
+from typing import Dict, List, Any, Optional, Tuple
 import uuid
 import dashscope
 
+from type_optimizer import base_type, optimize_column_types
+from partitioning import plan_partitions, parse_month, DEFAULT_PARTITION_MONTHS
+from schema_linter import lint_schema
+
+# 生成器版本：相同schema生成的ER模型或DDL发生变化时递增，用于失效按版本缓存的派生结果
+GENERATOR_VERSION = "1"
+
 # 数据结构定义
 class Entity:
     def __init__(self, name: str, attributes: List[str], primary_key: str):
@@ -29,22 +38,116 @@ class Column:
         self.data_type = data_type
         self.constraints = constraints or []
 
+    def to_sql(self) -> str:
+        cons = " ".join(self.constraints)
+        return f"{self.name} {self.data_type} {cons}".strip()
+
+class ForeignKey:
+    def __init__(self, table: str, column: str, ref_table: str, ref_column: str, on_delete: str = None):
+        self.table = table
+        self.column = column
+        self.ref_table = ref_table
+        self.ref_column = ref_column
+        self.on_delete = on_delete
+        self.name = constraint_name("fk", table, [column])
+
+    def to_sql(self) -> str:
+        sql = f"CONSTRAINT {self.name} FOREIGN KEY ({self.column}) REFERENCES {self.ref_table}({self.ref_column})"
+        if self.on_delete:
+            sql += f" ON DELETE {self.on_delete}"
+        return sql
+
+class Index:
+    def __init__(self, table: str, columns: List[str], unique: bool = False, reason: str = ""):
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.reason = reason
+        self.name = constraint_name("uk" if unique else "idx", table, columns)
+
+    def to_sql(self) -> str:
+        kind = "UNIQUE KEY" if self.unique else "KEY"
+        sql = f"{kind} {self.name} ({', '.join(self.columns)})"
+        if self.reason:
+            comment = self.reason.replace("'", "''")
+            sql += f" COMMENT '{comment}'"
+        return sql
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "name": self.name,
+            "columns": self.columns,
+            "unique": self.unique,
+            "reason": self.reason
+        }
+
 class Table:
-    def __init__(self, name: str, columns: List[Column], foreign_keys: List[str] = None):
+    def __init__(self, name: str, columns: List[Column], foreign_keys: List[ForeignKey] = None,
+                 indexes: List[Index] = None):
         self.name = name
         self.columns = columns
         self.foreign_keys = foreign_keys or []
+        self.indexes = indexes or []
+        # 表级组合主键（为空时使用列级PRIMARY KEY约束）
+        self.primary_key = []
+        # 表选项之后的分区子句
+        self.partition_clause = None
+
+    def primary_key_columns(self) -> List[str]:
+        if self.primary_key:
+            return self.primary_key
+        return [col.name for col in self.columns if "PRIMARY KEY" in col.constraints]
+
+# MySQL标识符最长64个字符
+MYSQL_IDENTIFIER_MAX_LENGTH = 64
+
+def constraint_name(prefix: str, table: str, columns: List[str]) -> str:
+    """
+    生成确定性的约束/索引名，超长时截断并附加哈希后缀以保持唯一。
+    """
+    name = "_".join([prefix, table] + list(columns))
+    if len(name) <= MYSQL_IDENTIFIER_MAX_LENGTH:
+        return name
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:MYSQL_IDENTIFIER_MAX_LENGTH - 9]}_{digest}"
 
 # 调用阿里云通义千问API
-def call_llm_for_schema(prompt: str) -> Dict[str, Any]:
+def call_llm_json(full_prompt: str) -> Dict[str, Any]:
     """
-    调用阿里云通义千问大模型将自然语言转换为结构化schema。
+    调用通义千问并把响应解析为JSON；响应中夹杂其他文本时提取其中的JSON部分。
     """
     # 设置API key
     dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
     if not dashscope.api_key:
         raise ValueError("请设置DASHSCOPE_API_KEY环境变量")
 
+    response = dashscope.Generation.call(
+        model='qwen-turbo',
+        prompt=full_prompt
+    )
+
+    if response.status_code == 200:
+        result = response.output.text
+        # 尝试解析JSON
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            # 如果直接解析失败，尝试提取JSON部分
+            json_match = re.search(r'\{.*\}', result, re.DOTALL)
+            if json_match:
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    pass
+            raise ValueError(f"无法解析LLM响应为JSON: {result}")
+    else:
+        raise ValueError(f"API调用失败: {response.status_code}, {response.message}")
+
+def call_llm_for_schema(prompt: str) -> Dict[str, Any]:
+    """
+    调用阿里云通义千问大模型将自然语言转换为结构化schema。
+    """
     # 构造prompt，要求输出JSON格式的schema
     full_prompt = f"""
 你是一个专业的数据库建模专家。请根据用户提供的自然语言需求描述，自动生成一个结构完整、符合关系数据库范式的概念模型，并以严格指定的 JSON 格式输出。
@@ -117,28 +220,7 @@ def call_llm_for_schema(prompt: str) -> Dict[str, Any]:
 {prompt}
 """
 
-    response = dashscope.Generation.call(
-        model='qwen-turbo',
-        prompt=full_prompt
-    )
-
-    if response.status_code == 200:
-        result = response.output.text
-        # 尝试解析JSON
-        try:
-            schema = json.loads(result)
-            return schema
-        except json.JSONDecodeError:
-            # 如果直接解析失败，尝试提取JSON部分
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    pass
-            raise ValueError(f"无法解析LLM响应为JSON: {result}")
-    else:
-        raise ValueError(f"API调用失败: {response.status_code}, {response.message}")
+    return call_llm_json(full_prompt)
 
 # 核心函数：解析自然语言到schema
 def parse_natural_language_to_schema(user_input: str) -> Dict[str, Any]:
@@ -176,52 +258,274 @@ def convert_to_relational_schema(schema: Dict[str, Any]) -> List[Table]:
     """
     tables = []
 
+    # 按源表分组关系，避免每个实体都扫描全部关系
+    relationships_by_table = {}
+    for rel in schema["relationships"]:
+        relationships_by_table.setdefault(rel["from_table"], []).append(rel)
+
     # 为每个实体创建表
     for entity in schema["entities"]:
         columns = []
         foreign_keys = []
+        relationships = relationships_by_table.get(entity["table_name"], [])
+        # ON DELETE SET NULL的外键列必须允许NULL
+        nullable_columns = {rel["from_column"] for rel in relationships
+                            if (rel.get("on_delete") or "").upper() == "SET NULL"}
 
         # 处理所有属性
         for attr in entity["attributes"]:
             constraints = []
             if attr["is_primary_key"]:
                 constraints.extend(["AUTO_INCREMENT", "PRIMARY KEY"])
-            elif attr["name"].endswith("_id"):  # 可能是外键
+            elif attr["name"].endswith("_id") and attr["name"] not in nullable_columns:  # 可能是外键
                 constraints.append("NOT NULL")
 
             column = Column(attr["name"], attr["data_type"], constraints)
             columns.append(column)
 
         # 处理外键约束
-        for rel in schema["relationships"]:
-            if rel["from_table"] == entity["table_name"]:
-                fk_constraint = f"FOREIGN KEY ({rel['from_column']}) REFERENCES {rel['to_table']}({rel['to_column']})"
-                if rel.get("on_delete"):
-                    fk_constraint += f" ON DELETE {rel['on_delete']}"
-                foreign_keys.append(fk_constraint)
+        for rel in relationships:
+            foreign_keys.append(ForeignKey(entity["table_name"], rel["from_column"],
+                                           rel["to_table"], rel["to_column"], rel.get("on_delete")))
 
         tables.append(Table(entity["table_name"], columns, foreign_keys))
 
     return tables
 
+# 常用于过滤/排序的列
+FILTER_COLUMN_NAMES = {"status", "state", "type", "category", "level"}
+TIME_COLUMN_SUFFIXES = ("_at", "_date", "_time")
+TIME_DATA_TYPES = ("DATETIME", "DATE", "TIMESTAMP")
+# 更新频繁而很少用于查询的列不建索引，避免写放大
+NON_INDEXED_TIME_COLUMNS = {"updated_at"}
+# 无法直接建立普通索引的类型
+NON_INDEXABLE_TYPES = ("TEXT", "TINYTEXT", "MEDIUMTEXT", "LONGTEXT", "BLOB", "JSON")
+# 中间表允许携带的附加列（如时间戳）
+JUNCTION_EXTRA_COLUMN_SUFFIXES = ("_at", "_date", "_time")
+
+def _is_junction_table(table: Table) -> bool:
+    """
+    判断是否为纯中间表：恰好两个外键指向不同的表，其余非主键列只有时间戳。
+    """
+    if len(table.foreign_keys) != 2:
+        return False
+    if table.foreign_keys[0].ref_table == table.foreign_keys[1].ref_table:
+        return False
+    fk_columns = {fk.column for fk in table.foreign_keys}
+    pk_columns = set(table.primary_key_columns())
+    extra = [col.name for col in table.columns if col.name not in fk_columns and col.name not in pk_columns]
+    return all(name.endswith(JUNCTION_EXTRA_COLUMN_SUFFIXES) for name in extra)
+
+# 索引规划
+def plan_indexes(tables: List[Table]) -> List[Index]:
+    """
+    为外键列、中间表组合键以及常用过滤/排序列规划二级索引。
+    规划结果写入各表的indexes并返回全部索引；已被主键或其他索引最左前缀覆盖的列不重复建索引。
+    """
+    planned = []
+    for table in tables:
+        types = {col.name: col.data_type for col in table.columns}
+        covered = [tuple(table.primary_key_columns())] + [tuple(idx.columns) for idx in table.indexes]
+
+        def add(columns: List[str], unique: bool, reason: str):
+            if any(existing[:len(columns)] == tuple(columns) for existing in covered):
+                return
+            if any(base_type(types.get(col, "")) in NON_INDEXABLE_TYPES for col in columns):
+                return
+            index = Index(table.name, columns, unique, reason)
+            table.indexes.append(index)
+            covered.append(tuple(columns))
+            planned.append(index)
+
+        # 中间表：组合唯一键覆盖正向查询，第二列单独索引覆盖反向查询
+        if _is_junction_table(table):
+            first, second = table.foreign_keys
+            add([first.column, second.column], True,
+                f"中间表组合键，保证 {first.ref_table}-{second.ref_table} 关联唯一并加速按 {first.column} 查询")
+            add([second.column], False, f"中间表反向查询，按 {second.column} 连接 {second.ref_table}")
+
+        # 外键列
+        for fk in table.foreign_keys:
+            add([fk.column], False, f"外键列，加速与 {fk.ref_table} 的连接查询及级联操作")
+
+        # 常用过滤/排序列
+        for col in table.columns:
+            name = col.name.lower()
+            if name in FILTER_COLUMN_NAMES:
+                add([col.name], False, f"常用过滤列 {col.name}")
+            elif (name.endswith(TIME_COLUMN_SUFFIXES) and name not in NON_INDEXED_TIME_COLUMNS
+                  and base_type(col.data_type) in TIME_DATA_TYPES):
+                add([col.name], False, f"时间列 {col.name}，用于范围过滤和排序")
+
+    return planned
+
+# 按外键依赖排序
+def sort_tables_by_dependency(tables: List[Table]) -> Tuple[List[Table], List[ForeignKey]]:
+    """
+    按外键依赖对表做拓扑排序，被引用的表排在前面。
+    处于环中的外键（自引用除外）无法内联创建，返回给调用方以ALTER TABLE延迟添加。
+    无依赖约束的表保持原有顺序。
+    """
+    index = {table.name: i for i, table in enumerate(tables)}
+    # 邻接表：表 -> 它引用的表（只考虑schema内存在的表）
+    refs = [
+        sorted({index[fk.ref_table] for fk in table.foreign_keys
+                if fk.ref_table in index and fk.ref_table != table.name})
+        for table in tables
+    ]
+
+    # Tarjan强连通分量（迭代实现，避免大schema递归过深）
+    comp = [-1] * len(tables)
+    low = [0] * len(tables)
+    order = [-1] * len(tables)
+    on_stack = [False] * len(tables)
+    stack = []
+    counter = 0
+    comp_count = 0
+    for root in range(len(tables)):
+        if order[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                order[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            if i < len(refs[node]):
+                work.append((node, i + 1))
+                nxt = refs[node][i]
+                if order[nxt] == -1:
+                    work.append((nxt, 0))
+                elif on_stack[nxt]:
+                    low[node] = min(low[node], order[nxt])
+                continue
+            if low[node] == order[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    comp[member] = comp_count
+                    if member == node:
+                        break
+                comp_count += 1
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+
+    # 环内外键延迟添加，其余外键决定建表顺序
+    deferred = []
+    pending = [0] * len(tables)
+    dependents = [[] for _ in tables]
+    for i, table in enumerate(tables):
+        for fk in table.foreign_keys:
+            j = index.get(fk.ref_table)
+            if j is None or j == i:
+                continue
+            if comp[i] == comp[j]:
+                deferred.append(fk)
+            else:
+                pending[i] += 1
+                dependents[j].append(i)
+
+    # Kahn算法，用最小堆保证稳定的原有顺序
+    heap = [i for i in range(len(tables)) if pending[i] == 0]
+    heapq.heapify(heap)
+    ordered = []
+    while heap:
+        i = heapq.heappop(heap)
+        ordered.append(tables[i])
+        for dep in dependents[i]:
+            pending[dep] -= 1
+            if pending[dep] == 0:
+                heapq.heappush(heap, dep)
+
+    return ordered, deferred
+
+def create_table_sql(table: Table, foreign_keys: List[ForeignKey]) -> str:
+    """
+    生成单张表的CREATE TABLE语句，只内联给定的外键。
+    """
+    sql = f"CREATE TABLE {table.name} (\n"
+    sql += ",\n".join(col.to_sql() for col in table.columns)
+    if table.primary_key:
+        sql += f",\n  PRIMARY KEY ({', '.join(table.primary_key)})"
+    if table.indexes:
+        sql += ",\n" + ",\n".join(f"  {idx.to_sql()}" for idx in table.indexes)
+    if foreign_keys:
+        sql += ",\n" + ",\n".join(f"  {fk.to_sql()}" for fk in foreign_keys)
+    sql += "\n)"
+    if table.partition_clause:
+        sql += f" {table.partition_clause}"
+    return sql + ";"
+
 # 生成MySQL DDL
 def generate_mysql_ddl(tables: List[Table]) -> str:
     """
     生成MySQL CREATE TABLE语句。
+    表按外键依赖排序，环中的外键以ALTER TABLE语句追加在末尾，
+    整个脚本可以按顺序一次性执行。
     """
+    ordered_tables, deferred = sort_tables_by_dependency(tables)
+    deferred_ids = {id(fk) for fk in deferred}
+
     ddl = ""
-    for table in tables:
-        ddl += f"CREATE TABLE {table.name} (\n"
-        cols = []
-        for col in table.columns:
-            cons = " ".join(col.constraints)
-            cols.append(f"  {col.name} {col.data_type} {cons}".strip())
-        ddl += ",\n".join(cols)
-        if table.foreign_keys:
-            ddl += ",\n" + ",\n".join(f"  {fk}" for fk in table.foreign_keys)
-        ddl += "\n);\n\n"
+    for table in ordered_tables:
+        inline_fks = [fk for fk in table.foreign_keys if id(fk) not in deferred_ids]
+        ddl += create_table_sql(table, inline_fks) + "\n\n"
+
+    for fk in deferred:
+        ddl += f"ALTER TABLE {fk.table} ADD {fk.to_sql()};\n\n"
     return ddl
 
+def er_model_to_dict(er_model: ERModel) -> Dict[str, Any]:
+    """
+    将ER模型转换为可序列化的字典。
+    """
+    return {
+        "entities": [
+            {"name": e.name, "attributes": e.attributes, "primary_key": e.primary_key}
+            for e in er_model.entities
+        ],
+        "relationships": [
+            {"name": r.name, "entities": r.entities, "cardinality": r.cardinality}
+            for r in er_model.relationships
+        ]
+    }
+
+# 完整生成流程
+def compile_schema(schema: Dict[str, Any], optimize_types: bool = False,
+                   row_estimates: Optional[Dict[str, int]] = None,
+                   auto_partition: bool = False, partition_tables: Optional[List[str]] = None,
+                   partition_months: int = DEFAULT_PARTITION_MONTHS,
+                   partition_start: Optional[str] = None) -> Dict[str, Any]:
+    """
+    从schema生成ER模型、关系模式、索引规划和MySQL DDL。
+    optimize_types为True时在生成DDL前按列语义收紧列类型，row_estimates为各表预估行数。
+    auto_partition/partition_tables为推断或指定的大表生成按月RANGE分区，
+    partition_start为第一个月分区（YYYY-MM），为空时取当前月份。
+    lint为schema中影响性能的模式检查结果。
+    """
+    er_model = build_er_model(schema)
+    tables = convert_to_relational_schema(schema)
+    type_optimization = optimize_column_types(tables, row_estimates) if optimize_types else None
+    indexes = plan_indexes(tables)
+    partitioning = None
+    if auto_partition or partition_tables:
+        partitioning = plan_partitions(tables, partition_tables, auto_partition,
+                                       partition_months, row_estimates,
+                                       parse_month(partition_start) if partition_start else None)
+    ddl = generate_mysql_ddl(tables)
+    return {
+        "er_model": er_model_to_dict(er_model),
+        "tables": tables,
+        "indexes": [idx.to_dict() for idx in indexes],
+        "type_optimization": type_optimization,
+        "partitioning": partitioning,
+        "lint": lint_schema(schema, row_estimates),
+        "ddl": ddl
+    }
+
 # 交互式修正功能
 def modify_entity(schema: Dict[str, Any], entity_name: str, new_attributes: List[Dict[str, Any]] = None, new_table_name: str = None) -> Dict[str, Any]:
     """
@@ -233,6 +537,12 @@ def modify_entity(schema: Dict[str, Any], entity_name: str, new_attributes: List
                 ent["attributes"] = new_attributes
             if new_table_name:
                 ent["table_name"] = new_table_name
+                # 同步更新引用该表的关系
+                for rel in schema["relationships"]:
+                    if rel["from_table"] == entity_name:
+                        rel["from_table"] = new_table_name
+                    if rel["to_table"] == entity_name:
+                        rel["to_table"] = new_table_name
             break
     return schema
 
@@ -286,4 +596,70 @@ def delete_relationship(schema: Dict[str, Any], rel: Dict[str, Any]) -> Dict[str
                 r["to_table"] == rel["to_table"] and
                 r["to_column"] == rel["to_column"])
     ]
-    return schema
\ No newline at end of file
+    return schema
+
+class OperationError(ValueError):
+    """批量修改中第index个操作（从0开始）无法执行"""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(message)
+        self.index = index
+
+def _find_relationship(schema: Dict[str, Any], rel: Dict[str, Any]) -> bool:
+    return any(
+        r["from_table"] == rel["from_table"] and r["from_column"] == rel["from_column"] and
+        r["to_table"] == rel["to_table"] and r["to_column"] == rel["to_column"]
+        for r in schema["relationships"]
+    )
+
+def apply_operations(schema: Dict[str, Any], operations: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    按顺序在schema上执行一组修改（字段同各单个修改接口，op为操作名），返回修改后的schema和
+    {原表名: 最终表名} 的重命名映射，映射中可以包含链式重命名和互换表名。与单个修改不同，修改或删除
+    不存在的实体或关系、添加已存在的表、重命名到本批删除的表名会抛出OperationError，调用方据此放弃整批修改。
+    """
+    # 当前表名 -> 批量修改前的表名；本批新增的表不在其中
+    original_names = {ent["table_name"]: ent["table_name"] for ent in schema["entities"]}
+    # 本批删除的原有表名
+    deleted_names = set()
+    for index, operation in enumerate(operations):
+        op = operation["op"]
+        table_names = {ent["table_name"] for ent in schema["entities"]}
+        if op in ("modify_entity", "delete_entity") and operation["entity_name"] not in table_names:
+            raise OperationError(index, f"实体 {operation['entity_name']} 不存在")
+        if op == "modify_entity":
+            new_table_name = operation.get("new_table_name")
+            if new_table_name and new_table_name != operation["entity_name"] and new_table_name in table_names:
+                raise OperationError(index, f"表 {new_table_name} 已存在")
+            if new_table_name in deleted_names:
+                # 迁移先重命名再删除表，重命名到本批删除的表名会与尚未删除的旧表冲突
+                raise OperationError(index, f"表 {new_table_name} 在本批修改中被删除，不能作为新表名")
+            schema = modify_entity(schema, operation["entity_name"], operation.get("new_attributes"), new_table_name)
+            if new_table_name and new_table_name != operation["entity_name"]:
+                original = original_names.pop(operation["entity_name"], None)
+                if original is not None:
+                    original_names[new_table_name] = original
+        elif op == "add_entity":
+            if operation["entity"]["table_name"] in table_names:
+                raise OperationError(index, f"表 {operation['entity']['table_name']} 已存在")
+            schema = add_entity(schema, operation["entity"])
+        elif op == "delete_entity":
+            schema = delete_entity(schema, operation["entity_name"])
+            original = original_names.pop(operation["entity_name"], None)
+            if original is not None:
+                deleted_names.add(original)
+        elif op in ("modify_relationship", "delete_relationship"):
+            rel = operation["old_relationship"] if op == "modify_relationship" else operation["relationship"]
+            if not _find_relationship(schema, rel):
+                raise OperationError(index, f"关系 {rel['from_table']}.{rel['from_column']} -> "
+                                            f"{rel['to_table']}.{rel['to_column']} 不存在")
+            if op == "modify_relationship":
+                schema = modify_relationship(schema, rel, operation["new_relationship"])
+            else:
+                schema = delete_relationship(schema, rel)
+        elif op == "add_relationship":
+            schema = add_relationship(schema, operation["relationship"])
+        else:
+            raise OperationError(index, f"不支持的操作: {op}")
+    renamed_tables = {original: name for name, original in original_names.items() if original != name}
+    return schema, renamed_tables
@@ -0,0 +1,199 @@
+from typing import Dict, List, Any, Optional, Tuple
+
+from type_optimizer import base_type, estimate_column_bytes, STRING_TYPES
+
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+# 大对象类型：无法建立普通索引，过滤时只能用前缀索引或全表扫描
+LOB_TYPES = ("TINYTEXT", "TEXT", "MEDIUMTEXT", "LONGTEXT", "TINYBLOB", "BLOB", "MEDIUMBLOB", "LONGBLOB", "JSON")
+# 通常用于等值过滤或查找的列名（完整匹配或"_"后缀匹配）
+FILTER_LIKE_NAMES = ("status", "state", "type", "category", "level", "code", "email", "username", "phone",
+                     "name", "title", "slug", "sku", "tag", "key", "uuid", "id")
+# 中间表允许携带的附加列
+JUNCTION_EXTRA_COLUMN_SUFFIXES = ("_at", "_date", "_time")
+# 级联删除：未给出行数估计时每个父行平均关联的子行数
+DEFAULT_CASCADE_FANOUT = 10
+CASCADE_DEPTH_WARNING = 3
+CASCADE_FANOUT_WARNING = 1000
+CASCADE_FANOUT_ERROR = 100000
+# InnoDB级联操作的最大嵌套深度，超过时删除失败
+MAX_CASCADE_DEPTH = 15
+# 行宽：超过半页时变长列被移到溢出页；超过65535字节时无法建表
+HALF_PAGE_ROW_BYTES = 8126
+MAX_ROW_BYTES = 65535
+# 大对象列内容存放在行外，计入65535上限的只有长度前缀和指针（9~12字节）
+LOB_ROW_LIMIT_BYTES = {
+    "TINYTEXT": 9, "TEXT": 10, "MEDIUMTEXT": 11, "LONGTEXT": 12,
+    "TINYBLOB": 9, "BLOB": 10, "MEDIUMBLOB": 11, "LONGBLOB": 12, "JSON": 12,
+}
+WIDE_TABLE_COLUMNS = 50
+
+def _finding(severity: str, rule: str, table: Optional[str], column: Optional[str], message: str) -> Dict[str, Any]:
+    return {"severity": severity, "rule": rule, "table": table, "column": column, "message": message}
+
+def _is_filter_like(name: str) -> bool:
+    lowered = name.lower()
+    return any(lowered == key or lowered.endswith("_" + key) for key in FILTER_LIKE_NAMES)
+
+def _format_rows(rows: float) -> str:
+    return str(int(rows)) if rows < 1e9 else f"{rows:.2e}"
+
+def _cascade_stats(children: Dict[str, List[Dict[str, Any]]], tables: List[str],
+                   row_estimates: Dict[str, int]) -> Tuple[Dict[str, Dict[str, Any]], List[List[str]]]:
+    """
+    在ON DELETE CASCADE构成的图上，为每张表计算删除一行时的级联深度和预计删除的行数。
+    使用迭代后序遍历（不受递归深度限制），遇到回边时记录级联环。
+    """
+    def fanout(parent: str, child: str) -> float:
+        if parent in row_estimates and child in row_estimates and row_estimates[parent] > 0:
+            return row_estimates[child] / row_estimates[parent]
+        return DEFAULT_CASCADE_FANOUT
+
+    stats: Dict[str, Dict[str, Any]] = {}
+    cycles = []
+    state: Dict[str, int] = {}  # 1: 正在访问, 2: 已完成
+    for root in tables:
+        if root in state:
+            continue
+        path = [root]
+        stack = [(root, iter(children.get(root, [])))]
+        state[root] = 1
+        while stack:
+            table, edges = stack[-1]
+            advanced = False
+            for rel in edges:
+                child = rel["from_table"]
+                if child == table:
+                    # 自引用的级联按层级递归删除，深度无法静态确定
+                    continue
+                if state.get(child) == 1:
+                    cycles.append(path[path.index(child):] + [child])
+                    continue
+                if child not in state:
+                    state[child] = 1
+                    path.append(child)
+                    stack.append((child, iter(children.get(child, []))))
+                    advanced = True
+                    break
+            if advanced:
+                continue
+            depth, rows, deepest = 0, 0.0, [table]
+            for rel in children.get(table, []):
+                child = rel["from_table"]
+                if child == table or child not in stats:
+                    continue
+                rows += fanout(table, child) * (1 + stats[child]["rows"])
+                if stats[child]["depth"] + 1 > depth:
+                    depth = stats[child]["depth"] + 1
+                    deepest = [table] + stats[child]["chain"]
+            stats[table] = {"depth": depth, "rows": rows, "chain": deepest}
+            state[table] = 2
+            stack.pop()
+            path.pop()
+    return stats, cycles
+
+def lint_schema(schema: Dict[str, Any], row_estimates: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    检查schema中在数据量增大后影响性能的模式，返回按严重程度排序的问题列表：
+    中间表使用代理主键、需要过滤的列使用TEXT、随机字符串主键、过深或扇出过大的级联删除链、行过宽。
+    先为实体和关系建立一次索引，每条规则都基于哈希查找，整体与schema规模成线性关系。
+    """
+    row_estimates = row_estimates or {}
+    findings = []
+    entities = {entity["table_name"]: entity for entity in schema.get("entities", [])}
+    outgoing: Dict[str, List[Dict[str, Any]]] = {}
+    cascade_children: Dict[str, List[Dict[str, Any]]] = {}
+    for rel in schema.get("relationships", []):
+        outgoing.setdefault(rel["from_table"], []).append(rel)
+        if (rel.get("on_delete") or "").upper() == "CASCADE" and rel["to_table"] in entities:
+            cascade_children.setdefault(rel["to_table"], []).append(rel)
+
+    for name, entity in entities.items():
+        attributes = entity.get("attributes", [])
+        primary_key = [attr["name"] for attr in attributes if attr.get("is_primary_key")]
+        fk_columns = {rel["from_column"] for rel in outgoing.get(name, [])}
+
+        # 中间表使用代理主键
+        rels = outgoing.get(name, [])
+        if len(rels) == 2 and rels[0]["to_table"] != rels[1]["to_table"] and len(primary_key) == 1 \
+                and primary_key[0] not in fk_columns:
+            extra = [attr["name"] for attr in attributes
+                     if attr["name"] not in fk_columns and attr["name"] not in primary_key]
+            if all(extra_name.endswith(JUNCTION_EXTRA_COLUMN_SUFFIXES) for extra_name in extra):
+                pair = ", ".join(rel["from_column"] for rel in rels)
+                findings.append(_finding(
+                    "warning", "junction_surrogate_key", name, primary_key[0],
+                    f"中间表 {name} 以代理主键 {primary_key[0]} 作为主键，({pair}) 的唯一性只能依赖额外的唯一索引；"
+                    f"建议改用 ({pair}) 组合主键，省去一个索引并让关联查询直接走聚簇索引"
+                ))
+
+        # row_bytes按大对象的典型内容估算，用于半页检查；limit_bytes按MySQL计算行宽上限的方式统计
+        row_bytes = limit_bytes = 0
+        for attr in attributes:
+            data_type = attr.get("data_type", "")
+            base = base_type(data_type)
+            column_bytes = estimate_column_bytes(data_type)
+            row_bytes += column_bytes
+            limit_bytes += LOB_ROW_LIMIT_BYTES.get(base, column_bytes)
+
+            # 需要过滤的列使用大对象类型
+            if base in LOB_TYPES and (attr["name"] in fk_columns or _is_filter_like(attr["name"])):
+                severity = "error" if attr["name"] in fk_columns or attr.get("is_primary_key") else "warning"
+                findings.append(_finding(
+                    severity, "lob_filter_column", name, attr["name"],
+                    f"列 {attr['name']} 通常用于过滤或关联，但类型为 {data_type}，无法建立完整索引，"
+                    f"查询只能全表扫描；建议改为长度合适的 VARCHAR"
+                ))
+
+            # 字符串主键
+            if attr.get("is_primary_key") and base in STRING_TYPES and len(primary_key) == 1:
+                findings.append(_finding(
+                    "warning", "string_primary_key", name, attr["name"],
+                    f"主键 {attr['name']} 为字符串类型 {data_type}；UUID等随机值插入会造成聚簇索引页分裂，"
+                    f"且所有二级索引都会携带该主键；建议使用自增整数主键，字符串作为唯一键"
+                ))
+
+        if not primary_key:
+            findings.append(_finding(
+                "error", "missing_primary_key", name, None,
+                f"表 {name} 没有主键，InnoDB会使用隐藏的行ID，复制和按行更新都会变慢"
+            ))
+
+        # 行宽
+        if limit_bytes > MAX_ROW_BYTES:
+            findings.append(_finding(
+                "error", "wide_row", name, None,
+                f"表 {name} 最大行宽约 {limit_bytes} 字节，超过MySQL上限 {MAX_ROW_BYTES}，建表会失败"
+            ))
+        elif row_bytes > HALF_PAGE_ROW_BYTES:
+            findings.append(_finding(
+                "warning", "wide_row", name, None,
+                f"表 {name} 最大行宽约 {row_bytes} 字节，超过半页 ({HALF_PAGE_ROW_BYTES})，长列会被移到溢出页，"
+                f"每页容纳的行数减少；建议把大字段拆分到单独的表"
+            ))
+        if len(attributes) > WIDE_TABLE_COLUMNS:
+            findings.append(_finding(
+                "info", "wide_table", name, None,
+                f"表 {name} 有 {len(attributes)} 列，考虑按访问频率纵向拆分"
+            ))
+
+    # 级联删除链
+    stats, cycles = _cascade_stats(cascade_children, list(entities), row_estimates)
+    for name, stat in stats.items():
+        if stat["depth"] < CASCADE_DEPTH_WARNING and stat["rows"] < CASCADE_FANOUT_WARNING:
+            continue
+        severity = "error" if stat["rows"] >= CASCADE_FANOUT_ERROR or stat["depth"] > MAX_CASCADE_DEPTH else "warning"
+        findings.append(_finding(
+            severity, "cascade_chain", name, None,
+            f"删除 {name} 的一行会沿 ON DELETE CASCADE 级联 {stat['depth']} 层（{' -> '.join(stat['chain'])}），"
+            f"预计删除约 {_format_rows(stat['rows'])} 行并在同一事务中持有相应的行锁；"
+            f"建议在深层使用 RESTRICT 或软删除，由后台任务分批清理"
+        ))
+    for cycle in cycles:
+        findings.append(_finding(
+            "error", "cascade_cycle", cycle[0], None,
+            f"ON DELETE CASCADE 构成环 {' -> '.join(cycle)}，删除环上任一行都可能级联删除整个环上的关联数据，"
+            f"级联嵌套超过 {MAX_CASCADE_DEPTH} 层时删除会失败"
+        ))
+
+    findings.sort(key=lambda finding: (SEVERITY_ORDER[finding["severity"]], finding["rule"], finding["table"] or ""))
+    return findings
@@ -0,0 +1,167 @@
+"""
+按内容寻址的schema存储。
+
+交互记录不再内联保存schema，而是引用schema_blobs中按规范JSON（键排序、无多余空白）的SHA-256寻址的一行；
+缓存命中、重复演示和未修改的会话产生的相同schema只保存一份。修改记录中的快照（见edit_log）同样引用这些行。
+引用计数在写入时维护，垃圾回收按交互记录和修改记录的实际引用重新计算计数并删除不再被引用的行。
+
+用法（在仓库根目录执行）：
+    python schema_store.py stats
+    python schema_store.py migrate   # 把旧记录中内联的schema移入schema_blobs
+    python schema_store.py gc
+"""
+import argparse
+import hashlib
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func, update, delete, select, case, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SchemaBlob, InteractionRecord, SessionEdit
+
+# 垃圾回收只删除创建时间早于该间隔的行，避免删除并发事务刚写入、尚未提交引用的schema
+GC_GRACE_PERIOD = timedelta(hours=1)
+MIGRATE_BATCH_SIZE = 500
+
+def canonical_json(schema: Dict[str, Any]) -> str:
+    return json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def _increment(db: Session, digest: str, delta: int) -> int:
+    result = db.execute(
+        update(SchemaBlob).where(SchemaBlob.hash == digest)
+        .values(ref_count=SchemaBlob.ref_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def acquire_schema(db: Session, schema: Dict[str, Any]) -> str:
+    """增加schema的引用计数并返回其哈希；内容尚未保存时插入新行"""
+    payload = canonical_json(schema).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    if _increment(db, digest, 1):
+        return digest
+    try:
+        with db.begin_nested():
+            db.add(SchemaBlob(hash=digest, content=schema, size_bytes=len(payload), ref_count=1))
+    except IntegrityError:
+        # 并发请求已插入相同内容
+        _increment(db, digest, 1)
+    return digest
+
+def release_schema(db: Session, digest: Optional[str]):
+    """减少引用计数；计数归零的行由垃圾回收删除"""
+    if digest:
+        _increment(db, digest, -1)
+
+def attach_schema(db: Session, record: InteractionRecord, schema: Dict[str, Any]):
+    """让交互记录引用schema，并释放它之前引用的schema（或清空内联保存的内容）"""
+    digest = acquire_schema(db, schema)
+    release_schema(db, record.schema_hash)
+    record.schema_hash = digest
+    record.schema_result = None
+    record.table_count = len(schema["entities"])
+    if sa_inspect(record).persistent:
+        # 已加载的schema_blob仍指向旧内容
+        db.expire(record, ["schema_blob"])
+
+def migrate_inline_schemas(db: Session, batch_size: int = MIGRATE_BATCH_SIZE) -> int:
+    """把旧记录中内联保存的schema移入schema_blobs，按批提交，返回迁移的记录数"""
+    migrated = 0
+    while True:
+        records = db.query(InteractionRecord).filter(
+            InteractionRecord.schema_hash.is_(None),
+            InteractionRecord.schema_result.isnot(None)
+        ).limit(batch_size).all()
+        if not records:
+            return migrated
+        for record in records:
+            attach_schema(db, record, record.schema_result)
+        db.commit()
+        migrated += len(records)
+
+def collect_garbage(db: Session, grace_period: timedelta = GC_GRACE_PERIOD) -> Dict[str, int]:
+    """按交互记录和修改记录快照的实际引用重新计算引用计数，删除超过宽限期仍未被引用的schema"""
+    record_references = select(func.count(InteractionRecord.id)).where(
+        InteractionRecord.schema_hash == SchemaBlob.hash
+    ).scalar_subquery()
+    snapshot_references = select(func.count(SessionEdit.id)).where(
+        SessionEdit.snapshot_hash == SchemaBlob.hash
+    ).scalar_subquery()
+    recounted = db.execute(
+        update(SchemaBlob).values(ref_count=record_references + snapshot_references)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    cutoff = datetime.utcnow() - grace_period
+    deleted = db.execute(
+        delete(SchemaBlob).where(SchemaBlob.ref_count <= 0, SchemaBlob.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return {"recounted": recounted, "deleted": deleted}
+
+def storage_stats(db: Session) -> Dict[str, Any]:
+    """
+    去重效果：引用schema_blobs的记录数、不同schema数、逻辑大小（每条记录和每个编辑日志快照各存一份时）
+    和实际保存的大小，快照部分单独列出。duplication_rate为重复记录占引用记录的比例。
+    """
+    referencing, distinct, record_bytes = db.query(
+        func.count(InteractionRecord.id), func.count(func.distinct(InteractionRecord.schema_hash)),
+        func.coalesce(func.sum(SchemaBlob.size_bytes), 0)
+    ).join(SchemaBlob, InteractionRecord.schema_hash == SchemaBlob.hash).one()
+    # 快照同样引用schema_blobs，只被快照引用的schema也计入stored_bytes，逻辑大小需要包括快照
+    snapshots, snapshot_bytes = db.query(
+        func.count(SessionEdit.id), func.coalesce(func.sum(SchemaBlob.size_bytes), 0)
+    ).join(SchemaBlob, SessionEdit.snapshot_hash == SchemaBlob.hash).one()
+    logical_bytes = int(record_bytes) + int(snapshot_bytes)
+    unreferenced_flag = case((SchemaBlob.ref_count <= 0, 1), else_=0)
+    blobs, unreferenced, total_bytes, unreferenced_bytes = db.query(
+        func.count(SchemaBlob.hash),
+        func.coalesce(func.sum(unreferenced_flag), 0),
+        func.coalesce(func.sum(SchemaBlob.size_bytes), 0),
+        func.coalesce(func.sum(unreferenced_flag * SchemaBlob.size_bytes), 0)
+    ).one()
+    inline = db.query(func.count(InteractionRecord.id)).filter(
+        InteractionRecord.schema_hash.is_(None)
+    ).scalar()
+    # 等待垃圾回收的schema单独统计，不计入去重后的大小
+    stored_bytes = int(total_bytes) - int(unreferenced_bytes)
+    return {
+        "records": referencing,
+        "inline_records": inline,
+        "snapshots": snapshots,
+        "schemas": blobs,
+        "unreferenced_schemas": unreferenced,
+        "logical_bytes": logical_bytes,
+        "snapshot_logical_bytes": int(snapshot_bytes),
+        "stored_bytes": stored_bytes,
+        "unreferenced_bytes": int(unreferenced_bytes),
+        "bytes_saved": logical_bytes - stored_bytes,
+        "duplication_rate": round(1 - distinct / referencing, 4) if referencing else 0.0
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按内容寻址的schema存储维护")
+    parser.add_argument("command", choices=["stats", "migrate", "gc"])
+    parser.add_argument("--batch-size", type=int, default=MIGRATE_BATCH_SIZE, help="migrate每批迁移的记录数")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_PERIOD.total_seconds() / 3600,
+                        help="gc只删除创建时间早于该小时数的schema")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "migrate":
+            print(f"已迁移 {migrate_inline_schemas(db, args.batch_size)} 条记录", file=sys.stderr)
+        elif args.command == "gc":
+            result = collect_garbage(db, timedelta(hours=args.grace_hours))
+            print(f"重新计数 {result['recounted']} 个schema，删除 {result['deleted']} 个", file=sys.stderr)
+        print(json.dumps(storage_stats(db), indent=2, ensure_ascii=False))
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
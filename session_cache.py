@@ -0,0 +1,358 @@
+"""
+会话工作集缓存。
+
+编辑接口每次都要读取会话的schema（一次大JSON的读取和解压）并重新编译上一版本来计算迁移语句，
+再把新schema写回数据库。缓存在进程内按会话保存当前的schema和编译出的表结构，按LRU淘汰，
+连续的修改不再反复读库和重复编译。写入方式由SESSION_CACHE_MODE决定：
+
+- off：不缓存，每次修改立即写库（默认）；
+- write_through：读取走缓存，每次修改仍在响应前写库提交；
+- write_behind：修改先记在缓存中，会话在SESSION_CACHE_FLUSH_DELAY秒内没有新的修改
+  （或最早未写入的修改超过SESSION_CACHE_MAX_LAG秒）、被淘汰或服务关闭时，把积累的修改合并为一个事务写库。
+  进程崩溃会丢失尚未写入的修改。
+
+缓存只在本进程内有效：启用缓存时应只运行一个worker，或让同一会话的请求固定路由到同一个worker。
+读取会话完整内容、修改历史和撤销重做之前会先写入该会话尚未写入的修改。
+
+并发修改按修订号（interaction_records.revision）做乐观检查：修改基于读取时的修订号计算，写入时以
+UPDATE ... WHERE revision = 读取时的修订号 递增修订号，影响行数为0说明会话已被其他请求修改，整个事务放弃并抛出
+EditConflictError，不加任何锁。write_behind模式下缓存中的修订号随每个修改递增，写库时一次加上合并的修改数。
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import AsyncSessionLocal, InteractionRecord, SessionEdit
+from artifact_cache import stored_artifacts, record_options, content_hash
+from schema_store import attach_schema
+from edit_log import append_edit
+from record_queue import record_queue
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "write_through", "write_behind")
+CACHE_MODE = os.getenv("SESSION_CACHE_MODE", "off")
+if CACHE_MODE not in CACHE_MODES:
+    raise ValueError(f"SESSION_CACHE_MODE 只能为 {', '.join(CACHE_MODES)}")
+CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+FLUSH_DELAY = float(os.getenv("SESSION_CACHE_FLUSH_DELAY", "2"))
+MAX_FLUSH_LAG = float(os.getenv("SESSION_CACHE_MAX_LAG", "10"))
+FLUSH_INTERVAL = 0.5
+
+class EditConflictError(Exception):
+    """会话在读取之后已被其他请求修改；current_revision为会话当前的修订号"""
+
+    def __init__(self, session_id: str, current_revision: Optional[int]):
+        super().__init__(f"会话 {session_id} 已被修改，当前修订号为 {current_revision}")
+        self.session_id = session_id
+        self.current_revision = current_revision
+
+class PendingEdit:
+    """一次尚未写库的修改；target_version不为空时为撤销或重做，只移动会话所在的版本"""
+
+    def __init__(self, operation: str, schema: Dict[str, Any], er_model: Dict[str, Any], ddl: str,
+                 options: Dict[str, Any], target_version: Optional[int] = None):
+        self.operation = operation
+        self.schema = schema
+        self.er_model = er_model
+        self.ddl = ddl
+        self.options = options
+        self.target_version = target_version
+
+def persist_edits(db: Session, session_id: str, user_id: int, edits: List[PendingEdit],
+                  base_revision: int) -> Tuple[Optional[int], int]:
+    """
+    按顺序把修改写入交互记录和修改记录，返回会话最终所在的版本和新的修订号；由调用方提交。
+    多个修改合并写入时只有最后一个的schema、ER模型和DDL写入交互记录，修改记录仍逐个追加。
+    base_revision为这些修改所基于的修订号，会话的修订号已不是它时抛出EditConflictError。
+    """
+    record = db.execute(select(InteractionRecord).where(
+        InteractionRecord.session_id == session_id,
+        InteractionRecord.user_id == user_id
+    )).scalars().first()
+    if record is None:
+        raise LookupError(f"会话 {session_id} 不存在")
+    # 先执行条件更新：行锁使并发写入同一会话的事务在此排队，后到者看到已变化的修订号而失败
+    revision = base_revision + len(edits)
+    result = db.execute(
+        update(InteractionRecord).where(
+            InteractionRecord.id == record.id,
+            func.coalesce(InteractionRecord.revision, 0) == base_revision
+        ).values(revision=revision).execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise EditConflictError(session_id, None)
+    set_committed_value(record, "revision", revision)
+    previous_schema = record.schema
+    for edit in edits:
+        if edit.target_version is None:
+            append_edit(db, record, edit.operation, previous_schema, edit.schema, edit.options)
+            # 下一个修改按版本号查找父版本
+            db.flush()
+        else:
+            record.current_version = edit.target_version
+        previous_schema = edit.schema
+    last = edits[-1]
+    for column, value in stored_artifacts(last.schema, last.er_model, last.ddl, last.options).items():
+        setattr(record, column, value)
+    attach_schema(db, record, last.schema)
+    return record.current_version, revision
+
+def read_revision(db: Session, session_id: str) -> Optional[int]:
+    """会话当前的修订号；会话不存在时返回None"""
+    return db.execute(
+        select(func.coalesce(InteractionRecord.revision, 0)).where(InteractionRecord.session_id == session_id)
+    ).scalar()
+
+class SessionEntry:
+    def __init__(self, session_id: str, user_id: int, schema: Dict[str, Any], options: Optional[Dict[str, Any]],
+                 current_version: Optional[int], latest_version: Optional[int], revision: int):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.schema = schema
+        # 当前schema使用的编译参数，计算迁移语句时按它编译上一版本
+        self.options = options
+        self.current_version = current_version
+        self.latest_version = latest_version
+        # 包括尚未写库的修改在内的修订号
+        self.revision = revision
+        # 当前schema按options编译出的表结构，计算迁移语句时不必重新编译
+        self.tables_key: Optional[str] = None
+        self.tables: Optional[list] = None
+        self.pending: List[PendingEdit] = []
+        self.dirty_since: Optional[float] = None
+        self.last_edit: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+class SessionCache:
+    """按会话保存当前schema的LRU缓存；所有操作都在事件循环线程中执行"""
+
+    def __init__(self, mode: str = CACHE_MODE, maxsize: int = CACHE_SIZE):
+        self.mode = mode
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._flusher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_edits = 0
+        self.flush_errors = 0
+        self.flush_conflicts = 0
+        self.last_flush_lag = None
+        self.max_flush_lag = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def get(self, session_id: str, user_id: int) -> Optional[SessionEntry]:
+        entry = self._entries.get(session_id)
+        if entry is None or entry.user_id != user_id:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return entry
+
+    async def load(self, db, record: InteractionRecord) -> SessionEntry:
+        """缓存从数据库读取的会话；write_behind模式下同时读取最新的版本号，用于给尚未写库的修改编号"""
+        latest = None
+        if self.mode == "write_behind" and record.current_version is not None:
+            latest = await db.scalar(
+                select(func.max(SessionEdit.version)).where(SessionEdit.session_id == record.session_id)
+            )
+        entry = SessionEntry(record.session_id, record.user_id, record.schema, record_options(record),
+                             record.current_version, latest, record.revision or 0)
+        await self._insert(entry)
+        return entry
+
+    async def remember(self, session_id: str, user_id: int, schema: Dict[str, Any], options: Dict[str, Any]):
+        """缓存新生成的会话"""
+        if self.enabled:
+            await self._insert(SessionEntry(session_id, user_id, schema, options, None, None, 0))
+
+    async def _insert(self, entry: SessionEntry):
+        self._entries[entry.session_id] = entry
+        self._entries.move_to_end(entry.session_id)
+        # 按LRU顺序淘汰；有尚未写库修改的会话先写入，写入成功后才移出缓存。写入失败时会话留在缓存中
+        # （缓存暂时超出容量），由后台写入稍后重试，不影响触发淘汰的请求
+        for session_id in list(self._entries):
+            if len(self._entries) <= self.maxsize:
+                break
+            candidate = self._entries.get(session_id)
+            if candidate is None or candidate is entry:
+                continue
+            if candidate.pending:
+                try:
+                    await self._flush_entry(candidate)
+                except Exception as e:
+                    logger.error(f"淘汰会话 {session_id} 前写入修改失败，保留在缓存中稍后重试: {str(e)}")
+                    continue
+                if candidate.pending:
+                    # 写入期间又有新的修改
+                    continue
+            if self._entries.get(session_id) is candidate:
+                del self._entries[session_id]
+                self.evictions += 1
+
+    def compiled_tables(self, entry: SessionEntry) -> Optional[list]:
+        if entry.tables_key == content_hash(entry.schema, entry.options):
+            return entry.tables
+        return None
+
+    def remember_tables(self, entry: SessionEntry, options: Dict[str, Any], tables: list):
+        entry.tables_key = content_hash(entry.schema, options)
+        entry.tables = tables
+
+    async def save(self, db, session_id: str, user_id: int, edit: PendingEdit, base_revision: int,
+                   tables: Optional[list] = None) -> Tuple[Optional[int], int]:
+        """
+        保存一次基于修订号base_revision的修改，返回会话的新版本和新修订号；会话已被修改时抛出EditConflictError。
+        write_behind模式下普通修改只记入缓存，版本号和修订号按缓存中的值推算；
+        其他模式以及撤销、重做先写入之前积累的修改，再在db中写入并提交。
+        """
+        entry = self._entries.get(session_id) if self.enabled else None
+        if entry is not None and self.mode == "write_behind" and edit.target_version is None:
+            if entry.revision != base_revision:
+                raise EditConflictError(session_id, entry.revision)
+            if entry.current_version is None:
+                version = 1
+            else:
+                version = entry.latest_version + 1
+            entry.pending.append(edit)
+            now = time.monotonic()
+            entry.dirty_since = entry.dirty_since or now
+            entry.last_edit = now
+            self._apply(entry, edit, version, base_revision + 1, tables)
+            return version, entry.revision
+
+        if entry is not None:
+            await self.flush(session_id)
+        await record_queue.flush_session(session_id)
+        try:
+            version, revision = await db.run_sync(persist_edits, session_id, user_id, [edit], base_revision)
+        except EditConflictError:
+            # 缓存中的内容可能已过期，下次读取时重新读库
+            await db.rollback()
+            self._entries.pop(session_id, None)
+            raise EditConflictError(session_id, await db.run_sync(read_revision, session_id))
+        await db.commit()
+        if entry is not None:
+            self._apply(entry, edit, version, revision, tables)
+        return version, revision
+
+    def _apply(self, entry: SessionEntry, edit: PendingEdit, version: Optional[int], revision: int,
+               tables: Optional[list]):
+        entry.schema = edit.schema
+        entry.options = edit.options
+        entry.current_version = version
+        entry.revision = revision
+        entry.latest_version = version if entry.latest_version is None else max(entry.latest_version, version)
+        if tables is not None:
+            self.remember_tables(entry, edit.options, tables)
+        else:
+            entry.tables_key = entry.tables = None
+
+    async def flush(self, session_id: str):
+        """写入会话尚未写库的修改"""
+        entry = self._entries.get(session_id)
+        if entry is not None and entry.pending:
+            await self._flush_entry(entry)
+
+    async def flush_user(self, user_id: int):
+        for entry in [entry for entry in self._entries.values() if entry.user_id == user_id and entry.pending]:
+            await self._flush_entry(entry)
+
+    async def flush_all(self):
+        for entry in [entry for entry in self._entries.values() if entry.pending]:
+            await self._flush_entry(entry)
+
+    async def _flush_entry(self, entry: SessionEntry):
+        async with entry.lock:
+            if not entry.pending:
+                return
+            edits, entry.pending = entry.pending, []
+            dirty_since, entry.dirty_since = entry.dirty_since, None
+            base_revision = entry.revision - len(edits)
+            try:
+                # 新生成的会话可能还在交互记录的写入队列中
+                await record_queue.flush_session(entry.session_id)
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(persist_edits, entry.session_id, entry.user_id, edits, base_revision)
+                    await db.commit()
+            except EditConflictError:
+                # 会话已被本进程之外的写入修改（启用缓存时不应出现），这些修改无法再应用
+                self._entries.pop(entry.session_id, None)
+                self.flush_conflicts += len(edits)
+                logger.error(f"会话 {entry.session_id} 已被其他进程修改，丢弃 {len(edits)} 个尚未写库的修改")
+                return
+            except Exception:
+                # 保留修改等待下次写入，期间新增的修改排在后面
+                entry.pending = edits + entry.pending
+                entry.dirty_since = dirty_since
+                self.flush_errors += 1
+                raise
+            lag = time.monotonic() - dirty_since
+            self.flushes += 1
+            self.flushed_edits += len(edits)
+            self.last_flush_lag = lag
+            self.max_flush_lag = max(self.max_flush_lag, lag)
+
+    async def _flush_due(self):
+        now = time.monotonic()
+        for entry in list(self._entries.values()):
+            if not entry.pending:
+                continue
+            if now - entry.last_edit >= FLUSH_DELAY or now - entry.dirty_since >= MAX_FLUSH_LAG:
+                try:
+                    await self._flush_entry(entry)
+                except Exception as e:
+                    logger.error(f"会话 {entry.session_id} 的修改写入失败，稍后重试: {str(e)}")
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self._flush_due()
+
+    def start(self):
+        if self.mode == "write_behind" and self._flusher is None:
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def close(self):
+        """停止后台写入并写入所有尚未写库的修改"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush_all()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        pending = [entry for entry in self._entries.values() if entry.pending]
+        oldest = max((now - entry.dirty_since for entry in pending), default=None)
+        return {
+            "mode": self.mode,
+            "size": len(self._entries),
+            "capacity": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pending_sessions": len(pending),
+            "pending_edits": sum(len(entry.pending) for entry in pending),
+            "flushes": self.flushes,
+            "flushed_edits": self.flushed_edits,
+            "flush_errors": self.flush_errors,
+            "flush_conflicts": self.flush_conflicts,
+            "oldest_pending_ms": round(oldest * 1000, 1) if oldest is not None else None,
+            "last_flush_lag_ms": round(self.last_flush_lag * 1000, 1) if self.last_flush_lag is not None else None,
+            "max_flush_lag_ms": round(self.max_flush_lag * 1000, 1)
+        }
+
+session_cache = SessionCache()
@@ -0,0 +1,234 @@
+import re
+from typing import Dict, List, Any, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from schema_generator import Table
+
+# 定长类型占用字节数（InnoDB）
+FIXED_TYPE_BYTES = {
+    "TINYINT": 1, "BOOL": 1, "BOOLEAN": 1, "SMALLINT": 2, "MEDIUMINT": 3,
+    "INT": 4, "INTEGER": 4, "BIGINT": 8, "FLOAT": 4, "DOUBLE": 8, "REAL": 8,
+    "DATE": 3, "TIME": 3, "YEAR": 1, "DATETIME": 5, "TIMESTAMP": 4,
+}
+# 大对象类型按典型内容估算的平均字节数
+LOB_ESTIMATED_BYTES = {
+    "TINYTEXT": 128, "TEXT": 1024, "MEDIUMTEXT": 4096, "LONGTEXT": 16384,
+    "TINYBLOB": 128, "BLOB": 1024, "MEDIUMBLOB": 4096, "LONGBLOB": 16384, "JSON": 1024,
+}
+# 字符集每字符最大字节数，默认utf8mb4
+CHARSET_BYTES = {"ascii": 1, "latin1": 1, "utf8": 3, "utf8mb3": 3, "utf8mb4": 4}
+DEFAULT_CHARSET_BYTES = 4
+# DECIMAL每组剩余位数占用的字节
+DECIMAL_LEFTOVER_BYTES = [0, 1, 1, 2, 2, 3, 3, 4, 4, 4]
+# 无法识别的类型按8字节估算
+UNKNOWN_TYPE_BYTES = 8
+
+# 整数类型的 (有符号, 无符号) 最大值
+INTEGER_LIMITS = {
+    "TINYINT": (127, 255), "SMALLINT": (32767, 65535), "MEDIUMINT": (8388607, 16777215),
+    "INT": (2 ** 31 - 1, 2 ** 32 - 1), "INTEGER": (2 ** 31 - 1, 2 ** 32 - 1),
+    "BIGINT": (2 ** 63 - 1, 2 ** 64 - 1),
+}
+# INT UNSIGNED主键预留一半取值空间作为增长余量
+INT_PK_ROW_LIMIT = 2 ** 31
+
+# 状态、等级等小范围整数列（按完整列名匹配）
+SMALL_INT_COLUMNS = {
+    "status": "TINYINT", "state": "TINYINT", "type": "TINYINT",
+    "level": "TINYINT", "gender": "TINYINT", "age": "TINYINT",
+    "rating": "TINYINT", "stars": "TINYINT",
+    "priority": "SMALLINT", "sort_order": "SMALLINT", "position": "SMALLINT",
+    "score": "SMALLINT", "year": "SMALLINT",
+}
+# 取值为枚举编码的列，不会出现负数，可以使用UNSIGNED；其余列只有原类型已是UNSIGNED时才使用
+ENUM_CODE_COLUMNS = {"status", "state", "type", "gender"}
+BOOLEAN_PREFIXES = ("is_", "has_", "can_")
+# 定长编码列，使用ascii字符集
+FIXED_CODE_COLUMNS = {
+    "country_code": "CHAR(2) CHARACTER SET ascii", "currency": "CHAR(3) CHARACTER SET ascii",
+    "currency_code": "CHAR(3) CHARACTER SET ascii", "uuid": "CHAR(36) CHARACTER SET ascii",
+    "md5": "CHAR(32) CHARACTER SET ascii", "sha1": "CHAR(40) CHARACTER SET ascii",
+    "sha256": "CHAR(64) CHARACTER SET ascii", "id_card": "CHAR(18) CHARACTER SET ascii",
+}
+# 有明确长度上限的字符串列（按完整列名匹配）
+BOUNDED_STRING_COLUMNS = {
+    "email": 254, "phone": 20, "mobile": 20, "telephone": 20, "username": 64, "nickname": 64,
+    "first_name": 50, "last_name": 50, "name": 100, "title": 200, "slug": 128, "sku": 64,
+    "code": 32, "status": 32, "state": 32, "type": 32, "gender": 16, "zip_code": 16,
+    "postal_code": 16, "ip": 45, "ip_address": 45, "color": 32, "isbn": 17,
+}
+STRING_TYPES = ("CHAR", "VARCHAR", "TINYTEXT", "TEXT", "MEDIUMTEXT", "LONGTEXT")
+INTEGER_TYPES = ("TINYINT", "SMALLINT", "MEDIUMINT", "INT", "INTEGER", "BIGINT")
+
+def base_type(data_type: str) -> str:
+    return data_type.split("(")[0].split()[0].strip().upper() if data_type.strip() else ""
+
+def _type_length(data_type: str) -> Optional[int]:
+    match = re.search(r"\((\d+)", data_type)
+    return int(match.group(1)) if match else None
+
+def _charset_bytes(data_type: str) -> int:
+    match = re.search(r"CHARACTER\s+SET\s+(\w+)", data_type, re.IGNORECASE)
+    if match:
+        return CHARSET_BYTES.get(match.group(1).lower(), DEFAULT_CHARSET_BYTES)
+    return DEFAULT_CHARSET_BYTES
+
+def estimate_column_bytes(data_type: str, fill_ratio: float = 1.0) -> int:
+    """
+    估算一列在InnoDB行内占用的字节数。
+    变长字符串按声明长度乘以fill_ratio估算（1.0即最坏情况），大对象按典型平均大小估算。
+    """
+    base = base_type(data_type)
+    if base in FIXED_TYPE_BYTES:
+        if base == "DATETIME":
+            # 小数秒精度每两位多占1字节
+            fsp = _type_length(data_type) or 0
+            return 5 + (fsp + 1) // 2
+        return FIXED_TYPE_BYTES[base]
+    if base in LOB_ESTIMATED_BYTES:
+        return LOB_ESTIMATED_BYTES[base]
+    if base in ("DECIMAL", "NUMERIC"):
+        match = re.search(r"\((\d+)\s*(?:,\s*(\d+))?\)", data_type)
+        precision = int(match.group(1)) if match else 10
+        scale = int(match.group(2) or 0) if match else 0
+        integer = precision - scale
+        return (integer // 9 * 4 + DECIMAL_LEFTOVER_BYTES[integer % 9]
+                + scale // 9 * 4 + DECIMAL_LEFTOVER_BYTES[scale % 9])
+    if base in ("CHAR", "BINARY"):
+        length = _type_length(data_type) or 1
+        return length * (1 if base == "BINARY" else _charset_bytes(data_type))
+    if base in ("VARCHAR", "VARBINARY"):
+        length = _type_length(data_type) or 255
+        max_bytes = length * (1 if base == "VARBINARY" else _charset_bytes(data_type))
+        prefix = 1 if max_bytes <= 255 else 2
+        return prefix + int(round(max_bytes * fill_ratio))
+    if base == "ENUM":
+        return 1
+    if base == "BIT":
+        return ((_type_length(data_type) or 1) + 7) // 8
+    return UNKNOWN_TYPE_BYTES
+
+def _integer_capacity(data_type: str) -> Optional[int]:
+    limits = INTEGER_LIMITS.get(base_type(data_type))
+    if limits is None:
+        return None
+    return limits[1] if "UNSIGNED" in data_type.upper() else limits[0]
+
+def _primary_key_type(table_name: str, data_type: str, row_estimates: Dict[str, int]) -> Tuple[str, str]:
+    """整数主键：按预估行数选择INT UNSIGNED或BIGINT UNSIGNED。"""
+    rows = row_estimates.get(table_name)
+    if rows is not None:
+        if rows > INT_PK_ROW_LIMIT:
+            return "BIGINT UNSIGNED", f"预估 {rows} 行，超过INT UNSIGNED安全范围"
+        return "INT UNSIGNED", f"预估 {rows} 行，INT UNSIGNED足够"
+    if base_type(data_type) == "BIGINT":
+        return "BIGINT UNSIGNED", "自增主键不需要负数"
+    return "INT UNSIGNED", "自增主键不需要负数"
+
+def _narrow_type(name: str, data_type: str) -> Optional[Tuple[str, str]]:
+    """
+    根据列语义给出更紧凑的类型，无合适规则时返回None。
+    只按完整列名匹配（temperature_level、source_code之类的列不一定符合规则）；
+    TEXT类列不收紧为VARCHAR，已有数据可能超过规则中的长度。
+    """
+    lowered = name.lower()
+    base = base_type(data_type)
+
+    if base in INTEGER_TYPES:
+        if lowered.startswith(BOOLEAN_PREFIXES):
+            return "TINYINT(1)", "布尔标志列"
+        small = SMALL_INT_COLUMNS.get(lowered)
+        if small:
+            if lowered in ENUM_CODE_COLUMNS or "UNSIGNED" in data_type.upper():
+                small += " UNSIGNED"
+            return small, "取值范围较小的整数列"
+        return None
+
+    if base in ("CHAR", "VARCHAR"):
+        fixed = FIXED_CODE_COLUMNS.get(lowered)
+        if fixed:
+            return fixed, "定长编码列"
+        length = BOUNDED_STRING_COLUMNS.get(lowered)
+        if length:
+            return f"VARCHAR({length})", "按语义收紧字符串长度"
+    return None
+
+def optimize_column_types(tables: List["Table"], row_estimates: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    按列语义收紧关系模式中的列类型（原地修改tables），并保证外键与被引用列类型一致。
+    只有新类型更小时才替换；例外是预估行数超出整数主键的取值范围时加宽主键（及引用它的外键）。
+    返回每列的变更、每张表每行节省的估算字节数，以及单独列出、不计入节省的加宽。
+    """
+    row_estimates = row_estimates or {}
+    tables_by_name = {table.name: table for table in tables}
+    changes = []
+    widenings = []
+
+    def apply(table, col, new_type: str, reason: str):
+        old_bytes = estimate_column_bytes(col.data_type)
+        new_bytes = estimate_column_bytes(new_type)
+        change = {
+            "table": table.name,
+            "column": col.name,
+            "old_type": col.data_type,
+            "new_type": new_type,
+            "reason": reason
+        }
+        if new_bytes > old_bytes:
+            widenings.append(dict(change, bytes_added=new_bytes - old_bytes))
+        else:
+            changes.append(dict(change, bytes_saved=old_bytes - new_bytes))
+        col.data_type = new_type
+
+    # 1. 主键和普通列
+    for table in tables:
+        pk_columns = set(table.primary_key_columns())
+        fk_columns = {fk.column for fk in table.foreign_keys}
+        for col in table.columns:
+            if col.name in fk_columns:
+                continue
+            if col.name in pk_columns:
+                if base_type(col.data_type) not in INTEGER_TYPES:
+                    continue
+                new_type, reason = _primary_key_type(table.name, col.data_type, row_estimates)
+                if estimate_column_bytes(new_type) > estimate_column_bytes(col.data_type):
+                    # 更大的类型只在预估行数超出当前类型（预留一半余量）时使用
+                    rows = row_estimates.get(table.name)
+                    if rows is None or rows <= (_integer_capacity(col.data_type) or 0) // 2:
+                        continue
+            else:
+                narrowed = _narrow_type(col.name, col.data_type)
+                if not narrowed:
+                    continue
+                new_type, reason = narrowed
+                if estimate_column_bytes(new_type) >= estimate_column_bytes(col.data_type):
+                    continue
+            if new_type.upper() != col.data_type.upper():
+                apply(table, col, new_type, reason)
+
+    # 2. 外键列与被引用列类型保持一致（外键链按不动点迭代）
+    for _ in range(len(tables)):
+        changed = False
+        for table in tables:
+            columns = {col.name: col for col in table.columns}
+            for fk in table.foreign_keys:
+                ref_table = tables_by_name.get(fk.ref_table)
+                col = columns.get(fk.column)
+                if not ref_table or not col:
+                    continue
+                ref_col = next((c for c in ref_table.columns if c.name == fk.ref_column), None)
+                if ref_col and ref_col.data_type.upper() != col.data_type.upper():
+                    apply(table, col, ref_col.data_type, f"与 {fk.ref_table}.{fk.ref_column} 类型保持一致")
+                    changed = True
+        if not changed:
+            break
+
+    bytes_saved = {}
+    for change in changes:
+        bytes_saved[change["table"]] = bytes_saved.get(change["table"], 0) + change["bytes_saved"]
+    return {
+        "changes": changes,
+        "bytes_saved_per_row": bytes_saved,
+        "total_bytes_saved_per_row": sum(bytes_saved.values()),
+        "widenings": widenings
+    }